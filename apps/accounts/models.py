@@ -41,6 +41,37 @@ class User(AbstractBaseUser, PermissionsMixin):
     def get_short_name(self):
         return self.first_name or self.email.split('@')[0]
     
+    @property
+    def total_receipts_scanned(self):
+        """Reçus complétés, lus dans les agrégats de statistiques"""
+        from apps.receipts.models import UserReceiptStats
+        return UserReceiptStats.objects.filter(
+            user=self, dimension='total'
+        ).aggregate(total=models.Sum('receipt_count'))['total'] or 0
+    
+    @property
+    def cashback_balance(self):
+        """Solde de cashback : somme du journal des transactions"""
+        return self.cashback_transactions.aggregate(
+            balance=models.Sum('amount')
+        )['balance'] or 0
+    
+    def add_cashback(self, amount, source='receipt', receipt=None,
+                     transaction_type='earn', description=''):
+        """
+        Crédite du cashback en ajoutant une ligne au journal. Aucune
+        écriture sur la ligne users : pas de contention entre workers.
+        """
+        from apps.rewards.models import CashbackTransaction
+        return CashbackTransaction.objects.create(
+            user=self,
+            amount=amount,
+            source=source,
+            receipt=receipt,
+            transaction_type=transaction_type,
+            description=description
+        )
+    
     @property
     def is_admin(self):
         return self.groups.filter(name='Admin').exists()
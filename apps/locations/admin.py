@@ -18,6 +18,13 @@ class ZoneAdmin(gis_admin.GISModelAdmin):
     prepopulated_fields = {'slug': ('name',)}
     ordering = ['zone_type', 'name']
     
+    def get_queryset(self, request):
+        # La liste n'affiche aucune géométrie : les limites ne sont chargées
+        # que sur la fiche
+        return super().get_queryset(request).defer(
+            'boundary', 'boundary_coarse', 'boundary_medium', 'boundary_fine'
+        )
+    
     # Configuration pour OpenStreetMap
     gis_widget = gis_widgets.OSMWidget
     gis_widget_kwargs = {
@@ -32,7 +39,7 @@ class ZoneAdmin(gis_admin.GISModelAdmin):
 @admin.register(BonusZone)
 class BonusZoneAdmin(gis_admin.GISModelAdmin):
     list_display = [
-        'name', 'bonus_type', 'bonus_value', 'get_status',
+        'name', 'bonus_type', 'bonus_value', 'priority', 'get_status',
         'times_used', 'budget_used', 'total_budget'
     ]
     list_filter = ['bonus_type', 'is_active', 'start_date']
@@ -45,7 +52,7 @@ class BonusZoneAdmin(gis_admin.GISModelAdmin):
     
     fieldsets = (
         ('Informations de base', {
-            'fields': ('name', 'description', 'zone', 'geofence', 'radius_meters')
+            'fields': ('name', 'description', 'zone', 'geofence', 'center', 'radius_meters')
         }),
         ('Configuration bonus', {
             'fields': (
@@ -60,7 +67,7 @@ class BonusZoneAdmin(gis_admin.GISModelAdmin):
             'fields': ('start_date', 'end_date')
         }),
         ('Affichage', {
-            'fields': ('color', 'icon', 'is_active', 'requires_notification')
+            'fields': ('color', 'icon', 'is_active', 'priority', 'requires_notification')
         }),
         ('Statistiques', {
             'fields': ('times_used', 'total_bonus_paid'),
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bonuszone',
+            name='priority',
+            field=models.IntegerField(default=0, help_text="La zone de plus haute priorité l'emporte si plusieurs contiennent le reçu", verbose_name='Priorité'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-17 20:05
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0002_bonuszone_priority'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bonuszone',
+            name='center',
+            field=django.contrib.gis.db.models.fields.PointField(blank=True, geography=True, null=True, srid=4326, verbose_name='Centre'),
+        ),
+    ]
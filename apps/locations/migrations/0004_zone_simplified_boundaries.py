@@ -0,0 +1,56 @@
+# Generated by Django 5.2.3 on 2026-10-17 20:30
+
+import django.contrib.gis.db.models.fields
+from django.db import migrations
+
+
+# Même calcul que Zone.update_simplified_boundaries (GEOS), pour les zones
+# existantes : colonne par colonne, les limites exactes remplacent une
+# simplification qui ne donne pas un polygone
+SIMPLIFY_SQL = """
+UPDATE locations_zone SET
+    boundary_coarse = CASE
+        WHEN GeometryType(simplified.coarse) = 'POLYGON' AND NOT ST_IsEmpty(simplified.coarse)
+        THEN simplified.coarse ELSE locations_zone.boundary END,
+    boundary_medium = CASE
+        WHEN GeometryType(simplified.medium) = 'POLYGON' AND NOT ST_IsEmpty(simplified.medium)
+        THEN simplified.medium ELSE locations_zone.boundary END,
+    boundary_fine = CASE
+        WHEN GeometryType(simplified.fine) = 'POLYGON' AND NOT ST_IsEmpty(simplified.fine)
+        THEN simplified.fine ELSE locations_zone.boundary END
+FROM (
+    SELECT
+        id,
+        ST_SimplifyPreserveTopology(boundary, 0.01) AS coarse,
+        ST_SimplifyPreserveTopology(boundary, 0.001) AS medium,
+        ST_SimplifyPreserveTopology(boundary, 0.0001) AS fine
+    FROM locations_zone
+) AS simplified
+WHERE locations_zone.id = simplified.id
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('locations', '0003_bonuszone_center'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='zone',
+            name='boundary_coarse',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='boundary_medium',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.AddField(
+            model_name='zone',
+            name='boundary_fine',
+            field=django.contrib.gis.db.models.fields.PolygonField(blank=True, editable=False, null=True, spatial_index=False, srid=4326),
+        ),
+        migrations.RunSQL(SIMPLIFY_SQL, migrations.RunSQL.noop),
+    ]
@@ -8,6 +8,7 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.conf import settings
+import math
 import uuid
 from datetime import timedelta
 
@@ -25,6 +26,21 @@ class Zone(models.Model):
         ('custom', 'Personnalisé'),
     ]
     
+    # Géométries simplifiées (ST_SimplifyPreserveTopology), de la plus
+    # grossière à la plus fine : (champ, tolérance en degrés)
+    SIMPLIFIED_BOUNDARIES = [
+        ('boundary_coarse', 0.01),
+        ('boundary_medium', 0.001),
+        ('boundary_fine', 0.0001),
+    ]
+    
+    # Résolution servie selon le niveau de zoom : (zoom max, champ)
+    ZOOM_BOUNDARIES = [
+        (8, 'boundary_coarse'),
+        (12, 'boundary_medium'),
+        (15, 'boundary_fine'),
+    ]
+    
     name = models.CharField(
         max_length=200,
         verbose_name="Nom"
@@ -45,6 +61,25 @@ class Zone(models.Model):
         spatial_index=True,
         verbose_name="Limites"
     )
+    # Versions simplifiées, tenues à jour par save()
+    boundary_coarse = gis_models.PolygonField(
+        null=True,
+        blank=True,
+        editable=False,
+        spatial_index=False
+    )
+    boundary_medium = gis_models.PolygonField(
+        null=True,
+        blank=True,
+        editable=False,
+        spatial_index=False
+    )
+    boundary_fine = gis_models.PolygonField(
+        null=True,
+        blank=True,
+        editable=False,
+        spatial_index=False
+    )
     center = gis_models.PointField(
         spatial_index=True,
         verbose_name="Centre"
@@ -94,11 +129,85 @@ class Zone(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_zone_type_display()})"
     
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'boundary' in update_fields:
+            self.update_simplified_boundaries()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {
+                    field for field, _ in self.SIMPLIFIED_BOUNDARIES
+                }
+        super().save(*args, **kwargs)
+    
+    def update_simplified_boundaries(self):
+        """
+        Recalcule les géométries simplifiées à partir des limites. Une
+        simplification qui ne donne pas un polygone est remplacée par les
+        limites exactes : chaque colonne est toujours servable.
+        """
+        for field, tolerance in self.SIMPLIFIED_BOUNDARIES:
+            simplified = None
+            if self.boundary:
+                simplified = self.boundary.simplify(tolerance, preserve_topology=True)
+                if simplified.geom_type != 'Polygon' or simplified.empty:
+                    simplified = self.boundary.clone()
+            setattr(self, field, simplified)
+        self._extent = None
+    
+    @classmethod
+    def boundary_field_for_zoom(cls, zoom):
+        """Champ de géométrie à servir pour un niveau de zoom de carte"""
+        for max_zoom, field in cls.ZOOM_BOUNDARIES:
+            if zoom <= max_zoom:
+                return field
+        return 'boundary'
+    
+    def boundary_for_zoom(self, zoom):
+        field = self.boundary_field_for_zoom(zoom)
+        if field == 'boundary' and field in self.get_deferred_fields():
+            # Limites exactes non chargées (liste sans ?zoom) : la plus fine
+            # des simplifiées, plutôt qu'une requête par zone
+            field = self.SIMPLIFIED_BOUNDARIES[-1][0]
+        simplified = getattr(self, field)
+        return simplified if simplified is not None else self.boundary
+    
     def contains_point(self, point):
-        """Vérifie si un point est dans la zone"""
+        """
+        Vérifie si un point est dans la zone : rectangle englobant, puis
+        géométries simplifiées de la plus grossière à la plus fine. Un
+        contour simplifié reste à moins de sa tolérance du contour exact :
+        plus loin que cela, sa réponse est exacte. Sinon, test exact.
+        """
+        if getattr(self, '_extent', None) is None:
+            self._extent = self.boundary.extent
+        xmin, ymin, xmax, ymax = self._extent
+        if not (xmin <= point.x <= xmax and ymin <= point.y <= ymax):
+            return False
+        
+        for field, tolerance in self.SIMPLIFIED_BOUNDARIES:
+            simplified = getattr(self, field)
+            if simplified is not None and simplified.boundary.distance(point) > tolerance:
+                return simplified.contains(point)
         return self.boundary.contains(point)
 
 
+# Rayon maximal d'une zone bonus circulaire
+MAX_RADIUS_METERS = 10000
+
+# Rayon moyen de la Terre (haversine)
+EARTH_RADIUS_METERS = 6371008.8
+
+
+def distance_meters(a, b):
+    """Distance haversine en mètres entre deux points WGS84"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a.x, a.y, b.x, b.y))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2 +
+        math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_METERS * math.asin(math.sqrt(h))
+
+
 class BonusZone(models.Model):
     """
     Zones avec cashback bonus (geofencing)
@@ -134,10 +243,18 @@ class BonusZone(models.Model):
         spatial_index=True,
         verbose_name="Géofence"
     )
+    # Ou cercle : centre + rayon (ST_DWithin sur geography, en mètres)
+    center = gis_models.PointField(
+        geography=True,
+        null=True,
+        blank=True,
+        spatial_index=True,
+        verbose_name="Centre"
+    )
     radius_meters = models.IntegerField(
         null=True,
         blank=True,
-        validators=[MinValueValidator(10), MaxValueValidator(10000)],
+        validators=[MinValueValidator(10), MaxValueValidator(MAX_RADIUS_METERS)],
         help_text="Rayon en mètres si zone circulaire"
     )
     
@@ -218,6 +335,11 @@ class BonusZone(models.Model):
     
     # Activation
     is_active = models.BooleanField(default=True)
+    priority = models.IntegerField(
+        default=0,
+        help_text="La zone de plus haute priorité l'emporte si plusieurs contiennent le reçu",
+        verbose_name="Priorité"
+    )
     requires_notification = models.BooleanField(
         default=True,
         verbose_name="Notifier utilisateurs"
@@ -257,13 +379,50 @@ class BonusZone(models.Model):
         )
     
     def contains_location(self, point):
-        """Vérifie si une localisation est dans la zone bonus"""
-        if self.zone:
-            return self.zone.contains_point(point)
-        elif self.geofence:
-            return self.geofence.contains(point)
+        """
+        Vérifie si une localisation est dans la zone bonus, avec la même
+        règle que find_for_location : géofence OU zone rattachée OU cercle
+        """
+        if self.geofence and self.geofence.contains(point):
+            return True
+        if self.zone_id and self.zone.contains_point(point):
+            return True
+        if self.center and self.radius_meters:
+            return distance_meters(self.center, point) <= self.radius_meters
         return False
     
+    @classmethod
+    def find_for_location(cls, point, at=None):
+        """
+        Zone bonus active contenant le point, la plus prioritaire d'abord.
+        Une seule requête : géofence propre OU limites de la zone rattachée
+        OU cercle (centre + rayon), chacun testé via son index spatial
+        (sous-requête pour les zones, sans jointure).
+        """
+        at = at or timezone.now()
+        zones = Zone.objects.filter(boundary__contains=point).values('id')
+        # Rayon propre à chaque ligne : la borne constante permet l'usage
+        # de l'index, la seconde condition applique le rayon exact
+        in_circle = (
+            models.Q(center__dwithin=(point, MAX_RADIUS_METERS)) &
+            models.Q(center__dwithin=(point, models.F('radius_meters')))
+        )
+        # Budget épuisé : la zone suivante prend le relais (même règle que
+        # is_currently_active, budget absent ou nul = illimité)
+        has_budget = (
+            models.Q(total_budget__isnull=True) |
+            models.Q(total_budget=0) |
+            models.Q(budget_used__lt=models.F('total_budget'))
+        )
+        return cls.objects.filter(
+            has_budget,
+            is_active=True,
+            start_date__lte=at,
+            end_date__gte=at
+        ).filter(
+            models.Q(geofence__contains=point) | models.Q(zone__in=zones) | in_circle
+        ).order_by('-priority', '-start_date').first()
+    
     def calculate_bonus(self, receipt_amount):
         """Calcule le bonus pour un montant donné"""
         if self.bonus_type == 'percentage':
@@ -726,57 +885,3 @@ class LocationValidation(models.Model):
         indexes = [
             models.Index(fields=['is_valid']),
         ]
-
-
-# Signaux pour traitement automatique
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
-
-@receiver(post_save, sender='receipts.Receipt')
-def validate_receipt_location(sender, instance, created, **kwargs):
-    """Valide automatiquement la localisation d'un reçu"""
-    if created and instance.location and instance.merchant:
-        # Chercher le merchant location le plus proche
-        from django.contrib.gis.measure import D
-        
-        nearby_locations = MerchantLocation.objects.filter(
-            merchant=instance.merchant,
-            location__distance_lte=(instance.location, D(m=1000))
-        ).order_by('location')
-        
-        if nearby_locations.exists():
-            closest = nearby_locations.first()
-            distance = instance.location.distance(closest.location).m
-            
-            LocationValidation.objects.create(
-                receipt=instance,
-                declared_location=instance.location,
-                matched_merchant_location=closest,
-                distance_meters=distance,
-                is_valid=distance <= closest.validation_radius,
-                validation_score=max(0, 1 - (distance / closest.validation_radius)),
-                validation_method='gps_match'
-            )
-            
-            # Vérifier les zones bonus
-            active_bonus_zones = BonusZone.objects.filter(
-                is_active=True,
-                start_date__lte=timezone.now(),
-                end_date__gte=timezone.now()
-            )
-            
-            for bonus_zone in active_bonus_zones:
-                if bonus_zone.contains_location(instance.location):
-                    # Appliquer le bonus
-                    bonus_amount = bonus_zone.calculate_bonus(instance.total_amount)
-                    instance.bonus_amount = bonus_amount
-                    instance.save(update_fields=['bonus_amount'])
-                    
-                    # Mettre à jour les stats de la zone
-                    bonus_zone.times_used += 1
-                    bonus_zone.total_bonus_paid += bonus_amount
-                    bonus_zone.budget_used += bonus_amount
-                    bonus_zone.save()
-                    
-                    break  # Appliquer seulement le premier bonus trouvé
\ No newline at end of file
@@ -1,4 +1,6 @@
 # apps/locations/serializers.py
+import json
+
 from rest_framework import serializers
 from django.contrib.gis.geos import Point
 from django.contrib.gis.measure import Distance
@@ -11,14 +13,25 @@ from .models import (
 
 class ZoneSerializer(serializers.ModelSerializer):
     center_coordinates = serializers.SerializerMethodField()
+    boundary = serializers.SerializerMethodField()
     
     class Meta:
         model = Zone
         fields = [
             'id', 'name', 'slug', 'zone_type', 'center_coordinates',
-            'population', 'area_sq_km', 'zoom_level'
+            'boundary', 'population', 'area_sq_km', 'zoom_level'
         ]
     
+    def get_zoom(self, obj):
+        """Zoom demandé (?zoom=), sinon le zoom d'affichage de la zone"""
+        request = self.context.get('request')
+        zoom = get_requested_zoom(request) if request else None
+        return zoom if zoom is not None else obj.zoom_level
+    
+    def get_boundary(self, obj):
+        # GeoJSON à la résolution adaptée au zoom
+        return json.loads(obj.boundary_for_zoom(self.get_zoom(obj)).geojson)
+    
     def get_center_coordinates(self, obj):
         if obj.center:
             return {
@@ -28,18 +41,37 @@ class ZoneSerializer(serializers.ModelSerializer):
         return None
 
 
+def get_requested_zoom(request):
+    """Paramètre ?zoom= borné à 1-20, None si absent ou invalide"""
+    try:
+        zoom = int(request.query_params['zoom'])
+    except (KeyError, ValueError):
+        return None
+    return max(1, min(20, zoom))
+
+
 class BonusZoneSerializer(serializers.ModelSerializer):
     is_currently_active = serializers.BooleanField(read_only=True)
     zone_name = serializers.CharField(source='zone.name', read_only=True)
+    center_coordinates = serializers.SerializerMethodField()
     
     class Meta:
         model = BonusZone
         fields = [
             'id', 'name', 'description', 'zone', 'zone_name',
+            'center_coordinates', 'radius_meters',
             'bonus_type', 'bonus_value', 'max_bonus_per_receipt',
             'start_date', 'end_date', 'color', 'icon',
             'is_currently_active'
         ]
+    
+    def get_center_coordinates(self, obj):
+        if obj.center:
+            return {
+                'latitude': obj.center.y,
+                'longitude': obj.center.x
+            }
+        return None
 
 
 class UserLocationSerializer(serializers.ModelSerializer):
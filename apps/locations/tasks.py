@@ -0,0 +1,13 @@
+# apps/locations/tasks.py
+from celery import shared_task
+from .validation import validate_receipt_locations as run_location_validation
+
+
+@shared_task(acks_late=True)
+def validate_receipt_locations(receipt_ids):
+    """
+    Valider la localisation d'un lot de reçus (marchand déjà résolu)
+    Idempotent : les reçus déjà validés sont ignorés
+    """
+    validated, failed = run_location_validation(receipt_ids)
+    return f"{validated} localisations de reçus validées, {failed} en échec"
@@ -1,3 +1,267 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.gis.geos import Point, Polygon
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.receipts.models import Merchant, Receipt
+from .models import BonusZone, LocationValidation, MerchantLocation, Zone
+from .validation import validate_receipt_location, validate_receipt_locations
+from .views import ZoneViewSet
+
+
+def square(x, y, half):
+    return Polygon((
+        (x - half, y - half), (x + half, y - half), (x + half, y + half),
+        (x - half, y + half), (x - half, y - half)
+    ), srid=4326)
+
+
+def create_bonus_zone(name, **fields):
+    now = timezone.now()
+    fields.setdefault('start_date', now - timedelta(days=1))
+    fields.setdefault('end_date', now + timedelta(days=1))
+    return BonusZone.objects.create(
+        name=name, bonus_type='percentage', bonus_value=Decimal('2.00'), **fields
+    )
+
+
+class FindBonusZoneTests(TestCase):
+
+    def setUp(self):
+        self.point = Point(-73.60, 45.52, srid=4326)
+        self.zone = Zone.objects.create(
+            name='Plateau', slug='plateau', boundary=square(-73.60, 45.52, 0.03), center=self.point
+        )
+
+    def test_geofence_and_zone_match(self):
+        geofence = create_bonus_zone('Géofence', geofence=square(-73.60, 45.52, 0.01))
+
+        self.assertEqual(BonusZone.find_for_location(self.point), geofence)
+        geofence.delete()
+        by_zone = create_bonus_zone('Zone', zone=self.zone)
+        self.assertEqual(BonusZone.find_for_location(self.point), by_zone)
+
+    def test_highest_priority_wins(self):
+        create_bonus_zone('Basse', zone=self.zone, priority=1)
+        high = create_bonus_zone('Haute', geofence=square(-73.60, 45.52, 0.01), priority=5)
+
+        self.assertEqual(BonusZone.find_for_location(self.point), high)
+
+    def test_point_outside_every_zone(self):
+        create_bonus_zone('Zone', zone=self.zone)
+        create_bonus_zone('Géofence', geofence=square(-73.60, 45.52, 0.01))
+
+        self.assertIsNone(BonusZone.find_for_location(Point(-73.00, 45.00, srid=4326)))
+
+    def test_inactive_and_expired_zones_are_ignored(self):
+        now = timezone.now()
+        create_bonus_zone('Inactive', zone=self.zone, is_active=False)
+        create_bonus_zone(
+            'Expirée', zone=self.zone,
+            start_date=now - timedelta(days=10), end_date=now - timedelta(days=1)
+        )
+
+        self.assertIsNone(BonusZone.find_for_location(self.point))
+        self.assertIsNotNone(
+            BonusZone.find_for_location(self.point, at=now - timedelta(days=5))
+        )
+
+    def test_exhausted_budget_falls_through_to_next_zone(self):
+        fallback = create_bonus_zone('Basse', zone=self.zone, priority=1)
+        create_bonus_zone(
+            'Épuisée', geofence=square(-73.60, 45.52, 0.01), priority=5,
+            total_budget=Decimal('100.00'), budget_used=Decimal('100.00')
+        )
+        unlimited = create_bonus_zone('Illimitée', zone=self.zone, priority=3, total_budget=0)
+
+        self.assertEqual(BonusZone.find_for_location(self.point), unlimited)
+        unlimited.delete()
+        self.assertEqual(BonusZone.find_for_location(self.point), fallback)
+
+    def test_lookup_is_one_query(self):
+        create_bonus_zone('Zone', zone=self.zone)
+
+        with self.assertNumQueries(1):
+            BonusZone.find_for_location(self.point)
+
+
+class CircularBonusZoneTests(TestCase):
+
+    def setUp(self):
+        self.center = Point(-73.60, 45.52, srid=4326)
+        # Environ 780 m à l'est (0.01 degré de longitude à cette latitude)
+        self.nearby = Point(-73.59, 45.52, srid=4326)
+
+    def test_circle_uses_its_own_radius(self):
+        small = create_bonus_zone('Petit', center=self.center, radius_meters=500)
+        large = create_bonus_zone('Grand', center=self.center, radius_meters=1000)
+
+        self.assertEqual(BonusZone.find_for_location(self.nearby), large)
+        large.delete()
+        self.assertIsNone(BonusZone.find_for_location(self.nearby))
+        self.assertEqual(BonusZone.find_for_location(self.center), small)
+
+    def test_contains_location_matches_query(self):
+        zone = Zone.objects.create(
+            name='Plateau', slug='plateau', boundary=square(-73.70, 45.52, 0.01), center=self.center
+        )
+        # Zone rattachée ailleurs, mais le cercle contient le point
+        bonus_zone = create_bonus_zone(
+            'Mixte', zone=zone, center=self.center, radius_meters=1000,
+            geofence=square(-73.50, 45.52, 0.01)
+        )
+        points = [
+            self.nearby, Point(-73.70, 45.52, srid=4326), Point(-73.50, 45.52, srid=4326),
+            Point(-73.40, 45.52, srid=4326),
+        ]
+
+        for point in points:
+            with self.subTest(point=point.coords):
+                self.assertEqual(
+                    bonus_zone.contains_location(point),
+                    BonusZone.find_for_location(point) == bonus_zone
+                )
+
+
+class ReceiptLocationTests(TestCase):
+
+    def setUp(self):
+        point = Point(-73.60, 45.52, srid=4326)
+        self.merchant = Merchant.objects.create(name='Marché', display_name='Marché', slug='marche')
+        MerchantLocation.objects.create(
+            merchant=self.merchant, name='Centre', store_number='1', location=point,
+            address='1 rue Test', city='Montréal', province='QC', postal_code='H2X 1Y4'
+        )
+        self.bonus_zone = create_bonus_zone('Centre', center=point, radius_meters=500)
+        self.receipt = Receipt.objects.create(
+            user=get_user_model().objects.create_user(email='test@example.com', password='secret'),
+            original_image='receipts/originals/test.jpg',
+            image_hash='0' * 64,
+            ocr_status='processing',
+            merchant=self.merchant,
+            total_amount=Decimal('50.00'),
+            purchase_date=timezone.localdate(),
+            location=Point(-73.601, 45.52, srid=4326)
+        )
+
+    def test_validation_does_not_apply_bonus(self):
+        validation = validate_receipt_location(self.receipt)
+
+        self.assertTrue(validation.is_valid)
+        self.assertIsNone(validate_receipt_location(self.receipt))
+        self.receipt.refresh_from_db()
+        self.assertFalse(self.receipt.bonus_amount)
+        self.bonus_zone.refresh_from_db()
+        self.assertEqual(self.bonus_zone.times_used, 0)
+
+    def test_bonus_is_applied_once_at_completion(self):
+        validate_receipt_location(self.receipt)
+
+        self.receipt.mark_as_processed()
+        self.receipt.mark_as_processed()
+
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.bonus_amount, Decimal('1.00'))
+        self.bonus_zone.refresh_from_db()
+        self.assertEqual(self.bonus_zone.times_used, 1)
+        self.assertEqual(self.bonus_zone.total_bonus_paid, Decimal('1.00'))
+        self.assertTrue(LocationValidation.objects.filter(receipt=self.receipt).exists())
+
+    def test_batch_counts_failures_and_is_idempotent(self):
+        with mock.patch(
+            'apps.locations.validation.validate_receipt_location', side_effect=DatabaseError
+        ):
+            self.assertEqual(validate_receipt_locations([self.receipt.id]), (0, 1))
+
+        self.assertEqual(validate_receipt_locations([self.receipt.id]), (1, 0))
+        self.assertEqual(validate_receipt_locations([self.receipt.id]), (0, 0))
+
+    def test_no_bonus_without_valid_validation(self):
+        # Aucune validation : la position déclarée seule ne suffit pas
+        self.receipt.mark_as_processed()
+
+        self.receipt.refresh_from_db()
+        self.assertFalse(self.receipt.bonus_amount)
+        self.bonus_zone.refresh_from_db()
+        self.assertEqual(self.bonus_zone.times_used, 0)
+
+    def test_no_bonus_for_invalid_validation(self):
+        validate_receipt_location(self.receipt)
+        LocationValidation.objects.filter(receipt=self.receipt).update(is_valid=False)
+
+        self.receipt.mark_as_processed()
+
+        self.receipt.refresh_from_db()
+        self.assertFalse(self.receipt.bonus_amount)
+
+
+def detailed_zone(**fields):
+    # Disque à 1024 sommets : les simplifications en retirent la plupart
+    center = Point(-73.60, 45.52, srid=4326)
+    boundary = center.buffer(0.05, quadsegs=256)
+    boundary.srid = 4326
+    return Zone(boundary=boundary, center=center, **fields)
+
+
+class ZoneBoundaryTests(SimpleTestCase):
+
+    def setUp(self):
+        self.zone = detailed_zone()
+        self.zone.update_simplified_boundaries()
+
+    def test_simplified_boundaries_have_fewer_vertices(self):
+        counts = [self.zone.boundary.num_points] + [
+            getattr(self.zone, field).num_points for field, _ in Zone.SIMPLIFIED_BOUNDARIES
+        ]
+
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLess(self.zone.boundary_coarse.num_points, counts[0] // 10)
+
+    def test_contains_point_matches_exact_test(self):
+        for i in range(-30, 31):
+            for j in range(-30, 31):
+                point = Point(-73.60 + i * 0.002, 45.52 + j * 0.002, srid=4326)
+                with self.subTest(point=point.coords):
+                    self.assertEqual(self.zone.contains_point(point), self.zone.boundary.contains(point))
+
+    def test_points_away_from_edge_skip_exact_polygon(self):
+        exact = self.zone.boundary
+        with mock.patch.object(
+            Polygon, 'contains', autospec=True, side_effect=Polygon.contains
+        ) as contains:
+            self.assertTrue(self.zone.contains_point(Point(-73.60, 45.52, srid=4326)))
+            self.assertFalse(self.zone.contains_point(Point(-73.54, 45.52, srid=4326)))
+
+        self.assertFalse(any(call.args[0] is exact for call in contains.call_args_list))
+
+
+class ZoneListTests(TestCase):
+
+    def list_zones(self):
+        request = APIRequestFactory().get('/locations/zones/')
+        force_authenticate(request, user=self.user)
+        with CaptureQueriesContext(connection) as context:
+            response = ZoneViewSet.as_view({'get': 'list'})(request).render()
+        return response, len(context.captured_queries)
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='test@example.com', password='secret')
+
+    def test_list_without_zoom_does_not_load_exact_boundaries(self):
+        # Zoom 18 : au-delà des simplifiées, sans ?zoom
+        detailed_zone(name='Zone 0', slug='zone-0', zoom_level=18).save()
+        _, single = self.list_zones()
+        for i in range(1, 4):
+            detailed_zone(name=f'Zone {i}', slug=f'zone-{i}', zoom_level=18).save()
+
+        response, queries = self.list_zones()
+
+        self.assertEqual(queries, single)
+        self.assertEqual(len(response.data['results']), 4)
@@ -0,0 +1,104 @@
+# apps/locations/validation.py
+from django.contrib.gis.db.models.functions import Distance
+from django.contrib.gis.measure import D
+from django.db import DatabaseError, IntegrityError, models, transaction
+
+from .models import BonusZone, LocationValidation, MerchantLocation
+
+
+# Rayon de recherche de la succursale la plus proche
+SEARCH_RADIUS_METERS = 1000
+
+
+def validate_receipt_location(receipt):
+    """
+    Étape du pipeline après la résolution du marchand par l'OCR : valide la
+    localisation du reçu contre la succursale la plus proche. La zone bonus
+    est appliquée à la complétion (mark_as_processed). Idempotent : un reçu
+    déjà validé n'est pas retraité. Retourne la validation créée, ou None.
+    """
+    if not receipt.location or not receipt.merchant_id:
+        return None
+    if LocationValidation.objects.filter(receipt_id=receipt.id).exists():
+        return None
+
+    closest = MerchantLocation.objects.filter(
+        merchant_id=receipt.merchant_id,
+        location__distance_lte=(receipt.location, D(m=SEARCH_RADIUS_METERS))
+    ).annotate(
+        distance=Distance('location', receipt.location)
+    ).order_by('distance').first()
+    if closest is None:
+        return None
+
+    distance = closest.distance.m
+    try:
+        with transaction.atomic():
+            validation = LocationValidation.objects.create(
+                receipt=receipt,
+                declared_location=receipt.location,
+                matched_merchant_location=closest,
+                distance_meters=distance,
+                is_valid=distance <= closest.validation_radius,
+                validation_score=max(0, 1 - (distance / closest.validation_radius)),
+                validation_method='gps_match'
+            )
+    except IntegrityError:
+        # Validé en parallèle par un autre worker
+        return None
+    return validation
+
+
+def apply_bonus_zone(receipt):
+    """
+    Bonus de la zone la plus prioritaire contenant le reçu. Appelé par
+    mark_as_processed, une seule fois par reçu complété : ni les reçus en
+    révision manuelle ni les doublons ne consomment le budget de la zone.
+    La position déclarée doit avoir été validée contre une succursale du
+    marchand : une position GPS falsifiée seule ne suffit pas.
+    """
+    if not receipt.location:
+        return None
+    if not LocationValidation.objects.filter(receipt_id=receipt.id, is_valid=True).exists():
+        return None
+    bonus_zone = BonusZone.find_for_location(receipt.location)
+    if not bonus_zone:
+        return None
+
+    bonus_amount = bonus_zone.calculate_bonus(receipt.total_amount)
+    receipt.bonus_amount = bonus_amount
+    receipt.save(update_fields=['bonus_amount', 'updated_at'])
+
+    # Mettre à jour les stats de la zone (atomique, sans écraser les
+    # incréments concurrents)
+    BonusZone.objects.filter(pk=bonus_zone.pk).update(
+        times_used=models.F('times_used') + 1,
+        total_bonus_paid=models.F('total_bonus_paid') + bonus_amount,
+        budget_used=models.F('budget_used') + bonus_amount
+    )
+    return bonus_zone
+
+
+def validate_receipt_locations(receipt_ids):
+    """
+    Valide un lot de reçus (ceux déjà validés sont ignorés). L'échec d'un
+    reçu (requête spatiale) n'interrompt pas le lot : il est compté et le
+    reçu reste à valider. Retourne (validés, en échec).
+    """
+    from apps.receipts.models import Receipt
+
+    receipts = Receipt.objects.filter(
+        id__in=receipt_ids,
+        location__isnull=False,
+        merchant__isnull=False,
+        location_validation__isnull=True
+    )
+    validated = failed = 0
+    for receipt in receipts:
+        try:
+            with transaction.atomic():
+                if validate_receipt_location(receipt):
+                    validated += 1
+        except DatabaseError:
+            failed += 1
+    return validated, failed
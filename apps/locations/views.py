@@ -6,14 +6,29 @@ from rest_framework.views import APIView
 from .models import Zone, BonusZone, MerchantLocation, PlaceOfInterest
 from .serializers import (
     ZoneSerializer, BonusZoneSerializer, 
-    MerchantLocationSerializer, PlaceOfInterestSerializer
+    MerchantLocationSerializer, PlaceOfInterestSerializer,
+    get_requested_zoom
 )
 
 
 class ZoneViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = Zone.objects.filter(is_active=True)
     serializer_class = ZoneSerializer
     permission_classes = [IsAuthenticated]
+    
+    def get_queryset(self):
+        # Ne charger que la géométrie servie : les limites exactes peuvent
+        # compter des dizaines de milliers de sommets
+        geometry_fields = ['boundary'] + [field for field, _ in Zone.SIMPLIFIED_BOUNDARIES]
+        zoom = get_requested_zoom(self.request)
+        if zoom is None:
+            # Résolution selon le zoom propre à chaque zone : les limites
+            # exactes restent différées, la plus fine des simplifiées les
+            # remplace au-delà du zoom 15 (boundary_for_zoom)
+            served = [field for field, _ in Zone.SIMPLIFIED_BOUNDARIES]
+        else:
+            served = [Zone.boundary_field_for_zoom(zoom)]
+        deferred = [field for field in geometry_fields if field not in served]
+        return Zone.objects.filter(is_active=True).defer(*deferred)
 
 
 class BonusZoneViewSet(viewsets.ReadOnlyModelViewSet):
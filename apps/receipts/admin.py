@@ -7,7 +7,8 @@ from django.utils.html import format_html
 from django.db.models import Count, Sum
 from .models import (
     Merchant, Category, Receipt, ReceiptItem,
-    ReceiptImage, MerchantAlias, OCRProcessingLog
+    ReceiptImage, MerchantAlias, OCRProcessingLog,
+    ReceiptUploadSession, UserReceiptStats, ReceiptTagCount
 )
 
 
@@ -44,11 +45,12 @@ class MerchantAdmin(admin.ModelAdmin):
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'parent', 'icon', 'color', 'budget_percentage', 'is_active']
+    list_display = ['name', 'parent', 'depth', 'icon', 'color', 'budget_percentage', 'is_active']
     list_filter = ['parent', 'is_active']
     search_fields = ['name']
     prepopulated_fields = {'slug': ('name',)}
-    ordering = ['parent__name', 'order', 'name']
+    readonly_fields = ['path', 'depth']
+    ordering = ['path']
 
 
 class ReceiptItemInline(admin.TabularInline):
@@ -78,8 +80,8 @@ class ReceiptAdmin(admin.ModelAdmin):
         'merchant__name', 'extracted_text'
     ]
     readonly_fields = [
-        'receipt_uuid', 'image_hash', 'ocr_confidence',
-        'created_at', 'processed_at'
+        'receipt_uuid', 'image_hash', 'perceptual_hash', 'ocr_confidence',
+        'ocr_archive_key', 'ocr_archived_at', 'created_at', 'processed_at'
     ]
     date_hierarchy = 'purchase_date'
     inlines = [ReceiptItemInline, ReceiptImageInline]
@@ -89,9 +91,20 @@ class ReceiptAdmin(admin.ModelAdmin):
             'user', 'merchant', 'category'
         ).prefetch_related('items')
     
+    def get_readonly_fields(self, request, obj=None):
+        readonly = list(super().get_readonly_fields(request, obj))
+        if obj is not None and obj.ocr_status == 'completed':
+            readonly.extend(Receipt.COMPLETED_LOCKED_FIELDS)
+        return readonly
+    
+    def delete_queryset(self, request, queryset):
+        # Un par un : Receipt.delete() retire les reçus complétés des agrégats
+        for receipt in queryset:
+            receipt.delete()
+    
     fieldsets = (
         ('Identification', {
-            'fields': ('receipt_uuid', 'user', 'image_hash')
+            'fields': ('receipt_uuid', 'user', 'image_hash', 'perceptual_hash')
         }),
         ('Images', {
             'fields': ('original_image', 'processed_image', 'thumbnail')
@@ -99,7 +112,8 @@ class ReceiptAdmin(admin.ModelAdmin):
         ('OCR', {
             'fields': (
                 'ocr_status', 'ocr_provider', 'ocr_confidence',
-                'extracted_text', 'ocr_raw_response'
+                'extracted_text', 'ocr_raw_response',
+                'ocr_archive_key', 'ocr_archived_at'
             ),
             'classes': ('collapse',)
         }),
@@ -146,4 +160,32 @@ class OCRProcessingLogAdmin(admin.ModelAdmin):
     ]
     list_filter = ['provider', 'success', 'started_at']
     readonly_fields = ['started_at', 'completed_at']
-    date_hierarchy = 'started_at'
\ No newline at end of file
+    date_hierarchy = 'started_at'
+
+
+@admin.register(ReceiptUploadSession)
+class ReceiptUploadSessionAdmin(admin.ModelAdmin):
+    list_display = [
+        'upload_id', 'user', 'receipt', 'page_number',
+        'received_bytes', 'total_size', 'status', 'expires_at'
+    ]
+    list_filter = ['status', 'created_at']
+    search_fields = ['upload_id', 'user__email']
+    readonly_fields = ['upload_id', 'created_at', 'updated_at']
+
+
+@admin.register(UserReceiptStats)
+class UserReceiptStatsAdmin(admin.ModelAdmin):
+    list_display = [
+        'user', 'period', 'dimension', 'dimension_key',
+        'receipt_count', 'total_amount', 'cashback_amount', 'bonus_amount'
+    ]
+    list_filter = ['dimension', 'period']
+    search_fields = ['user__email']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(ReceiptTagCount)
+class ReceiptTagCountAdmin(admin.ModelAdmin):
+    list_display = ['user', 'tag', 'count']
+    search_fields = ['user__email', 'tag']
@@ -0,0 +1,103 @@
+# apps/receipts/archive.py
+import json
+from datetime import timedelta
+
+import zstandard
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .models import Receipt
+
+
+ARCHIVE_PREFIX = 'ocr-archive'
+ARCHIVE_BATCH_SIZE = 500
+COMPRESSION_LEVEL = 10
+
+# Statuts définitifs : un reçu en cours de traitement n'est jamais archivé
+ARCHIVABLE_STATUSES = ('completed', 'failed', 'manual_review')
+
+
+def archive_key(receipt):
+    return f"{ARCHIVE_PREFIX}/{receipt.created_at:%Y/%m}/{receipt.receipt_uuid}.json.zst"
+
+
+def pack(raw_response, extracted_text):
+    payload = json.dumps(
+        {'raw_response': raw_response, 'extracted_text': extracted_text},
+        ensure_ascii=False,
+        separators=(',', ':')
+    ).encode('utf-8')
+    return zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(payload)
+
+
+def unpack(data):
+    return json.loads(zstandard.ZstdDecompressor().decompress(data))
+
+
+def load_archive(key):
+    """Réponse OCR brute et texte extrait d'un reçu archivé"""
+    with default_storage.open(key, 'rb') as f:
+        return unpack(f.read())
+
+
+def archive_receipt(receipt):
+    """
+    Écrit les données OCR dans le stockage puis vide les colonnes.
+    La mise à jour est conditionnelle : un reçu retraité entre-temps
+    (updated_at modifié) n'est pas vidé. Retourne True si archivé.
+    """
+    key = archive_key(receipt)
+    data = pack(receipt.ocr_raw_response, receipt.extracted_text)
+    # Clé déterministe : une archive précédente est remplacée
+    if default_storage.exists(key):
+        default_storage.delete(key)
+    key = default_storage.save(key, ContentFile(data))
+
+    # update() ne touche pas updated_at : l'archivage n'est pas une modification
+    return bool(Receipt.objects.filter(
+        id=receipt.id,
+        updated_at=receipt.updated_at,
+        ocr_archived_at__isnull=True
+    ).update(
+        ocr_raw_response={},
+        extracted_text='',
+        ocr_archive_key=key,
+        ocr_archived_at=timezone.now()
+    ))
+
+
+def get_archivable_receipts(days=None):
+    days = days or settings.INOVOCB_SETTINGS['OCR_ARCHIVE_AFTER_DAYS']
+    return Receipt.objects.filter(
+        ocr_archived_at__isnull=True,
+        ocr_status__in=ARCHIVABLE_STATUSES,
+        created_at__lt=timezone.now() - timedelta(days=days)
+    )
+
+
+def archive_old_receipts(days=None, limit=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """Archive les reçus plus anciens que `days` jours, par lots d'ids croissants"""
+    queryset = get_archivable_receipts(days).only(
+        'id', 'receipt_uuid', 'created_at', 'updated_at',
+        'ocr_raw_response', 'extracted_text'
+    ).order_by('id')
+
+    archived = 0
+    last_id = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        batch = list(queryset.filter(id__gt=last_id)[:size])
+        if not batch:
+            break
+        for receipt in batch:
+            if archive_receipt(receipt):
+                archived += 1
+        last_id = batch[-1].id
+    return archived
+
+
+def delete_archive(key):
+    if key and default_storage.exists(key):
+        default_storage.delete(key)
@@ -0,0 +1,300 @@
+# apps/receipts/benchmark_data.py
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.gis.geos import Point, Polygon
+from django.db import transaction
+from django.utils import timezone
+
+from apps.locations.models import BonusZone, MerchantLocation, Zone
+from .catalog import bump_catalog_version
+from .models import Category, Merchant, Receipt, ReceiptItem
+from .rollups import rebuild_merchant_rollup
+from .stats import rebuild_stats
+from .tags import rebuild_tag_counts
+
+
+# Tout ce qui est généré porte ce préfixe : suppression sans toucher aux vraies données
+BENCH_PREFIX = 'bench'
+BENCH_EMAIL_DOMAIN = 'benchmark.invalid'
+BENCH_IMAGE = 'receipts/originals/bench/receipt.jpg'
+
+# Grand Montréal : centre et demi-largeur en degrés
+CITY_CENTER = (-73.60, 45.52)
+CITY_SPAN = 0.25
+
+CATEGORY_NAMES = ['Épicerie', 'Restaurants', 'Pharmacie', 'Essence', 'Détail', 'Loisirs']
+TAGS = ['travail', 'famille', 'remboursable', 'voyage', 'cadeau', 'sante', 'maison', 'auto']
+ITEM_NAMES = [
+    'Lait 2%', 'Pain tranché', 'Oeufs douzaine', 'Café moulu', 'Pommes', 'Bananes',
+    'Fromage cheddar', 'Poulet', 'Essence ordinaire', 'Shampoing', 'Pizza', 'Salade',
+]
+
+# Répartition des statuts OCR (le reste est 'completed')
+PROCESSING_RATIO = 0.03
+FAILED_RATIO = 0.02
+
+# 20 % des reçus appartiennent à 1 % des utilisateurs (gros utilisateurs)
+HEAVY_USERS_RATIO = 0.01
+HEAVY_RECEIPTS_RATIO = 0.2
+
+
+def bench_users():
+    return get_user_model().objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+
+
+def _point(rng, center=CITY_CENTER, span=CITY_SPAN):
+    return Point(
+        center[0] + rng.uniform(-span, span),
+        center[1] + rng.uniform(-span, span),
+        srid=4326
+    )
+
+
+def _square(center, half):
+    x, y = center
+    return Polygon((
+        (x - half, y - half), (x + half, y - half), (x + half, y + half),
+        (x - half, y + half), (x - half, y - half)
+    ), srid=4326)
+
+
+def _money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+def create_users(count, batch_size):
+    # Un seul hachage pour tous : PBKDF2 dominerait sinon la génération
+    password = make_password(BENCH_PREFIX)
+    User = get_user_model()
+    User.objects.bulk_create(
+        [
+            User(
+                email=f'{BENCH_PREFIX}{i}@{BENCH_EMAIL_DOMAIN}',
+                password=password,
+                first_name='Bench',
+                last_name=str(i)
+            )
+            for i in range(count)
+        ],
+        batch_size=batch_size
+    )
+    return list(bench_users().order_by('email').values_list('id', flat=True))
+
+
+def create_categories():
+    categories = []
+    for name in CATEGORY_NAMES:
+        # save() : le chemin matérialisé est calculé
+        category, _ = Category.objects.get_or_create(
+            slug=f'{BENCH_PREFIX}-{len(categories)}',
+            defaults={'name': f'{name} ({BENCH_PREFIX})'}
+        )
+        categories.append(category)
+    return categories
+
+
+def create_merchants(rng, count, locations_per_merchant, categories, batch_size):
+    """Marchands et leurs succursales. Retourne {merchant: [points]}"""
+    merchants = Merchant.objects.bulk_create(
+        [
+            Merchant(
+                name=f'Bench Marchand {i}',
+                display_name=f'Bench Marchand {i}',
+                slug=f'{BENCH_PREFIX}-merchant-{i}',
+                merchant_type=rng.choice(Merchant.MERCHANT_TYPES)[0],
+                category=rng.choice(categories),
+                is_partner=rng.random() < 0.3,
+                cashback_rate=_money(rng.uniform(0.5, 5)),
+                bonus_rate=_money(rng.uniform(0, 2))
+            )
+            for i in range(count)
+        ],
+        batch_size=batch_size
+    )
+
+    points = {}
+    locations = []
+    for merchant in merchants:
+        points[merchant] = []
+        for j in range(locations_per_merchant):
+            point = _point(rng)
+            points[merchant].append(point)
+            locations.append(MerchantLocation(
+                merchant=merchant,
+                name=f'Succursale {j}',
+                store_number=str(j),
+                location=point,
+                address=f'{j} rue Bench',
+                city='Montréal',
+                province='QC',
+                postal_code='H2X 1Y4'
+            ))
+    MerchantLocation.objects.bulk_create(locations, batch_size=batch_size)
+    return points
+
+
+def create_bonus_zones(rng, count):
+    """Un tiers rattachées à une zone, un tiers géofences, un tiers cercles"""
+    now = timezone.now()
+    for i in range(count):
+        center = _point(rng)
+        bonus_zone = BonusZone(
+            name=f'{BENCH_PREFIX} bonus {i}',
+            bonus_type='percentage',
+            bonus_value=Decimal('2.00'),
+            max_bonus_per_receipt=Decimal('5.00'),
+            start_date=now - timedelta(days=30),
+            end_date=now + timedelta(days=365)
+        )
+        if i % 3 == 1:
+            bonus_zone.geofence = _square(center.coords, 0.02)
+        elif i % 3 == 2:
+            bonus_zone.center = center
+            bonus_zone.radius_meters = 1500
+        else:
+            bonus_zone.zone = Zone.objects.create(
+                name=f'{BENCH_PREFIX} zone {i}',
+                slug=f'{BENCH_PREFIX}-zone-{i}',
+                boundary=_square(center.coords, 0.03),
+                center=center
+            )
+        bonus_zone.save()
+
+
+def _pick_user(rng, user_ids):
+    heavy = max(1, int(len(user_ids) * HEAVY_USERS_RATIO))
+    if rng.random() < HEAVY_RECEIPTS_RATIO:
+        return user_ids[rng.randrange(heavy)]
+    return user_ids[rng.randrange(len(user_ids))]
+
+
+def _build_receipt(rng, user_ids, merchants, merchant_points, today, now):
+    merchant = rng.choice(merchants)
+    age = rng.randrange(730)
+    total = _money(rng.lognormvariate(3.5, 0.8))
+    tax = _money(total * Decimal('0.13') / Decimal('1.13'))
+
+    roll = rng.random()
+    if roll < PROCESSING_RATIO:
+        status = 'processing'
+    elif roll < PROCESSING_RATIO + FAILED_RATIO:
+        status = 'failed'
+    else:
+        status = 'completed'
+
+    location = None
+    if rng.random() < 0.7:
+        # Près d'une succursale (environ 100 m)
+        base = rng.choice(merchant_points[merchant])
+        location = _point(rng, base.coords, 0.001)
+
+    receipt = Receipt(
+        user_id=_pick_user(rng, user_ids),
+        original_image=BENCH_IMAGE,
+        ocr_status=status,
+        ocr_provider='gemini' if status != 'processing' else None,
+        ocr_confidence=rng.uniform(0.7, 1) if status == 'completed' else 0,
+        merchant=merchant,
+        merchant_name_raw=merchant.name.upper(),
+        category_id=merchant.category_id,
+        subtotal=total - tax,
+        tax_amount=tax,
+        total_amount=total,
+        purchase_date=today - timedelta(days=age),
+        purchase_time=time(rng.randrange(7, 23), rng.randrange(60)),
+        tags=rng.sample(TAGS, rng.randrange(3)),
+        location=location,
+        location_accuracy=rng.uniform(5, 50) if location else None,
+        extracted_text=f'{merchant.name.upper()} TOTAL {total}'
+    )
+    if status == 'completed':
+        receipt.cashback_rate = merchant.cashback_rate
+        receipt.cashback_amount = _money(merchant.calculate_cashback(total))
+        receipt.processed_at = now - timedelta(days=age, minutes=rng.randrange(1, 60))
+    return receipt
+
+
+def _build_items(rng, receipt, max_items):
+    count = rng.randrange(max_items + 1)
+    if not count:
+        return []
+    items = []
+    for order in range(count):
+        unit_price = _money(receipt.subtotal / count)
+        items.append(ReceiptItem(
+            receipt=receipt,
+            name=rng.choice(ITEM_NAMES),
+            unit_price=unit_price,
+            total_price=unit_price,
+            category_id=receipt.category_id,
+            order=order
+        ))
+    return items
+
+
+def generate(users=10000, merchants=500, locations_per_merchant=5, receipts=1000000,
+             max_items=4, bonus_zones=10, batch_size=5000, seed=42, progress=None):
+    """
+    Jeu de données synthétique reproductible (même graine, mêmes données).
+    Les insertions passent par bulk_create : les signaux ne sont pas émis,
+    les agrégats (stats, tags, marchands) des données générées sont
+    recalculés à la fin, sans toucher à ceux des vraies données.
+    """
+    rng = random.Random(seed)
+    progress = progress or (lambda message: None)
+
+    user_ids = create_users(users, batch_size)
+    progress(f'{len(user_ids)} utilisateurs')
+    categories = create_categories()
+    merchant_points = create_merchants(
+        rng, merchants, locations_per_merchant, categories, batch_size
+    )
+    merchant_list = list(merchant_points)
+    progress(f'{len(merchant_list)} marchands, {merchants * locations_per_merchant} succursales')
+    create_bonus_zones(rng, bonus_zones)
+    progress(f'{bonus_zones} zones bonus')
+
+    today = timezone.localdate()
+    now = timezone.now()
+    created = 0
+    while created < receipts:
+        size = min(batch_size, receipts - created)
+        with transaction.atomic():
+            batch = Receipt.objects.bulk_create([
+                _build_receipt(rng, user_ids, merchant_list, merchant_points, today, now)
+                for _ in range(size)
+            ])
+            items = []
+            for receipt in batch:
+                items.extend(_build_items(rng, receipt, max_items))
+            ReceiptItem.objects.bulk_create(items, batch_size=batch_size)
+        created += size
+        progress(f'{created}/{receipts} reçus')
+
+    rebuild_stats(user_ids=user_ids)
+    rebuild_tag_counts(user_ids=user_ids)
+    rebuild_merchant_rollup(merchant.id for merchant in merchant_list)
+    bump_catalog_version()
+    progress('Agrégats recalculés')
+
+
+def clear(progress=None):
+    """Supprime toutes les données générées (par lots d'utilisateurs)"""
+    progress = progress or (lambda message: None)
+    user_ids = list(bench_users().values_list('id', flat=True))
+    for start in range(0, len(user_ids), 100):
+        chunk = user_ids[start:start + 100]
+        with transaction.atomic():
+            Receipt.objects.filter(user_id__in=chunk).delete()
+            get_user_model().objects.filter(id__in=chunk).delete()
+        progress(f'{min(start + 100, len(user_ids))}/{len(user_ids)} utilisateurs supprimés')
+
+    BonusZone.objects.filter(name__startswith=f'{BENCH_PREFIX} ').delete()
+    Zone.objects.filter(slug__startswith=f'{BENCH_PREFIX}-').delete()
+    Merchant.objects.filter(slug__startswith=f'{BENCH_PREFIX}-').delete()
+    Category.objects.filter(slug__startswith=f'{BENCH_PREFIX}-').delete()
+    bump_catalog_version()
@@ -0,0 +1,274 @@
+# apps/receipts/benchmarks.py
+import io
+import random
+import resource
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext, override_settings
+from PIL import Image
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.locations.models import MerchantLocation
+from apps.locations.validation import validate_receipt_location
+from .benchmark_data import BENCH_PREFIX, bench_users
+from .models import Receipt
+from .ocr_router import percentile
+from .views import ReceiptUploadView, ReceiptViewSet
+
+
+PERCENTILES = (50, 95, 99)
+
+
+class Scenario:
+    """
+    Un scénario : `setup(i)` prépare l'itération (non chronométré),
+    `run(arg)` est chronométré. Avec rollback, chaque itération s'exécute
+    dans une transaction annulée : les données restent identiques.
+    """
+
+    def __init__(self, name, run, setup=None, rollback=False):
+        self.name = name
+        self.run = run
+        self.setup = setup or (lambda i: None)
+        self.rollback = rollback
+
+
+@contextmanager
+def temporary_storage():
+    """
+    Stockage par défaut dans un répertoire temporaire : les images envoyées
+    par le scénario d'upload ne partent pas dans le vrai bucket
+    """
+    with tempfile.TemporaryDirectory() as media_root:
+        storages = {
+            **settings.STORAGES,
+            'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+        }
+        with override_settings(MEDIA_ROOT=media_root, STORAGES=storages):
+            yield media_root
+
+
+def peak_rss_mb():
+    # ru_maxrss est en Ko sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _iteration(scenario, i):
+    arg = scenario.setup(i)
+    with CaptureQueriesContext(connection) as context:
+        start = time.perf_counter()
+        scenario.run(arg)
+        elapsed = time.perf_counter() - start
+    return elapsed, len(context.captured_queries)
+
+
+def _measure_once(scenario, i):
+    if not scenario.rollback:
+        return _iteration(scenario, i)
+    with transaction.atomic():
+        measured = _iteration(scenario, i)
+        # Les hooks on_commit (Celery, Redis) sont abandonnés avec la transaction
+        transaction.set_rollback(True)
+    return measured
+
+
+def run_scenario(scenario, iterations, warmup=5):
+    for i in range(warmup):
+        _measure_once(scenario, i)
+
+    rss_before = peak_rss_mb()
+    timings = []
+    queries = []
+    for i in range(warmup, warmup + iterations):
+        elapsed, count = _measure_once(scenario, i)
+        timings.append(elapsed * 1000)
+        queries.append(count)
+
+    timings.sort()
+    result = {
+        'scenario': scenario.name,
+        'iterations': iterations,
+        'queries_mean': round(sum(queries) / len(queries), 2),
+        'queries_max': max(queries),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'rss_growth_mb': round(peak_rss_mb() - rss_before, 1),
+    }
+    for pct in PERCENTILES:
+        result[f'p{pct}_ms'] = round(percentile(timings, pct / 100), 2)
+    return result
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Régressions par rapport à une exécution de référence : p95 au-delà de
+    la tolérance, ou requêtes supplémentaires
+    """
+    previous = {entry['scenario']: entry for entry in baseline}
+    regressions = []
+    for entry in results:
+        before = previous.get(entry['scenario'])
+        if not before:
+            continue
+        if entry['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            regressions.append(
+                f"{entry['scenario']} : p95 {before['p95_ms']} -> {entry['p95_ms']} ms"
+            )
+        if entry['queries_max'] > before['queries_max']:
+            regressions.append(
+                f"{entry['scenario']} : requêtes {before['queries_max']} -> {entry['queries_max']}"
+            )
+    return regressions
+
+
+def _jpeg(rng, size=(600, 1000)):
+    """JPEG unique (sinon l'upload est traité comme un doublon)"""
+    image = Image.new('L', size, color=255)
+    pixels = image.load()
+    for _ in range(400):
+        pixels[rng.randrange(size[0]), rng.randrange(size[1])] = rng.randrange(256)
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=80)
+    return buffer.getvalue()
+
+
+def upload_scenario(user, rng, points):
+    """
+    Upload par la vue réelle : corps multipart lu par HashingFileUploadHandler
+    (SHA256 calculé au passage), sérialiseur, enregistrement du reçu
+    """
+    view = ReceiptUploadView.as_view()
+    factory = APIRequestFactory()
+
+    def setup(i):
+        data = {
+            'original_image': SimpleUploadedFile(
+                f'bench-{i}.jpg', _jpeg(rng), content_type='image/jpeg'
+            ),
+            'uploaded_via': 'api',
+        }
+        if points:
+            point = points[i % len(points)]
+            data['location_latitude'] = point.y
+            data['location_longitude'] = point.x
+        request = factory.post('/receipts/upload/', data, format='multipart')
+        force_authenticate(request, user=user)
+        return request
+
+    def run(request):
+        response = view(request)
+        if response.status_code != 201:
+            raise RuntimeError(f'Upload refusé ({response.status_code}) : {response.data}')
+        return response
+
+    return Scenario('upload', run, setup=setup, rollback=True)
+
+
+def mark_processed_scenario(receipt_ids):
+    def setup(i):
+        return Receipt.objects.select_related('user', 'merchant').get(
+            id=receipt_ids[i % len(receipt_ids)]
+        )
+
+    def run(receipt):
+        return receipt.mark_as_processed()
+
+    return Scenario('mark_as_processed', run, setup=setup, rollback=True)
+
+
+def location_scenario(samples):
+    """Validation de localisation (étape du pipeline OCR) sur un reçu inséré"""
+    def setup(i):
+        # Copie d'un reçu localisé (sans validation), insérée sans signaux
+        receipt = Receipt.objects.get(id=samples[i % len(samples)])
+        receipt.pk = None
+        receipt.receipt_uuid = uuid.uuid4()
+        receipt.image_hash = None
+        receipt._state.adding = True
+        return Receipt.objects.bulk_create([receipt])[0]
+
+    def run(receipt):
+        return validate_receipt_location(receipt)
+
+    return Scenario('validate_receipt_location', run, setup=setup, rollback=True)
+
+
+def list_scenario(user, page_size=20):
+    view = ReceiptViewSet.as_view({'get': 'list'})
+    factory = APIRequestFactory()
+
+    def setup(i):
+        request = factory.get(f'/receipts/receipts/?page_size={page_size}')
+        force_authenticate(request, user=user)
+        return request
+
+    def run(request):
+        return view(request).render()
+
+    return Scenario(f'list page_size={page_size}', run, setup=setup)
+
+
+def detail_scenario(user, receipt_ids):
+    view = ReceiptViewSet.as_view({'get': 'retrieve'})
+    factory = APIRequestFactory()
+
+    def setup(i):
+        receipt_id = receipt_ids[i % len(receipt_ids)]
+        request = factory.get(f'/receipts/receipts/{receipt_id}/')
+        force_authenticate(request, user=user)
+        return request, receipt_id
+
+    def run(arg):
+        request, receipt_id = arg
+        return view(request, pk=receipt_id).render()
+
+    return Scenario('detail', run, setup=setup)
+
+
+def build_scenarios(samples=200, seed=42, only=None):
+    """
+    Scénarios sur les données générées : l'utilisateur qui a le plus de
+    reçus (pire cas de la liste) et des reçus tirés au hasard
+    """
+    rng = random.Random(seed)
+    heavy_user = bench_users().annotate(
+        receipt_total=Count('receipts')
+    ).order_by('-receipt_total').first()
+    if heavy_user is None:
+        return []
+
+    receipts = Receipt.objects.filter(user__in=bench_users())
+    processing_ids = list(
+        receipts.filter(ocr_status='processing', merchant__isnull=False)
+        .values_list('id', flat=True)[:samples]
+    )
+    located_ids = list(
+        receipts.filter(location__isnull=False, merchant__isnull=False)
+        .values_list('id', flat=True)[:samples]
+    )
+    points = [
+        location.location for location in
+        MerchantLocation.objects.filter(
+            merchant__slug__startswith=f'{BENCH_PREFIX}-'
+        )[:samples]
+    ]
+    detail_ids = list(
+        receipts.filter(user=heavy_user).values_list('id', flat=True)[:samples]
+    )
+
+    scenarios = [
+        upload_scenario(heavy_user, rng, points),
+        mark_processed_scenario(processing_ids),
+        location_scenario(located_ids),
+        list_scenario(heavy_user),
+        detail_scenario(heavy_user, detail_ids),
+    ]
+    if only:
+        scenarios = [s for s in scenarios if s.name.split()[0] in only]
+    return scenarios
@@ -0,0 +1,151 @@
+# apps/receipts/catalog.py
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlencode
+
+import redis
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+
+VERSION_KEY = 'catalog:version'
+LOCAL_CACHE_SIZE = 64
+
+
+class LocalLRU:
+    """Petit cache LRU en mémoire du processus (payloads déjà encodés)"""
+
+    def __init__(self, max_size=LOCAL_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+
+_local = LocalLRU()
+
+
+def _seed_version():
+    """
+    Version d'une clé recréée (expulsée ou Redis vidé) : basée sur l'heure,
+    elle ne retombe jamais sur une version déjà vue par les processus
+    """
+    return int(time.time() * 1000)
+
+
+def get_catalog_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        seed = _seed_version()
+        cache.add(VERSION_KEY, seed, timeout=None)
+        # Clé expulsée entre add et get : la graine reste une version valide
+        version = cache.get(VERSION_KEY, seed)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalide toutes les entrées du catalogue (nouvelles clés versionnées).
+    Au mieux : appelé après commit, il ne doit pas faire échouer la
+    sauvegarde ou le rollup si Redis est indisponible. Une clé perdue
+    pendant la panne repart d'une graine horaire (nouvelle version).
+    """
+    try:
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:
+            cache.add(VERSION_KEY, _seed_version(), timeout=None)
+    except redis.RedisError:
+        pass
+
+
+def get_catalog_payload(name, variant, build):
+    """
+    Retourne (corps JSON, ETag fort) de l'entrée `name`/`variant` du
+    catalogue pour la version courante : mémoire du processus, puis Redis,
+    puis `build()` (données à sérialiser)
+    """
+    version = get_catalog_version()
+    key = f"catalog:{name}:v{version}:{variant}"
+
+    entry = _local.get(key)
+    if entry is None:
+        entry = cache.get(key)
+        if entry is None:
+            body = JSONRenderer().render(build())
+            entry = (body, '"%s"' % hashlib.sha256(body).hexdigest()[:32])
+            cache.set(key, entry)
+        _local.set(key, entry)
+    return entry
+
+
+class CachedCatalogMixin:
+    """
+    Sert la liste d'un ViewSet depuis le cache versionné du catalogue, avec
+    ETag et réponse 304 si le client a déjà la bonne version
+    """
+    catalog_name = None
+    # Seuls paramètres servis depuis le cache : toute autre requête le
+    # contourne (pas de variantes illimitées ni de paramètres parasites
+    # dans les liens de pagination mis en cache)
+    catalog_query_params = ('page', 'format')
+
+    def get_catalog_variant(self, request):
+        """Clé normalisée de la requête, ou None si elle n'est pas cacheable"""
+        if set(request.query_params) - set(self.catalog_query_params):
+            return None
+        params = []
+        for name in self.catalog_query_params:
+            if name not in request.query_params:
+                continue
+            value = request.query_params[name]
+            if name == 'page':
+                try:
+                    value = str(int(value))
+                except ValueError:
+                    return None
+            params.append((name, value))
+        # Les liens de pagination dépendent de l'hôte
+        return hashlib.md5(
+            f"{request.get_host()}{request.path}?{urlencode(params)}".encode()
+        ).hexdigest()
+
+    def list(self, request, *args, **kwargs):
+        variant = self.get_catalog_variant(request)
+        if request.accepted_renderer.format != 'json' or variant is None:
+            return super().list(request, *args, **kwargs)
+
+        def build():
+            return super(CachedCatalogMixin, self).list(request, *args, **kwargs).data
+
+        try:
+            body, etag = get_catalog_payload(self.catalog_name, variant, build)
+        except redis.RedisError:
+            # Cache indisponible : réponse calculée depuis la base
+            return super().list(request, *args, **kwargs)
+
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(body, content_type='application/json')
+        response['ETag'] = etag
+        # Toujours revalider : la réponse 304 est quasi gratuite
+        response['Cache-Control'] = 'private, no-cache'
+        return response
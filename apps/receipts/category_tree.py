@@ -0,0 +1,134 @@
+# apps/receipts/category_tree.py
+import threading
+import time
+from bisect import bisect_left, bisect_right
+
+import redis
+
+from .catalog import get_catalog_version
+
+
+# Fréquence max de vérification de la version du catalogue (secondes)
+SYNC_INTERVAL = 5
+
+PATH_SEPARATOR = '/'
+
+
+def path_ids(path):
+    """'/3/12/40/' -> [3, 12, 40]"""
+    return [int(part) for part in path.strip(PATH_SEPARATOR).split(PATH_SEPARATOR) if part]
+
+
+class CategoryTree:
+    """
+    Arbre des catégories en mémoire, construit en une requête depuis les
+    chemins matérialisés. Les descendants d'une catégorie forment une plage
+    contiguë une fois triés par chemin.
+    """
+
+    def __init__(self, rows):
+        self.nodes = {row['id']: row for row in rows}
+        self.children = {}
+        for row in rows:
+            self.children.setdefault(row['parent_id'], []).append(row['id'])
+        ordered = sorted(rows, key=lambda row: row['path'])
+        self.sorted_paths = [row['path'] for row in ordered]
+        self.sorted_ids = [row['id'] for row in ordered]
+
+    def get(self, category_id):
+        return self.nodes.get(category_id)
+
+    def name(self, category_id):
+        node = self.nodes.get(category_id)
+        return node['name'] if node else None
+
+    def ancestors(self, category_id):
+        """Ancêtres de la racine au parent direct, en O(profondeur)"""
+        node = self.nodes.get(category_id)
+        if node is None:
+            return []
+        return [self.nodes[i] for i in path_ids(node['path'])[:-1] if i in self.nodes]
+
+    def descendants(self, category_id, include_self=False):
+        """Descendants (ordre du chemin) : une recherche dichotomique, pas de récursion"""
+        node = self.nodes.get(category_id)
+        if node is None:
+            return []
+        prefix = node['path']
+        start = bisect_left(self.sorted_paths, prefix)
+        # '\uffff' trie après tout suffixe possible du préfixe
+        end = bisect_right(self.sorted_paths, prefix + '\uffff')
+        ids = self.sorted_ids[start:end]
+        if not include_self:
+            ids = [i for i in ids if i != category_id]
+        return [self.nodes[i] for i in ids]
+
+    def subtree_sum(self, category_id, values):
+        """Somme de `values` ({id: montant}) sur la catégorie et ses descendants"""
+        return sum(
+            (values.get(node['id'], 0) for node in self.descendants(category_id, include_self=True)),
+            0
+        )
+
+    def rollup(self, values):
+        """
+        Totaux de sous-arbre pour toutes les catégories en une passe :
+        chaque valeur remonte le long du chemin de sa catégorie
+        """
+        totals = {}
+        for category_id, value in values.items():
+            node = self.nodes.get(category_id)
+            if node is None:
+                continue
+            for ancestor_id in path_ids(node['path']):
+                if ancestor_id in self.nodes:
+                    totals[ancestor_id] = totals.get(ancestor_id, 0) + value
+        return totals
+
+
+class CategoryTreeCache:
+    """Arbre partagé par le processus, reconstruit quand le catalogue change"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tree = None
+        self.version = None
+        self.checked_at = 0
+
+    def load(self):
+        from .models import Category
+
+        rows = list(Category.objects.values('id', 'parent_id', 'name', 'path', 'depth'))
+        return CategoryTree(rows)
+
+    def get(self):
+        now = time.monotonic()
+        if self.tree is not None and now - self.checked_at < SYNC_INTERVAL:
+            return self.tree
+
+        try:
+            version = get_catalog_version()
+        except redis.RedisError:
+            # Cache indisponible : la base fait foi, relue à chaque intervalle
+            version = None
+        with self.lock:
+            self.checked_at = now
+            if self.tree is None or version is None or version != self.version:
+                self.tree = self.load()
+                self.version = version
+            return self.tree
+
+    def invalidate(self):
+        with self.lock:
+            self.tree = None
+
+
+_cache = CategoryTreeCache()
+
+
+def get_category_tree():
+    return _cache.get()
+
+
+def invalidate_category_tree():
+    _cache.invalidate()
@@ -0,0 +1,161 @@
+# apps/receipts/dedup.py
+import redis
+from django.utils import timezone
+
+from .models import Receipt
+from .utils import get_redis
+
+
+# Filtre de Bloom Redis : 2^27 bits (16 Mo), ~10M hashes à ~1% de faux positifs
+BLOOM_KEY = 'receipts:image_hash:bloom'
+BLOOM_READY_KEY = 'receipts:image_hash:bloom:ready'
+BLOOM_BITS = 1 << 27
+BLOOM_HASHES = 7
+
+# Filtre local (par processus) des hashes déjà vus, pour éviter l'aller-retour Redis
+LOCAL_BLOOM_BITS = 1 << 23
+
+
+def bloom_offsets(image_hash, size):
+    """
+    Positions des bits pour un hash SHA256 : le digest étant uniforme,
+    on découpe directement 7 fenêtres de 32 bits au lieu de re-hasher
+    """
+    digest = int(image_hash, 16)
+    return [((digest >> (i * 32)) & 0xFFFFFFFF) % size for i in range(BLOOM_HASHES)]
+
+
+class LocalBloomFilter:
+    """
+    Filtre de Bloom en mémoire. Ne contient que des hashes vus par ce
+    processus : un négatif local ne prouve rien, il faut consulter Redis.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.bits = bytearray(size // 8)
+
+    def add(self, image_hash):
+        for offset in bloom_offsets(image_hash, self.size):
+            self.bits[offset >> 3] |= 1 << (offset & 7)
+
+    def __contains__(self, image_hash):
+        return all(
+            self.bits[offset >> 3] & (1 << (offset & 7))
+            for offset in bloom_offsets(image_hash, self.size)
+        )
+
+
+_local_bloom = LocalBloomFilter(LOCAL_BLOOM_BITS)
+
+
+def might_exist(image_hash):
+    """
+    False seulement si le hash n'a certainement jamais été enregistré.
+    En cas de doute (filtre non construit, Redis indisponible) on répond
+    True et l'index receipts_receipt.image_hash tranche.
+    """
+    if image_hash in _local_bloom:
+        return True
+    
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.exists(BLOOM_READY_KEY)
+        for offset in bloom_offsets(image_hash, BLOOM_BITS):
+            pipe.getbit(BLOOM_KEY, offset)
+        ready, *bits = pipe.execute()
+    except redis.RedisError:
+        return True
+    
+    return not ready or all(bits)
+
+
+def find_duplicate(image_hash):
+    """Retourne le reçu existant ayant ce hash d'image, ou None"""
+    if not image_hash or not might_exist(image_hash):
+        return None
+    
+    original = Receipt.objects.filter(image_hash=image_hash).only(
+        'id', 'receipt_uuid', 'user', 'ocr_status', 'ocr_confidence',
+        'is_duplicate', 'original_image', 'thumbnail', 'processed_image',
+        'image_derivatives'
+    ).first()
+    if original:
+        _local_bloom.add(image_hash)
+    return original
+
+
+def register_hash(image_hash):
+    """Ajoute un hash aux filtres après l'insertion d'un reçu"""
+    if not image_hash:
+        return
+    
+    _local_bloom.add(image_hash)
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for offset in bloom_offsets(image_hash, BLOOM_BITS):
+            pipe.setbit(BLOOM_KEY, offset, 1)
+        pipe.execute()
+    except redis.RedisError:
+        # Un bit manquant donnerait des faux négatifs aux autres processus :
+        # le filtre est déclaré non prêt (repli sur l'index) jusqu'au rebuild
+        mark_bloom_stale()
+
+
+def mark_bloom_stale():
+    try:
+        get_redis().delete(BLOOM_READY_KEY)
+    except redis.RedisError:
+        # Redis indisponible : might_exist() répond déjà True partout
+        pass
+
+
+def is_bloom_ready():
+    try:
+        return bool(get_redis().exists(BLOOM_READY_KEY))
+    except redis.RedisError:
+        return False
+
+
+def rebuild_bloom(batch_size=10000):
+    """
+    Reconstruit le filtre Redis depuis receipts_receipt.image_hash.
+    Construit dans une clé temporaire puis la renomme atomiquement.
+    """
+    client = get_redis()
+    tmp_key = f"{BLOOM_KEY}:rebuild"
+    client.delete(tmp_key)
+    started_at = timezone.now()
+    
+    count = _fill_bloom(client, tmp_key, Receipt.objects.all(), batch_size)
+    if count:
+        client.rename(tmp_key, BLOOM_KEY)
+    else:
+        client.delete(BLOOM_KEY)
+    
+    # Les hashes enregistrés pendant la reconstruction sont allés dans
+    # l'ancienne clé : on les rejoue dans la nouvelle
+    _fill_bloom(
+        client, BLOOM_KEY,
+        Receipt.objects.filter(created_at__gte=started_at),
+        batch_size
+    )
+    client.set(BLOOM_READY_KEY, 1)
+    return count
+
+
+def _fill_bloom(client, key, queryset, batch_size):
+    hashes = queryset.exclude(image_hash=None).values_list(
+        'image_hash', flat=True
+    ).iterator(chunk_size=batch_size)
+    
+    count = 0
+    pipe = client.pipeline(transaction=False)
+    for image_hash in hashes:
+        for offset in bloom_offsets(image_hash, BLOOM_BITS):
+            pipe.setbit(key, offset, 1)
+        count += 1
+        if count % batch_size == 0:
+            pipe.execute()
+    pipe.execute()
+    return count
@@ -0,0 +1,141 @@
+# apps/receipts/derivatives.py
+import io
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+
+# (nom, côté max en pixels)
+RENDITIONS = [
+    ('large', 1600),
+    ('small', 640),
+    ('thumb', 256),
+]
+
+# WebP partout ; AVIF si Pillow a été compilé avec
+FORMATS = ['webp'] + (['avif'] if features.check('avif') else [])
+
+ENCODE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60, 'speed': 8},
+}
+
+# None : pool pas encore créé ; False : rendu dans le processus courant
+_pool = None
+
+
+def render_derivatives(image_bytes):
+    """
+    Produit toutes les déclinaisons d'une image : {'thumb.webp': bytes, ...}
+    Fonction pure (exécutée dans un processus du pool).
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    # Décodage JPEG directement à l'échelle utile (1/2, 1/4, 1/8)
+    largest = RENDITIONS[0][1]
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image).convert('RGB')
+
+    outputs = {}
+    for name, size in RENDITIONS:
+        # Réductions successives : chaque taille part de la précédente
+        image.thumbnail((size, size), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            buffer = io.BytesIO()
+            image.save(buffer, **ENCODE_OPTIONS[fmt])
+            outputs[f"{name}.{fmt}"] = buffer.getvalue()
+    return outputs
+
+
+def get_worker_count():
+    """
+    Taille du pool d'encodage (DERIVATIVE_WORKERS). Un enfant du pool
+    prefork de Celery (processus démon) ne peut pas avoir d'enfants, et
+    le prefork occupe déjà un processus par cœur : rendu sur place (0).
+    """
+    if multiprocessing.current_process().daemon:
+        return 0
+    workers = settings.INOVOCB_SETTINGS['DERIVATIVE_WORKERS']
+    if workers is None:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+    return workers
+
+
+def get_pool():
+    """
+    Pool de processus, créé à la première utilisation.
+    None si le rendu se fait dans le processus courant.
+    """
+    global _pool
+    if _pool is None:
+        workers = get_worker_count()
+        try:
+            _pool = ProcessPoolExecutor(max_workers=workers) if workers else False
+        except (AssertionError, OSError):
+            _pool = False
+    return _pool or None
+
+
+def render_in_pool(image_bytes):
+    global _pool
+    pool = get_pool()
+    if pool is None:
+        return render_derivatives(image_bytes)
+    try:
+        return pool.submit(render_derivatives, image_bytes).result()
+    except BrokenProcessPool:
+        # Enfant tué (OOM) : pool recréé au prochain appel
+        _pool = None
+    except AssertionError:
+        # Enfants interdits dans ce processus : ne plus essayer
+        _pool = False
+    pool.shutdown(wait=False)
+    return render_derivatives(image_bytes)
+
+
+def derivative_path(image_hash, key):
+    """Chemin adressé par contenu : une même image n'est encodée qu'une fois"""
+    return f"receipts/derivatives/{image_hash[:2]}/{image_hash}/{key}"
+
+
+def generate_derivatives(receipt):
+    """
+    Encode et enregistre les déclinaisons d'un reçu, puis renseigne
+    thumbnail, processed_image et image_derivatives.
+    Retourne False si rien n'était à faire.
+    """
+    if receipt.image_derivatives or not receipt.original_image:
+        return False
+
+    storage = receipt.original_image.storage
+    image_hash = receipt.image_hash or receipt.calculate_image_hash()
+    expected = [f"{name}.{fmt}" for name, _ in RENDITIONS for fmt in FORMATS]
+    paths = {key: derivative_path(image_hash, key) for key in expected}
+
+    # Déclinaisons déjà présentes (tâche rejouée) : pas de ré-encodage
+    if not all(storage.exists(path) for path in paths.values()):
+        with receipt.original_image.open('rb') as original:
+            outputs = render_in_pool(original.read())
+        for key, data in outputs.items():
+            if not storage.exists(paths[key]):
+                paths[key] = storage.save(paths[key], ContentFile(data))
+
+    receipt.image_derivatives = paths
+    receipt.thumbnail = paths['thumb.webp']
+    receipt.processed_image = paths['large.webp']
+    receipt.save(update_fields=['image_derivatives', 'thumbnail', 'processed_image', 'updated_at'])
+
+    # Doublons exacts créés avant la fin de l'encodage : ils partagent l'image
+    receipt.duplicates.filter(
+        original_image=receipt.original_image.name,
+        image_derivatives={}
+    ).update(
+        image_derivatives=paths,
+        thumbnail=paths['thumb.webp'],
+        processed_image=paths['large.webp']
+    )
+    return True
@@ -0,0 +1,136 @@
+# apps/receipts/exports.py
+import csv
+import gzip
+import io
+import itertools
+import tempfile
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.core.files import File
+from django.core.files.storage import default_storage
+
+from .models import Receipt
+
+
+# Taille des lots lus par le curseur serveur
+CHUNK_SIZE = 2000
+
+# Au-delà, l'export est produit par une tâche Celery
+STREAM_MAX_RECEIPTS = 20000
+
+# (en-tête CSV, chemin ORM) : une ligne par article, articles en LEFT JOIN
+EXPORT_COLUMNS = [
+    ('receipt_uuid', 'receipt_uuid'),
+    ('user_email', 'user__email'),
+    ('purchase_date', 'purchase_date'),
+    ('purchase_time', 'purchase_time'),
+    ('merchant', 'merchant__display_name'),
+    ('merchant_name_raw', 'merchant_name_raw'),
+    ('category', 'category__name'),
+    ('currency', 'currency'),
+    ('subtotal', 'subtotal'),
+    ('tax_amount', 'tax_amount'),
+    ('total_amount', 'total_amount'),
+    ('cashback_amount', 'cashback_amount'),
+    ('bonus_amount', 'bonus_amount'),
+    ('ocr_status', 'ocr_status'),
+    ('item_name', 'items__name'),
+    ('item_quantity', 'items__quantity'),
+    ('item_unit_price', 'items__unit_price'),
+    ('item_total_price', 'items__total_price'),
+    ('item_sku', 'items__sku'),
+    ('item_taxable', 'items__is_taxable'),
+]
+
+
+# Début de cellule interprété comme une formule par les tableurs
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def escape_cell(value):
+    """
+    Neutralise l'injection de formules : un texte saisi (notes, nom OCR,
+    article) commençant par un caractère de formule est préfixé d'une
+    apostrophe. Les montants (Decimal) ne sont pas touchés.
+    """
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    """Pseudo-fichier : csv.writer retourne directement la ligne écrite"""
+
+    def write(self, value):
+        return value
+
+
+def get_export_queryset(user=None, start=None, end=None):
+    """Reçus à exporter (tous les utilisateurs si user est None)"""
+    queryset = Receipt.objects.all()
+    if user is not None:
+        queryset = queryset.filter(user=user)
+    if start:
+        queryset = queryset.filter(purchase_date__gte=start)
+    if end:
+        queryset = queryset.filter(purchase_date__lte=end)
+    return queryset
+
+
+def iter_export_rows(queryset):
+    """
+    Lignes d'export (en-tête compris) lues par lots via un curseur serveur :
+    la mémoire ne dépend pas du nombre de reçus
+    """
+    yield [header for header, _ in EXPORT_COLUMNS]
+    rows = queryset.order_by('purchase_date', 'id', 'items__order', 'items__id').values_list(
+        *[path for _, path in EXPORT_COLUMNS]
+    )
+    for row in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield [escape_cell(value) for value in row]
+
+
+def iter_csv(queryset):
+    writer = csv.writer(Echo())
+    for row in iter_export_rows(queryset):
+        yield writer.writerow(row)
+
+
+def _next_lines(lines, count):
+    return list(itertools.islice(lines, count))
+
+
+async def aiter_csv(queryset):
+    """
+    iter_csv pour ASGI : un itérateur synchrone serait lu en entier
+    (sync_to_async(list)) avant le premier octet. Chaque appel synchrone ne
+    lit qu'un lot du curseur serveur, envoyé aussitôt.
+    """
+    lines = iter_csv(queryset)
+    read = sync_to_async(_next_lines)
+    while True:
+        chunk = await read(lines, CHUNK_SIZE)
+        if not chunk:
+            break
+        yield ''.join(chunk)
+
+
+def write_export_file(queryset, owner_id):
+    """
+    Écrit l'export en CSV gzip dans un fichier temporaire (sur disque) puis
+    l'enregistre dans le stockage. Retourne le chemin enregistré.
+    """
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.GzipFile(fileobj=tmp, mode='wb') as gz:
+            text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            for row in iter_export_rows(queryset):
+                writer.writerow(row)
+            text.flush()
+            text.detach()
+        tmp.seek(0)
+        path = f"exports/{owner_id}/receipts-{uuid.uuid4().hex}.csv.gz"
+        return default_storage.save(path, File(tmp))
@@ -0,0 +1,94 @@
+# apps/receipts/items.py
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .models import ReceiptItem
+
+
+CENT = Decimal('0.01')
+MILLI = Decimal('0.001')
+
+# Écart toléré entre quantité x prix unitaire et le prix total d'une ligne
+LINE_TOLERANCE = Decimal('0.02')
+
+# Écart toléré entre la somme des lignes et le sous-total du reçu
+SUBTOTAL_TOLERANCE = Decimal('0.05')
+
+BULK_BATCH_SIZE = 500
+
+
+def _amount(value, exponent=CENT):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value)).quantize(exponent)
+    except InvalidOperation:
+        return None
+
+
+def build_items(receipt, items):
+    """
+    Construit les ReceiptItem (non enregistrés) à partir des lignes OCR et
+    vérifie les montants en une seule passe.
+    Retourne (articles, anomalies).
+    """
+    objects = []
+    problems = []
+    lines_total = Decimal('0')
+
+    for index, item in enumerate(items or []):
+        name = (item.get('name') or '').strip()[:255]
+        quantity = _amount(item.get('quantity'), MILLI) or Decimal('1')
+        unit_price = _amount(item.get('unit_price'))
+        total_price = _amount(item.get('total_price', item.get('total')))
+
+        if not name or (unit_price is None and total_price is None):
+            problems.append(f"ligne {index + 1} illisible")
+            continue
+
+        # Une seule valeur lue : on déduit l'autre
+        if total_price is None:
+            total_price = (quantity * unit_price).quantize(CENT)
+        elif unit_price is None:
+            unit_price = (total_price / quantity).quantize(CENT) if quantity else total_price
+        elif abs(quantity * unit_price - total_price) > LINE_TOLERANCE:
+            problems.append(
+                f"ligne {index + 1}: {quantity} x {unit_price} != {total_price}"
+            )
+
+        lines_total += total_price
+        objects.append(ReceiptItem(
+            receipt=receipt,
+            name=name,
+            quantity=quantity,
+            unit_price=unit_price,
+            total_price=total_price,
+            sku=(item.get('sku') or '')[:50],
+            barcode=(item.get('barcode') or '')[:50],
+            is_taxable=item.get('taxable', True) is not False,
+            order=index,
+        ))
+
+    if objects and receipt.subtotal is not None:
+        if abs(lines_total - receipt.subtotal) > SUBTOTAL_TOLERANCE:
+            problems.append(
+                f"somme des lignes {lines_total} != sous-total {receipt.subtotal}"
+            )
+
+    return objects, problems
+
+
+def ingest_receipt_items(receipt, items):
+    """
+    Remplace les articles d'un reçu par ceux extraits par l'OCR, en un seul
+    bulk_create. Retourne la liste des anomalies de montants (vide si OK).
+    """
+    objects, problems = build_items(receipt, items)
+
+    with transaction.atomic():
+        # Tâche rejouée : on repart des lignes de la dernière extraction
+        receipt.items.all().delete()
+        ReceiptItem.objects.bulk_create(objects, batch_size=BULK_BATCH_SIZE)
+
+    return problems
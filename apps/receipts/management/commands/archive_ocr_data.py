@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from apps.receipts.archive import archive_old_receipts
+
+
+class Command(BaseCommand):
+    help = 'Archiver dans le stockage (zstd) les données OCR brutes des anciens reçus'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Âge minimal des reçus (OCR_ARCHIVE_AFTER_DAYS par défaut)'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Nombre maximal de reçus à archiver'
+        )
+    
+    def handle(self, *args, **options):
+        count = archive_old_receipts(days=options['days'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'{count} reçus archivés'))
@@ -0,0 +1,51 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.receipts.phash import (
+    compute_dhash, distance_distribution, get_near_duplicate_distance
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesurer les distances dHash sur des photos réelles : un sous-répertoire '
+        'par reçu, contenant plusieurs photos de ce reçu'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+    
+    def handle(self, *args, **options):
+        directory = options['directory']
+        if not os.path.isdir(directory):
+            raise CommandError(f'Répertoire introuvable : {directory}')
+        
+        groups = {}
+        for receipt in sorted(os.listdir(directory)):
+            path = os.path.join(directory, receipt)
+            if not os.path.isdir(path):
+                continue
+            groups[receipt] = []
+            for name in sorted(os.listdir(path)):
+                with open(os.path.join(path, name), 'rb') as f:
+                    groups[receipt].append(compute_dhash(f))
+        
+        same, different = distance_distribution(groups)
+        if not same or not different:
+            raise CommandError('Il faut au moins deux reçus avec deux photos chacun')
+        
+        threshold = get_near_duplicate_distance()
+        missed = sum(1 for distance in same if distance > threshold)
+        false_matches = sum(1 for distance in different if distance <= threshold)
+        self.stdout.write(f'Même reçu : {len(same)} paires, distance max {same[-1]}')
+        self.stdout.write(f'Reçus différents : {len(different)} paires, distance min {different[0]}')
+        self.stdout.write(
+            f'Seuil actuel {threshold} : {missed} re-photos manquées, '
+            f'{false_matches} faux doublons'
+        )
+        if same[-1] < different[0]:
+            self.stdout.write(self.style.SUCCESS(
+                f'Seuils sans erreur : {same[-1]} à {different[0] - 1}'
+            ))
+        else:
+            self.stdout.write(self.style.WARNING('Aucun seuil ne sépare les échantillons'))
@@ -0,0 +1,70 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from apps.receipts.models import Receipt
+from apps.receipts.views import ReceiptViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Vérifier que la liste et le détail des reçus s\'exécutent en un '
+        'nombre constant de requêtes (régression N+1)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', required=True, help='Utilisateur ayant des reçus')
+        parser.add_argument('--max-queries', type=int, default=4)
+        parser.add_argument('--samples', type=int, default=10)
+
+    def count_queries(self, view, user, path, **kwargs):
+        request = APIRequestFactory().get(path)
+        force_authenticate(request, user=user)
+        with CaptureQueriesContext(connection) as context:
+            response = view(request, **kwargs)
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{path} : HTTP {response.status_code}')
+        return len(context.captured_queries)
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('Utilisateur introuvable')
+
+        list_view = ReceiptViewSet.as_view({'get': 'list'})
+        detail_view = ReceiptViewSet.as_view({'get': 'retrieve'})
+
+        results = {}
+        for page_size in (1, 20, 100):
+            results[f'liste page_size={page_size}'] = self.count_queries(
+                list_view, user, f'/receipts/receipts/?page_size={page_size}'
+            )
+
+        # Derniers reçus : nombres d'articles et de pages variés
+        receipts = Receipt.objects.filter(user=user).order_by('-created_at')
+        sample = list(receipts.values_list('id', flat=True)[:options['samples']])
+        if not sample:
+            raise CommandError('Aucun reçu pour cet utilisateur')
+        for receipt_id in sample:
+            results[f'détail {receipt_id}'] = self.count_queries(
+                detail_view, user, f'/receipts/receipts/{receipt_id}/', pk=receipt_id
+            )
+
+        for label, count in results.items():
+            self.stdout.write(f'{label}: {count} requêtes')
+
+        list_counts = {c for label, c in results.items() if label.startswith('liste')}
+        detail_counts = {c for label, c in results.items() if label.startswith('détail')}
+        if len(list_counts) > 1 or len(detail_counts) > 1:
+            raise CommandError('Le nombre de requêtes dépend de la taille des données (N+1)')
+        if max(results.values()) > options['max_queries']:
+            raise CommandError(f'Plus de {options["max_queries"]} requêtes par appel')
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Liste : {list_counts.pop()} requêtes, détail : {detail_counts.pop()} requêtes'
+            )
+        )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.receipts.benchmark_data import bench_users, clear, generate
+
+
+class Command(BaseCommand):
+    help = (
+        'Générer un jeu de données synthétique pour les benchmarks '
+        '(utilisateurs, marchands, succursales, zones bonus, reçus)'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--merchants', type=int, default=500)
+        parser.add_argument('--locations-per-merchant', type=int, default=5)
+        parser.add_argument('--receipts', type=int, default=1000000)
+        parser.add_argument('--max-items', type=int, default=4, help='Articles par reçu (0 à N)')
+        parser.add_argument('--bonus-zones', type=int, default=10)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Supprimer les données de benchmark existantes avant de générer'
+        )
+        parser.add_argument(
+            '--clear-only',
+            action='store_true',
+            help='Supprimer les données de benchmark sans rien générer'
+        )
+    
+    def handle(self, *args, **options):
+        if options['clear'] or options['clear_only']:
+            clear(progress=self.stdout.write)
+            if options['clear_only']:
+                self.stdout.write(self.style.SUCCESS('Données de benchmark supprimées'))
+                return
+        
+        if bench_users().exists():
+            raise CommandError('Des données de benchmark existent déjà (utiliser --clear)')
+        
+        generate(
+            users=options['users'],
+            merchants=options['merchants'],
+            locations_per_merchant=options['locations_per_merchant'],
+            receipts=options['receipts'],
+            max_items=options['max_items'],
+            bonus_zones=options['bonus_zones'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            progress=self.stdout.write
+        )
+        self.stdout.write(self.style.SUCCESS('Données de benchmark générées'))
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from apps.receipts.partitions import check_pruning, create_partitions, detach_partitions
+
+
+class Command(BaseCommand):
+    help = 'Créer les partitions mensuelles futures des logs OCR et détacher les anciennes'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int, default=3)
+        parser.add_argument(
+            '--retain-months',
+            type=int,
+            default=None,
+            help='Détacher les partitions plus anciennes (aucune par défaut)'
+        )
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Supprimer les partitions détachées'
+        )
+        parser.add_argument(
+            '--check-pruning',
+            action='store_true',
+            help='Vérifier par EXPLAIN qu\'une requête bornée ne lit que les partitions utiles'
+        )
+    
+    def handle(self, *args, **options):
+        created = create_partitions(months_ahead=options['months_ahead'])
+        for name in created:
+            self.stdout.write(f'Partition créée : {name}')
+        
+        if options['retain_months'] is not None:
+            detached = detach_partitions(
+                retain_months=options['retain_months'],
+                drop=options['drop']
+            )
+            for name in detached:
+                action = 'supprimée' if options['drop'] else 'détachée'
+                self.stdout.write(f'Partition {action} : {name}')
+        
+        if options['check_pruning']:
+            scanned, expected = check_pruning()
+            self.stdout.write(f'Partitions lues : {", ".join(sorted(scanned)) or "aucune"}')
+            if not scanned <= expected:
+                raise CommandError(
+                    f'Élagage inefficace, partitions en trop : {", ".join(sorted(scanned - expected))}'
+                )
+        
+        self.stdout.write(self.style.SUCCESS('Partitions des logs OCR à jour'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from apps.receipts.dedup import rebuild_bloom
+
+
+class Command(BaseCommand):
+    help = 'Reconstruire le filtre de Bloom Redis des hashes d\'images de reçus'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+    
+    def handle(self, *args, **options):
+        count = rebuild_bloom(batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Filtre reconstruit avec {count} hashes')
+        )
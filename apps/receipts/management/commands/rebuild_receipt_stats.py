@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from apps.receipts.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalculer les statistiques agrégées des reçus depuis les reçus complétés'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='UUID d\'un utilisateur (tous par défaut)')
+    
+    def handle(self, *args, **options):
+        count = rebuild_stats(user_id=options['user'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} lignes de statistiques recalculées')
+        )
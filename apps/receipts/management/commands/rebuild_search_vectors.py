@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from apps.receipts.models import Receipt
+from apps.receipts.search import REBUILD_BATCH_SIZE, update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recalculer les vecteurs de recherche plein texte des reçus'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+        parser.add_argument(
+            '--missing',
+            action='store_true',
+            help='Seulement les reçus sans vecteur'
+        )
+    
+    def handle(self, *args, **options):
+        queryset = Receipt.objects.order_by('id')
+        if options['missing']:
+            queryset = queryset.filter(search_vector__isnull=True)
+        
+        batch = []
+        count = 0
+        for receipt_id in queryset.values_list('id', flat=True).iterator(chunk_size=options['batch_size']):
+            batch.append(receipt_id)
+            if len(batch) >= options['batch_size']:
+                count += update_search_vectors(batch)
+                batch = []
+        count += update_search_vectors(batch)
+        
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} vecteurs de recherche recalculés')
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from apps.receipts.tags import rebuild_tag_counts
+
+
+class Command(BaseCommand):
+    help = 'Recalculer les compteurs de tags des reçus'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='UUID d\'un utilisateur (tous par défaut)')
+    
+    def handle(self, *args, **options):
+        count = rebuild_tag_counts(user_id=options['user'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} compteurs de tags recalculés')
+        )
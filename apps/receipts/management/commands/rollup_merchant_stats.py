@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from apps.receipts.rollups import rollup_merchant_stats
+
+
+class Command(BaseCommand):
+    help = 'Agréger les reçus complétés dans les statistiques des marchands'
+    
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Remettre les compteurs à zéro et tout recalculer'
+        )
+    
+    def handle(self, *args, **options):
+        count = rollup_merchant_stats(rebuild=options['rebuild'])
+        self.stdout.write(
+            self.style.SUCCESS(f'{count} reçus agrégés')
+        )
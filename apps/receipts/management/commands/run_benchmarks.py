@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from apps.receipts.benchmarks import (
+    PERCENTILES, build_scenarios, compare, run_scenario, temporary_storage
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mesurer les chemins critiques des reçus (upload, fin OCR, validation '
+        'de localisation, liste, détail) : latences p50/p95/p99, requêtes, RSS'
+    )
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=['upload', 'mark_as_processed', 'validate_receipt_location', 'list', 'detail'],
+            help='Scénario à exécuter (répétable, tous par défaut)'
+        )
+        parser.add_argument('--output', help='Écrire les résultats (JSON) dans ce fichier')
+        parser.add_argument('--baseline', help='Résultats de référence (JSON) à comparer')
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Hausse de p95 tolérée par rapport à la référence (0.2 = 20 %%)'
+        )
+    
+    def handle(self, *args, **options):
+        scenarios = build_scenarios(seed=options['seed'], only=options['scenario'])
+        if not scenarios:
+            raise CommandError('Aucune donnée de benchmark (voir generate_benchmark_data)')
+        
+        results = []
+        # Les images de l'upload sont écrites dans un répertoire temporaire
+        with temporary_storage():
+            for scenario in scenarios:
+                self.stdout.write(f'{scenario.name}...')
+                result = run_scenario(scenario, options['iterations'], warmup=options['warmup'])
+                results.append(result)
+                latencies = ' '.join(f"p{pct}={result[f'p{pct}_ms']}ms" for pct in PERCENTILES)
+                self.stdout.write(
+                    f"  {latencies} requêtes={result['queries_mean']} (max {result['queries_max']}) "
+                    f"RSS={result['peak_rss_mb']}Mo (+{result['rss_growth_mb']})"
+                )
+        
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+            regressions = compare(results, baseline, options['tolerance'])
+            if regressions:
+                for regression in regressions:
+                    self.stderr.write(regression)
+                raise CommandError(f'{len(regressions)} régression(s) de performance')
+        
+        self.stdout.write(self.style.SUCCESS(f'{len(results)} scénarios mesurés'))
@@ -0,0 +1,86 @@
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class StubOCRHandler(BaseHTTPRequestHandler):
+    """Répond à POST /v1/ocr/<provider> comme le service OCR"""
+    
+    latency = 0.0
+    fail_rate = 0.0
+    # Coût déclaré par appel (None : le champ est omis)
+    cost = None
+    # Fournisseurs en panne (503) ou saturés (429)
+    unavailable = ()
+    busy = ()
+    
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        provider = self.path.rstrip('/').rsplit('/', 1)[-1]
+        
+        time.sleep(self.latency)
+        if provider in self.busy:
+            self.send_error(429, f"{provider} saturé")
+            return
+        if provider in self.unavailable or random.random() < self.fail_rate:
+            self.send_error(503, f"{provider} indisponible")
+            return
+        
+        pages = payload.get('pages', [])
+        result = {
+            'merchant_name': 'IGA Extra',
+            'date': timezone.localdate().isoformat(),
+            'time': '12:30:00',
+            'currency': 'CAD',
+            'subtotal': '20.00',
+            'tax': '2.99',
+            'total': '22.99',
+            'items': [
+                {'name': 'Lait 2% 4L', 'quantity': '1', 'unit_price': '6.49', 'total_price': '6.49'},
+                {'name': 'Pain tranché', 'quantity': '2', 'unit_price': '3.50', 'total_price': '7.00'},
+                {'name': 'Bananes', 'quantity': '1.25', 'unit_price': '5.21', 'total_price': '6.51'},
+            ],
+            'text': f"IGA EXTRA\nLAIT 2% 4L 6.49\nPAIN TRANCHE 7.00\nBANANES 6.51\nTOTAL 22.99 ({len(pages)} page(s))",
+            'confidence': 0.92,
+            'credits': len(pages),
+        }
+        if self.cost is not None:
+            result['cost'] = self.cost
+        body = json.dumps(result).encode()
+        
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Lancer un service OCR factice local (OCR_SERVICE_URL) pour les tests'
+    
+    def add_arguments(self, parser):
+        parser.add_argument('--port', type=int, default=8080)
+        parser.add_argument('--latency', type=float, default=0.2, help='Latence simulée (s)')
+        parser.add_argument('--fail-rate', type=float, default=0.0, help='Taux d\'erreurs 503')
+        parser.add_argument('--cost', default=None, help='Coût déclaré par appel')
+    
+    def handle(self, *args, **options):
+        StubOCRHandler.latency = options['latency']
+        StubOCRHandler.fail_rate = options['fail_rate']
+        StubOCRHandler.cost = options['cost']
+        server = ThreadingHTTPServer(('127.0.0.1', options['port']), StubOCRHandler)
+        self.stdout.write(
+            self.style.SUCCESS(f"Service OCR factice sur http://127.0.0.1:{options['port']}")
+        )
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
@@ -0,0 +1,281 @@
+# apps/receipts/merchant_resolver.py
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import defaultdict
+
+import redis
+
+from .utils import get_redis
+
+
+VERSION_KEY = 'merchant_alias:version'
+CHANGES_KEY = 'merchant_alias:changes'
+CHANGES_KEPT = 1000
+
+# Fréquence max de vérification de la version partagée (secondes)
+SYNC_INTERVAL = 5
+
+# Score minimal pour rattacher un reçu à un marchand
+MATCH_THRESHOLD = 0.75
+
+# Pénalité d'un alias trouvé en préfixe (« iga extra » dans « iga extra laval »)
+PREFIX_PENALTY = 0.95
+
+# Version et entrée du journal écrites ensemble : un lecteur ne voit jamais
+# une version sans la modification correspondante
+PUBLISH_SCRIPT = """
+local version = redis.call('INCR', KEYS[1])
+redis.call('RPUSH', KEYS[2], cjson.encode({v = version, id = tonumber(ARGV[1])}))
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[2]), -1)
+return version
+"""
+
+_STORE_NUMBER = re.compile(r'#\s*\d+|\b\d+\b')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+
+def normalize(name):
+    """Minuscules, sans accents, sans numéros de magasin ni ponctuation"""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c)).lower()
+    name = _STORE_NUMBER.sub(' ', name)
+    return ' '.join(_NON_ALNUM.sub(' ', name).split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AliasTrie:
+    """Arbre préfixe des alias normalisés, nœud = dict, '$' = terminaux"""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key, alias_id):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+        node.setdefault('$', set()).add(alias_id)
+
+    def remove(self, key, alias_id):
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return
+        node.get('$', set()).discard(alias_id)
+
+    def exact(self, key):
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return set()
+        return node.get('$', set())
+
+    def longest_prefix(self, key):
+        """Alias le plus long qui est un préfixe de key, sur une frontière de mot"""
+        node = self.root
+        best = set()
+        for index, char in enumerate(key):
+            node = node.get(char)
+            if node is None:
+                break
+            if node.get('$') and (index + 1 == len(key) or key[index + 1] == ' '):
+                best = node['$']
+        return best
+
+
+class MerchantResolver:
+    """
+    Index en mémoire des MerchantAlias : arbre préfixe pour les
+    correspondances exactes/préfixes et index inversé de trigrammes pour
+    les noms OCR bruités. Rechargé de façon incrémentale via un journal
+    des modifications dans Redis.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.version = 0
+        self.checked_at = 0
+        self._reset()
+
+    def _reset(self):
+        self.trie = AliasTrie()
+        self.aliases = {}  # id -> (clé normalisée, merchant_id, confiance, trigrammes)
+        self.trigram_index = defaultdict(set)
+
+    # Chargement
+
+    def _add(self, alias_id, alias, merchant_id, confidence):
+        key = normalize(alias)
+        if not key:
+            return
+        grams = trigrams(key)
+        self.aliases[alias_id] = (key, merchant_id, confidence, grams)
+        self.trie.add(key, alias_id)
+        for gram in grams:
+            self.trigram_index[gram].add(alias_id)
+
+    def _remove(self, alias_id):
+        entry = self.aliases.pop(alias_id, None)
+        if entry is None:
+            return
+        key, _, _, grams = entry
+        self.trie.remove(key, alias_id)
+        for gram in grams:
+            self.trigram_index[gram].discard(alias_id)
+
+    def _alias_rows(self, ids=None):
+        from .models import MerchantAlias
+
+        queryset = MerchantAlias.objects.filter(merchant__is_active=True)
+        if ids is not None:
+            queryset = queryset.filter(id__in=ids)
+        return queryset.values_list('id', 'alias', 'merchant_id', 'confidence').iterator()
+
+    def reload(self):
+        with self.lock:
+            self.version = self._shared_version()
+            self._reset()
+            for row in self._alias_rows():
+                self._add(*row)
+            self.loaded = True
+            self.checked_at = time.monotonic()
+
+    def apply_changes(self, alias_ids):
+        """Recharge seulement les alias indiqués (ajoutés, modifiés ou supprimés)"""
+        alias_ids = set(alias_ids)
+        with self.lock:
+            for alias_id in alias_ids:
+                self._remove(alias_id)
+            for row in self._alias_rows(alias_ids):
+                self._add(*row)
+
+    def _shared_version(self):
+        try:
+            return int(get_redis().get(VERSION_KEY) or 0)
+        except redis.RedisError:
+            return self.version
+
+    def sync(self):
+        """Applique les modifications publiées par les autres processus"""
+        if not self.loaded:
+            self.reload()
+            return
+        if time.monotonic() - self.checked_at < SYNC_INTERVAL:
+            return
+
+        with self.lock:
+            self.checked_at = time.monotonic()
+            shared = self._shared_version()
+            if shared <= self.version:
+                return
+            try:
+                changes = [json.loads(c) for c in get_redis().lrange(CHANGES_KEY, 0, -1)]
+            except redis.RedisError:
+                return
+
+            pending = sorted(
+                (c for c in changes if c['v'] > self.version),
+                key=lambda c: c['v']
+            )
+            # Journal tronqué : on a raté des modifications, rechargement complet
+            if not pending or pending[0]['v'] != self.version + 1:
+                self.reload()
+                return
+
+            # On n'avance que jusqu'à la dernière version contiguë lue : une
+            # version manquante sera relue à la prochaine synchronisation
+            version = self.version
+            alias_ids = []
+            for change in pending:
+                if change['v'] > version + 1:
+                    break
+                version = change['v']
+                alias_ids.append(change['id'])
+            self.apply_changes(alias_ids)
+            self.version = version
+
+    # Résolution
+
+    def resolve(self, raw_name):
+        """
+        Retourne (merchant_id, score) pour un nom brut, ou (None, 0).
+        score = similarité du nom x confiance de l'alias.
+        """
+        self.sync()
+        key = normalize(raw_name)
+        if not key:
+            return None, 0
+
+        with self.lock:
+            candidates = {}
+
+            for alias_id in self.trie.exact(key):
+                candidates[alias_id] = 1.0
+
+            if not candidates:
+                for alias_id in self.trie.longest_prefix(key):
+                    candidates[alias_id] = PREFIX_PENALTY
+
+            if not candidates:
+                grams = trigrams(key)
+                shared = defaultdict(int)
+                for gram in grams:
+                    for alias_id in self.trigram_index.get(gram, ()):
+                        shared[alias_id] += 1
+                for alias_id, count in shared.items():
+                    # Coefficient de Dice sur les trigrammes
+                    candidates[alias_id] = 2 * count / (len(grams) + len(self.aliases[alias_id][3]))
+
+            best = (None, 0)
+            for alias_id, similarity in candidates.items():
+                _, merchant_id, confidence, _ = self.aliases[alias_id]
+                score = similarity * confidence
+                if score > best[1]:
+                    best = (merchant_id, score)
+            return best
+
+
+resolver = MerchantResolver()
+
+
+def publish_alias_change(alias_id):
+    """
+    Signale la modification d'un alias : appliquée tout de suite dans ce
+    processus, publiée dans Redis pour les autres
+    """
+    if resolver.loaded:
+        resolver.apply_changes([alias_id])
+    try:
+        version = int(get_redis().eval(
+            PUBLISH_SCRIPT, 2, VERSION_KEY, CHANGES_KEY, alias_id, CHANGES_KEPT
+        ))
+    except redis.RedisError:
+        return
+    with resolver.lock:
+        # Nos propres modifications sont déjà appliquées
+        if resolver.version == version - 1:
+            resolver.version = version
+
+
+def resolve_receipt_merchant(receipt):
+    """Rattache le reçu au marchand correspondant à merchant_name_raw"""
+    if receipt.merchant_id or not receipt.merchant_name_raw:
+        return None
+
+    merchant_id, score = resolver.resolve(receipt.merchant_name_raw)
+    if merchant_id is None or score < MATCH_THRESHOLD:
+        return None
+
+    receipt.merchant_id = merchant_id
+    # save() calcule le cashback à partir du marchand
+    receipt.save(update_fields=['merchant', 'cashback_amount', 'cashback_rate', 'updated_at'])
+    return score
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.3 on 2026-10-17 09:12
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptUploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('page_number', models.IntegerField(verbose_name='Numéro de page')),
+                ('extension', models.CharField(default='.jpg', max_length=10)),
+                ('total_size', models.BigIntegerField(verbose_name='Taille totale (octets)')),
+                ('received_bytes', models.BigIntegerField(default=0, verbose_name='Octets reçus')),
+                ('status', models.CharField(choices=[('active', 'En cours'), ('completed', 'Terminé'), ('expired', 'Expiré')], default='active', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField()),
+                ('receipt', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to='receipts.receipt')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipt_upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': "Session d'upload",
+                'verbose_name_plural': "Sessions d'upload",
+                'db_table': 'receipts_upload_session',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'expires_at'], name='receipts_up_status_b65f12_idx')],
+            },
+        ),
+    ]
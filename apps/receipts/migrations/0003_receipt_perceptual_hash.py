@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 10:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0002_receiptuploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='perceptual_hash',
+            field=models.BigIntegerField(blank=True, help_text='dHash 64 bits (détection des photos re-prises)', null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-17 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0003_receipt_perceptual_hash'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ocrprocessinglog',
+            index=models.Index(fields=['provider', '-started_at'], name='receipts_oc_provide_f7ee2f_idx'),
+        ),
+    ]
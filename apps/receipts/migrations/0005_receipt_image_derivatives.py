@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0004_ocrprocessinglog_provider_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='image_derivatives',
+            field=models.JSONField(blank=True, default=dict, help_text='Déclinaisons (taille.format -> chemin)'),
+        ),
+    ]
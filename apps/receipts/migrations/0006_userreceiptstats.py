@@ -0,0 +1,38 @@
+# Generated by Django 5.2.3 on 2026-10-17 14:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0005_receipt_image_derivatives'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserReceiptStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('dimension', models.CharField(choices=[('total', 'Total'), ('category', 'Catégorie'), ('merchant', 'Marchand')], max_length=20)),
+                ('dimension_key', models.CharField(blank=True, help_text='Id de la catégorie ou du marchand, vide si non classé', max_length=64)),
+                ('receipt_count', models.IntegerField(default=0)),
+                ('total_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cashback_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('bonus_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipt_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Statistique de reçus',
+                'verbose_name_plural': 'Statistiques de reçus',
+                'db_table': 'receipts_user_stats',
+                'ordering': ['-period'],
+                'unique_together': {('user', 'period', 'dimension', 'dimension_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-17 15:55
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index créé sans verrouiller receipts_receipt en écriture
+    atomic = False
+
+    dependencies = [
+        ('receipts', '0006_userreceiptstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatsWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('position', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': "Watermark d'agrégation",
+                'verbose_name_plural': "Watermarks d'agrégation",
+                'db_table': 'receipts_stats_watermark',
+            },
+        ),
+        AddIndexConcurrently(
+            model_name='receipt',
+            index=models.Index(fields=['ocr_status', 'processed_at'], name='receipts_re_ocr_sta_fd7d2e_idx'),
+        ),
+    ]
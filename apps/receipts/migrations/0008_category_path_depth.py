@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-17 16:40
+
+from django.db import migrations, models
+
+
+def backfill_category_paths(apps, schema_editor):
+    Category = apps.get_model('receipts', 'Category')
+    categories = {c.id: c for c in Category.objects.all()}
+    paths = {}
+
+    def path_for(category_id, seen=()):
+        if category_id in paths:
+            return paths[category_id]
+        category = categories[category_id]
+        if category.parent_id is None or category.parent_id in seen:
+            parent_path = '/'
+        else:
+            parent_path = path_for(category.parent_id, seen + (category_id,))
+        paths[category_id] = f"{parent_path}{category_id}/"
+        return paths[category_id]
+
+    for category in categories.values():
+        category.path = path_for(category.id)
+        category.depth = category.path.count('/') - 2
+    Category.objects.bulk_update(categories.values(), ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0007_statswatermark_receipt_status_processed_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_category_paths, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-17 17:30
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.operations import AddIndexConcurrently, BtreeGinExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Index créé sans verrouiller receipts_receipt en écriture
+    atomic = False
+
+    dependencies = [
+        ('receipts', '0008_category_path_depth'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        migrations.AddField(
+            model_name='receipt',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='receipt',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['user', 'search_vector'], name='receipts_re_user_id_6c4287_gin'),
+        ),
+    ]
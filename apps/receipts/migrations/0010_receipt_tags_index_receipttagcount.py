@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-17 18:05
+
+import django.contrib.postgres.indexes
+import django.db.models.deletion
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index créé sans verrouiller receipts_receipt en écriture
+    atomic = False
+
+    dependencies = [
+        ('receipts', '0009_receipt_search_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='receipt',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['user', 'tags'], name='receipts_re_user_id_b8f754_gin'),
+        ),
+        migrations.CreateModel(
+            name='ReceiptTagCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipt_tag_counts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Compteur de tag',
+                'verbose_name_plural': 'Compteurs de tags',
+                'db_table': 'receipts_tag_count',
+                'ordering': ['-count', 'tag'],
+                'unique_together': {('user', 'tag')},
+            },
+        ),
+    ]
@@ -0,0 +1,147 @@
+# Generated by Django 5.2.3 on 2026-10-17 18:50
+
+from django.db import migrations
+
+
+# receipts_ocr_log devient une table partitionnée par mois sur started_at.
+# La clé primaire doit contenir la clé de partition : (id, started_at).
+# Les colonnes et index restent ceux connus de Django (état inchangé).
+# La copie est un seul INSERT ... SELECT sous le verrou exclusif de la
+# migration : les logs écrits pendant la copie attendent. Arrêter les
+# workers OCR pendant la migration ; sur une table volumineuse, purger les
+# anciens logs au préalable pour borner la durée du verrou.
+PARTITION_OCR_LOG_SQL = """
+ALTER TABLE receipts_ocr_log RENAME TO receipts_ocr_log_legacy;
+ALTER TABLE receipts_ocr_log_legacy RENAME CONSTRAINT receipts_ocr_log_pkey TO receipts_ocr_log_legacy_pkey;
+ALTER INDEX receipts_oc_receipt_d53f57_idx RENAME TO receipts_ocr_log_legacy_receipt_idx;
+ALTER INDEX receipts_oc_provide_f7ee2f_idx RENAME TO receipts_ocr_log_legacy_provider_idx;
+ALTER INDEX receipts_ocr_log_receipt_id_eb93d47c RENAME TO receipts_ocr_log_legacy_receipt_id_idx;
+
+-- Colonne identité non supportée sur une table partitionnée avant PostgreSQL 17
+CREATE SEQUENCE receipts_ocr_log_part_id_seq;
+
+CREATE TABLE receipts_ocr_log (
+    id bigint NOT NULL DEFAULT nextval('receipts_ocr_log_part_id_seq'),
+    provider varchar(20) NOT NULL,
+    started_at timestamp with time zone NOT NULL,
+    completed_at timestamp with time zone NULL,
+    processing_time double precision NULL,
+    success boolean NOT NULL,
+    error_message text NOT NULL,
+    confidence_score double precision NULL,
+    api_credits_used integer NOT NULL,
+    api_cost numeric(6, 4) NOT NULL,
+    receipt_id bigint NOT NULL,
+    CONSTRAINT receipts_ocr_log_pkey PRIMARY KEY (id, started_at),
+    CONSTRAINT receipts_ocr_log_receipt_id_fk_receipts_receipt_id
+        FOREIGN KEY (receipt_id) REFERENCES receipts_receipt (id)
+        DEFERRABLE INITIALLY DEFERRED
+) PARTITION BY RANGE (started_at);
+
+ALTER SEQUENCE receipts_ocr_log_part_id_seq OWNED BY receipts_ocr_log.id;
+
+-- Filet de sécurité : les lignes hors des partitions mensuelles
+CREATE TABLE receipts_ocr_log_default PARTITION OF receipts_ocr_log DEFAULT;
+
+-- Partitions mensuelles de la plus ancienne ligne jusqu'à 3 mois après aujourd'hui
+DO $$
+DECLARE
+    month date := date_trunc('month', COALESCE(
+        (SELECT min(started_at) FROM receipts_ocr_log_legacy), now()
+    ))::date;
+    last_month date := (date_trunc('month', now()) + interval '3 months')::date;
+BEGIN
+    WHILE month <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF receipts_ocr_log FOR VALUES FROM (%L) TO (%L)',
+            'receipts_ocr_log_p' || to_char(month, 'YYYYMM'),
+            month,
+            (month + interval '1 month')::date
+        );
+        month := (month + interval '1 month')::date;
+    END LOOP;
+END
+$$;
+
+INSERT INTO receipts_ocr_log (
+    id, provider, started_at, completed_at, processing_time, success,
+    error_message, confidence_score, api_credits_used, api_cost, receipt_id
+)
+SELECT
+    id, provider, started_at, completed_at, processing_time, success,
+    error_message, confidence_score, api_credits_used, api_cost, receipt_id
+FROM receipts_ocr_log_legacy;
+
+SELECT setval(
+    'receipts_ocr_log_part_id_seq',
+    COALESCE((SELECT max(id) FROM receipts_ocr_log), 0) + 1,
+    false
+);
+
+DROP TABLE receipts_ocr_log_legacy;
+
+-- Index définis sur la table mère : créés sur chaque partition
+CREATE INDEX receipts_oc_receipt_d53f57_idx ON receipts_ocr_log (receipt_id, started_at DESC);
+CREATE INDEX receipts_oc_provide_f7ee2f_idx ON receipts_ocr_log (provider, started_at DESC);
+CREATE INDEX receipts_ocr_log_receipt_id_eb93d47c ON receipts_ocr_log (receipt_id);
+"""
+
+# Retour à une table ordinaire (colonne identité, clé primaire sur id).
+# Les partitions et la séquence sont supprimées avec la table partitionnée.
+UNPARTITION_OCR_LOG_SQL = """
+ALTER TABLE receipts_ocr_log RENAME TO receipts_ocr_log_partitioned;
+ALTER TABLE receipts_ocr_log_partitioned RENAME CONSTRAINT receipts_ocr_log_pkey TO receipts_ocr_log_partitioned_pkey;
+DROP INDEX receipts_oc_receipt_d53f57_idx;
+DROP INDEX receipts_oc_provide_f7ee2f_idx;
+DROP INDEX receipts_ocr_log_receipt_id_eb93d47c;
+
+CREATE TABLE receipts_ocr_log (
+    id bigint NOT NULL GENERATED BY DEFAULT AS IDENTITY,
+    provider varchar(20) NOT NULL,
+    started_at timestamp with time zone NOT NULL,
+    completed_at timestamp with time zone NULL,
+    processing_time double precision NULL,
+    success boolean NOT NULL,
+    error_message text NOT NULL,
+    confidence_score double precision NULL,
+    api_credits_used integer NOT NULL,
+    api_cost numeric(6, 4) NOT NULL,
+    receipt_id bigint NOT NULL,
+    CONSTRAINT receipts_ocr_log_pkey PRIMARY KEY (id),
+    CONSTRAINT receipts_ocr_log_receipt_id_fk_receipts_receipt_id
+        FOREIGN KEY (receipt_id) REFERENCES receipts_receipt (id)
+        DEFERRABLE INITIALLY DEFERRED
+);
+
+INSERT INTO receipts_ocr_log (
+    id, provider, started_at, completed_at, processing_time, success,
+    error_message, confidence_score, api_credits_used, api_cost, receipt_id
+)
+SELECT
+    id, provider, started_at, completed_at, processing_time, success,
+    error_message, confidence_score, api_credits_used, api_cost, receipt_id
+FROM receipts_ocr_log_partitioned;
+
+SELECT setval(
+    pg_get_serial_sequence('receipts_ocr_log', 'id'),
+    COALESCE((SELECT max(id) FROM receipts_ocr_log), 0) + 1,
+    false
+);
+
+DROP TABLE receipts_ocr_log_partitioned;
+
+CREATE INDEX receipts_oc_receipt_d53f57_idx ON receipts_ocr_log (receipt_id, started_at DESC);
+CREATE INDEX receipts_oc_provide_f7ee2f_idx ON receipts_ocr_log (provider, started_at DESC);
+CREATE INDEX receipts_ocr_log_receipt_id_eb93d47c ON receipts_ocr_log (receipt_id);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0010_receipt_tags_index_receipttagcount'),
+    ]
+
+    operations = [
+        migrations.RunSQL(PARTITION_OCR_LOG_SQL, reverse_sql=UNPARTITION_OCR_LOG_SQL),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.3 on 2026-10-17 19:20
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Index créé sans verrouiller receipts_receipt en écriture
+    atomic = False
+
+    dependencies = [
+        ('receipts', '0011_partition_ocr_log'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='receipt',
+            name='ocr_archive_key',
+            field=models.CharField(blank=True, editable=False, max_length=255, verbose_name='Archive OCR'),
+        ),
+        migrations.AddField(
+            model_name='receipt',
+            name='ocr_archived_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Archivé le'),
+        ),
+        AddIndexConcurrently(
+            model_name='receipt',
+            index=models.Index(condition=models.Q(('ocr_archived_at__isnull', True)), fields=['created_at'], name='receipts_re_unarchived_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0012_receipt_ocr_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='receiptuploadsession',
+            name='status',
+            field=models.CharField(choices=[('active', 'En cours'), ('assembling', 'Assemblage'), ('completed', 'Terminé'), ('expired', 'Expiré')], default='active', max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0013_receiptuploadsession_assembling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ocrprocessinglog',
+            name='page_count',
+            field=models.IntegerField(default=0, help_text='Pages envoyées au fournisseur'),
+        ),
+    ]
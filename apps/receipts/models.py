@@ -1,7 +1,11 @@
 # apps/receipts/models.py
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.gis.db import models as gis_models
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from django.conf import settings
@@ -176,6 +180,18 @@ class Category(models.Model):
     order = models.IntegerField(default=0)
     is_active = models.BooleanField(default=True)
     
+    # Chemin matérialisé ('/1/4/9/') et profondeur, tenus à jour par save()
+    path = models.CharField(
+        max_length=255,
+        blank=True,
+        db_index=True,
+        editable=False
+    )
+    depth = models.IntegerField(
+        default=0,
+        editable=False
+    )
+    
     class Meta:
         ordering = ['order', 'name']
         verbose_name = "Catégorie"
@@ -183,9 +199,39 @@ class Category(models.Model):
         db_table = 'receipts_category'
     
     def __str__(self):
-        if self.parent:
-            return f"{self.parent.name} > {self.name}"
+        if self.parent_id:
+            from .category_tree import get_category_tree
+            parent_name = get_category_tree().name(self.parent_id)
+            if parent_name:
+                return f"{parent_name} > {self.name}"
         return self.name
+    
+    def build_path(self):
+        parent_path = self.parent.path if self.parent_id else '/'
+        return f"{parent_path}{self.pk}/"
+    
+    def save(self, *args, **kwargs):
+        if self.parent_id and self.pk and f"/{self.pk}/" in self.parent.path:
+            raise ValueError("Une catégorie ne peut pas être son propre ancêtre")
+        
+        with transaction.atomic():
+            old_path = self.path
+            creating = self.pk is None
+            super().save(*args, **kwargs)
+            
+            # L'id fait partie du chemin : calculé après l'insertion
+            self.path = self.build_path()
+            self.depth = self.path.count('/') - 2
+            if self.path == old_path:
+                return
+            Category.objects.filter(pk=self.pk).update(path=self.path, depth=self.depth)
+            
+            if old_path and not creating:
+                # Déplacement : réécrire le préfixe de tout le sous-arbre
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(Value(self.path), Substr('path', len(old_path) + 1)),
+                    depth=F('depth') + (self.depth - (old_path.count('/') - 2))
+                )
 
 
 class Receipt(models.Model):
@@ -200,6 +246,9 @@ class Receipt(models.Model):
         ('manual_review', 'Révision manuelle'),
     ]
     
+    # Comptés dans les agrégats et le cashback à la complétion : figés ensuite
+    COMPLETED_LOCKED_FIELDS = ['total_amount', 'merchant', 'category', 'purchase_date']
+    
     OCR_PROVIDERS = [
         ('gemini', 'Google Gemini'),
         ('gpt', 'OpenAI GPT'),
@@ -238,6 +287,11 @@ class Receipt(models.Model):
         blank=True,
         verbose_name="Miniature"
     )
+    image_derivatives = models.JSONField(
+        default=dict,
+        blank=True,
+        help_text="Déclinaisons (taille.format -> chemin)"
+    )
     
     # Hash pour déduplication
     image_hash = models.CharField(
@@ -246,6 +300,11 @@ class Receipt(models.Model):
         null=True,
         help_text="SHA256 de l'image"
     )
+    perceptual_hash = models.BigIntegerField(
+        null=True,
+        blank=True,
+        help_text="dHash 64 bits (détection des photos re-prises)"
+    )
     
     # Statut OCR
     ocr_status = models.CharField(
@@ -396,6 +455,26 @@ class Receipt(models.Model):
         blank=True,
         verbose_name="Texte extrait"
     )
+    # Archivage : les deux champs ci-dessus sont vidés et compressés (zstd)
+    # dans le stockage, voir archive.py
+    ocr_archive_key = models.CharField(
+        max_length=255,
+        blank=True,
+        editable=False,
+        verbose_name="Archive OCR"
+    )
+    ocr_archived_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        verbose_name="Archivé le"
+    )
+    
+    # Recherche plein texte (français + anglais), voir search.py
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False
+    )
     
     # Métadonnées
     notes = models.TextField(
@@ -448,14 +527,56 @@ class Receipt(models.Model):
             models.Index(fields=['merchant', '-purchase_date']),
             models.Index(fields=['ocr_status']),
             models.Index(fields=['image_hash']),
+            models.Index(fields=['ocr_status', 'processed_at']),
+            # btree_gin : filtre utilisateur et texte dans le même index
+            GinIndex(fields=['user', 'search_vector']),
+            GinIndex(fields=['user', 'tags']),
+            # Reçus encore à archiver uniquement
+            models.Index(
+                fields=['created_at'],
+                name='receipts_re_unarchived_idx',
+                condition=Q(ocr_archived_at__isnull=True)
+            ),
         ]
     
     def __str__(self):
         return f"Reçu {self.merchant_name_raw or 'Sans nom'} - {self.total_amount} {self.currency}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Tags tels que chargés : les compteurs ne reçoivent que la différence
+        if 'tags' in field_names:
+            instance._loaded_tags = list(instance.tags or [])
+        return instance
+    
+    def load_ocr_data(self):
+        """
+        Réponse OCR brute et texte extrait. Après archivage les colonnes
+        sont vides : l'archive est lue dans le stockage au premier accès.
+        """
+        if not self.ocr_archive_key:
+            return {
+                'raw_response': self.ocr_raw_response,
+                'extracted_text': self.extracted_text
+            }
+        if getattr(self, '_ocr_archive', None) is None:
+            from .archive import load_archive
+            self._ocr_archive = load_archive(self.ocr_archive_key)
+        return self._ocr_archive
+    
+    @property
+    def full_ocr_raw_response(self):
+        return self.load_ocr_data()['raw_response']
+    
+    @property
+    def full_extracted_text(self):
+        return self.load_ocr_data()['extracted_text']
+    
     def save(self, *args, **kwargs):
-        # Calculer le hash de l'image si nouvelle
-        if not self.image_hash and self.original_image:
+        # Calculer le hash de l'image si nouvelle (un doublon réutilise
+        # l'image de l'original et ne porte pas de hash)
+        if not self.image_hash and self.original_image and not self.is_duplicate:
             self.image_hash = self.calculate_image_hash()
             
         # Calculer le cashback si pas déjà fait
@@ -465,9 +586,44 @@ class Receipt(models.Model):
             
         super().save(*args, **kwargs)
     
+    def delete(self, *args, **kwargs):
+        """
+        Un reçu complété est retiré des agrégats dans la même transaction
+        (les suppressions en masse ne passent pas par ici : recalcul avec
+        rebuild_receipt_stats)
+        """
+        from .rollups import unroll_receipt
+        from .stats import record_completed_receipt
+
+        with transaction.atomic():
+            # Valeurs comptées, relues sous verrou (pas celles en mémoire)
+            completed = Receipt.objects.select_for_update().filter(
+                pk=self.pk, ocr_status='completed'
+            ).first()
+            if completed:
+                record_completed_receipt(completed, sign=-1)
+                unroll_receipt(completed)
+                # Journal en ajout seul : le crédit est annulé par une écriture
+                # inverse (les lignes gardent le reçu à NULL après suppression)
+                credited = self.cashback_transactions.aggregate(
+                    total=models.Sum('amount')
+                )['total']
+                if credited:
+                    completed.user.add_cashback(
+                        -credited, source='receipt_deleted', receipt=self,
+                        transaction_type='adjust',
+                        description=f"Reçu {self.receipt_uuid} supprimé"
+                    )
+            return super().delete(*args, **kwargs)
+    
     def calculate_image_hash(self):
         """Calcule le hash SHA256 de l'image"""
         if self.original_image:
+            # Hash calculé pendant le streaming de l'upload : pas de relecture
+            if not self.original_image._committed:
+                precomputed = getattr(self.original_image.file, 'sha256', None)
+                if precomputed:
+                    return precomputed
             sha256_hash = hashlib.sha256()
             for chunk in self.original_image.chunks():
                 sha256_hash.update(chunk)
@@ -476,14 +632,30 @@ class Receipt(models.Model):
     
     def mark_as_processed(self):
         """Marque le reçu comme traité"""
-        self.ocr_status = 'completed'
+        from apps.locations.validation import apply_bonus_zone
+        from .stats import record_completed_receipt
+
         self.processed_at = timezone.now()
-        self.save(update_fields=['ocr_status', 'processed_at'])
-        
-        # Mettre à jour les stats utilisateur
-        self.user.total_receipts_scanned += 1
-        self.user.add_cashback(self.cashback_amount)
-        self.user.save()
+        with transaction.atomic():
+            # Transition conditionnelle : les agrégats ne comptent le reçu qu'une fois
+            updated = Receipt.objects.filter(pk=self.pk).exclude(
+                ocr_status='completed'
+            ).update(ocr_status='completed', processed_at=self.processed_at)
+            self.ocr_status = 'completed'
+            if not updated:
+                return
+            # Bonus de zone compté à la complétion seulement (avant les agrégats)
+            apply_bonus_zone(self)
+            record_completed_receipt(self)
+            
+            # Crédit par ajout au journal : aucun verrou sur la ligne users
+            if self.cashback_amount:
+                self.user.add_cashback(self.cashback_amount, source='receipt', receipt=self)
+            if self.bonus_amount:
+                self.user.add_cashback(
+                    self.bonus_amount, source='receipt_bonus',
+                    receipt=self, transaction_type='bonus'
+                )
 
 
 class ReceiptItem(models.Model):
@@ -601,6 +773,80 @@ class ReceiptImage(models.Model):
         db_table = 'receipts_receipt_image'
 
 
+class ReceiptUploadSession(models.Model):
+    """
+    Session d'upload reprenable pour les pages d'un reçu multi-pages
+    """
+    STATUSES = [
+        ('active', 'En cours'),
+        ('assembling', 'Assemblage'),
+        ('completed', 'Terminé'),
+        ('expired', 'Expiré'),
+    ]
+
+    upload_id = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True
+    )
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='receipt_upload_sessions'
+    )
+    receipt = models.ForeignKey(
+        Receipt,
+        on_delete=models.CASCADE,
+        related_name='upload_sessions'
+    )
+    page_number = models.IntegerField(
+        verbose_name="Numéro de page"
+    )
+    extension = models.CharField(
+        max_length=10,
+        default='.jpg'
+    )
+
+    # Progression
+    total_size = models.BigIntegerField(
+        verbose_name="Taille totale (octets)"
+    )
+    received_bytes = models.BigIntegerField(
+        default=0,
+        verbose_name="Octets reçus"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUSES,
+        default='active'
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Session d'upload"
+        verbose_name_plural = "Sessions d'upload"
+        db_table = 'receipts_upload_session'
+        indexes = [
+            models.Index(fields=['status', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"Upload {self.upload_id} ({self.received_bytes}/{self.total_size})"
+
+    @property
+    def is_complete(self):
+        return self.received_bytes >= self.total_size
+
+    @property
+    def is_expired(self):
+        return timezone.now() > self.expires_at
+
+
 class MerchantAlias(models.Model):
     """
     Alias de marchands pour la reconnaissance
@@ -667,6 +913,10 @@ class OCRProcessingLog(models.Model):
     
     # Coûts API
     api_credits_used = models.IntegerField(default=0)
+    page_count = models.IntegerField(
+        default=0,
+        help_text="Pages envoyées au fournisseur"
+    )
     api_cost = models.DecimalField(
         max_digits=6,
         decimal_places=4,
@@ -680,4 +930,110 @@ class OCRProcessingLog(models.Model):
         db_table = 'receipts_ocr_log'
         indexes = [
             models.Index(fields=['receipt', '-started_at']),
-        ]
\ No newline at end of file
+            models.Index(fields=['provider', '-started_at']),
+        ]
+
+class UserReceiptStats(models.Model):
+    """
+    Agrégats mensuels des reçus complétés d'un utilisateur, tenus à jour
+    de façon incrémentale (voir stats.py)
+    """
+    DIMENSIONS = [
+        ('total', 'Total'),
+        ('category', 'Catégorie'),
+        ('merchant', 'Marchand'),
+    ]
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='receipt_stats'
+    )
+    period = models.DateField(
+        verbose_name="Mois",
+        help_text="Premier jour du mois"
+    )
+    dimension = models.CharField(
+        max_length=20,
+        choices=DIMENSIONS
+    )
+    dimension_key = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text="Id de la catégorie ou du marchand, vide si non classé"
+    )
+    
+    # Métriques
+    receipt_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0
+    )
+    cashback_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0
+    )
+    bonus_amount = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ['user', 'period', 'dimension', 'dimension_key']
+        ordering = ['-period']
+        verbose_name = "Statistique de reçus"
+        verbose_name_plural = "Statistiques de reçus"
+        db_table = 'receipts_user_stats'
+    
+    def __str__(self):
+        return f"{self.user} - {self.period:%Y-%m} {self.dimension}:{self.dimension_key}"
+
+
+class StatsWatermark(models.Model):
+    """
+    Position des agrégations périodiques : les reçus complétés jusqu'à
+    `position` (processed_at) ont déjà été comptés
+    """
+    name = models.CharField(
+        max_length=50,
+        unique=True
+    )
+    position = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Watermark d'agrégation"
+        verbose_name_plural = "Watermarks d'agrégation"
+        db_table = 'receipts_stats_watermark'
+    
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class ReceiptTagCount(models.Model):
+    """
+    Nombre de reçus par tag et par utilisateur, tenu à jour par signaux
+    (voir tags.py)
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='receipt_tag_counts'
+    )
+    tag = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+    
+    class Meta:
+        unique_together = ['user', 'tag']
+        ordering = ['-count', 'tag']
+        verbose_name = "Compteur de tag"
+        verbose_name_plural = "Compteurs de tags"
+        db_table = 'receipts_tag_count'
+    
+    def __str__(self):
+        return f"{self.user} #{self.tag} ({self.count})"
@@ -0,0 +1,371 @@
+# apps/receipts/ocr.py
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from datetime import date, time as dt_time
+from decimal import Decimal, InvalidOperation
+
+import redis
+import urllib3
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .models import OCRProcessingLog
+from .ocr_router import router
+from .utils import get_redis
+
+
+class OCRError(Exception):
+    """Échec d'un appel OCR"""
+
+
+class ProviderBusy(OCRError):
+    """Limite de concurrence ou de débit atteinte pour le fournisseur"""
+
+
+# Seau à jetons : l'horloge Redis sert de référence commune aux workers
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return allowed
+"""
+
+# Sémaphore à baux : un worker tué libère sa place à l'expiration du bail
+SEMAPHORE_ACQUIRE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local lease = tonumber(ARGV[2])
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - lease)
+if redis.call('ZCARD', KEYS[1]) < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('EXPIRE', KEYS[1], math.ceil(lease) + 1)
+    return 1
+end
+return 0
+"""
+
+ACQUIRE_TIMEOUT = 2.0
+ACQUIRE_POLL_INTERVAL = 0.05
+
+_http = None
+
+# Appels parallèles lors d'une requête couverte (hedging)
+_hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='ocr-hedge')
+
+
+def get_http():
+    """Pool de connexions HTTP vers le service OCR (réutilisé par processus)"""
+    global _http
+    if _http is None:
+        _http = urllib3.PoolManager(maxsize=32, retries=False)
+    return _http
+
+
+def get_provider_config(provider):
+    return settings.INOVOCB_SETTINGS['OCR_PROVIDERS'][provider]
+
+
+class ProviderSlot:
+    """
+    Réserve une place de concurrence et un jeton de débit pour un
+    fournisseur, le temps d'un appel. Sans Redis, on laisse passer plutôt
+    que de bloquer le traitement des reçus.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.config = get_provider_config(provider)
+        self.token = uuid.uuid4().hex
+        self.semaphore_key = f"ocr:semaphore:{provider}"
+        self.bucket_key = f"ocr:ratelimit:{provider}"
+        self.acquired = False
+
+    def __enter__(self):
+        timeout = settings.INOVOCB_SETTINGS['OCR_TIMEOUT_SECONDS']
+        deadline = time.monotonic() + ACQUIRE_TIMEOUT
+        try:
+            client = get_redis()
+            while True:
+                if client.eval(
+                    SEMAPHORE_ACQUIRE_SCRIPT, 1, self.semaphore_key,
+                    self.config['max_concurrency'], timeout * 2, self.token
+                ):
+                    self.acquired = True
+                    if client.eval(
+                        TOKEN_BUCKET_SCRIPT, 1, self.bucket_key,
+                        self.config['rate_per_second'], self.config['burst']
+                    ):
+                        return self
+                    self.release()
+                if time.monotonic() >= deadline:
+                    raise ProviderBusy(self.provider)
+                time.sleep(ACQUIRE_POLL_INTERVAL)
+        except redis.RedisError:
+            return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def release(self):
+        if not self.acquired:
+            return
+        self.acquired = False
+        try:
+            get_redis().zrem(self.semaphore_key, self.token)
+        except redis.RedisError:
+            pass
+
+
+def get_receipt_pages(receipt):
+    """URLs des pages d'un reçu, l'image originale étant la page 1"""
+    pages = [receipt.original_image.url]
+    pages.extend(page.image.url for page in receipt.additional_images.all())
+    return pages
+
+
+def call_provider(provider, receipt, pages):
+    """
+    Envoie un lot de pages au service OCR pour un fournisseur donné
+    et retourne la réponse JSON décodée
+    """
+    url = f"{settings.INOVOCB_SETTINGS['OCR_SERVICE_URL'].rstrip('/')}/v1/ocr/{provider}"
+    body = json.dumps({
+        'receipt_id': str(receipt.receipt_uuid),
+        'pages': pages,
+    }).encode()
+
+    try:
+        response = get_http().request(
+            'POST', url,
+            body=body,
+            headers={'Content-Type': 'application/json'},
+            timeout=settings.INOVOCB_SETTINGS['OCR_TIMEOUT_SECONDS']
+        )
+    except urllib3.exceptions.HTTPError as e:
+        raise OCRError(f"{provider}: {e}")
+
+    if response.status == 429:
+        raise ProviderBusy(provider)
+    if response.status >= 400:
+        raise OCRError(f"{provider}: HTTP {response.status}")
+
+    try:
+        return json.loads(response.data)
+    except ValueError:
+        raise OCRError(f"{provider}: réponse invalide")
+
+
+def merge_batches(batches):
+    """
+    Fusionne les réponses de plusieurs lots de pages : l'en-tête vient du
+    premier lot, les totaux du dernier, les articles et le texte sont concaténés
+    """
+    if len(batches) == 1:
+        return batches[0]
+
+    merged = dict(batches[0])
+    for key in ('total', 'subtotal', 'tax'):
+        for batch in reversed(batches):
+            if batch.get(key) is not None:
+                merged[key] = batch[key]
+                break
+    merged['items'] = [item for batch in batches for item in batch.get('items', [])]
+    merged['text'] = '\n'.join(batch.get('text', '') for batch in batches)
+    merged['confidence'] = min(batch.get('confidence', 0) for batch in batches)
+    merged['cost'] = str(sum(Decimal(str(batch.get('cost', 0))) for batch in batches))
+    merged['credits'] = sum(batch.get('credits', 0) for batch in batches)
+    return merged
+
+
+def run_provider(provider, receipt, pages):
+    """
+    Exécute l'OCR d'un reçu avec un fournisseur, par lots de pages selon
+    ce que l'API accepte, et journalise la tentative dans OCRProcessingLog
+    """
+    config = get_provider_config(provider)
+    batch_size = config['max_pages_per_call']
+    log = OCRProcessingLog.objects.create(receipt=receipt, provider=provider)
+    started = time.perf_counter()
+
+    batches = []
+    error = None
+    try:
+        for start in range(0, len(pages), batch_size):
+            with ProviderSlot(provider):
+                batches.append(call_provider(provider, receipt, pages[start:start + batch_size]))
+        result = merge_batches(batches)
+    except ProviderBusy:
+        if not batches:
+            # Aucun appel effectué : ce n'est pas une tentative
+            OCRProcessingLog.objects.filter(id=log.id, started_at=log.started_at).delete()
+            raise
+        error = OCRError(f"{provider}: saturé après {len(batches)} lot(s)")
+    except OCRError as e:
+        error = e
+
+    if error is not None:
+        log.error_message = str(error)
+        result = None
+
+    log.completed_at = timezone.now()
+    log.processing_time = time.perf_counter() - started
+    log.success = result is not None
+    log.api_credits_used = sum(batch.get('credits', 0) for batch in batches)
+    log.page_count = len(pages[:len(batches) * batch_size])
+    # Coût déclaré par le fournisseur (même nul), sinon estimé au tarif par page
+    reported = [Decimal(str(batch['cost'])) for batch in batches if batch.get('cost') is not None]
+    if reported:
+        log.api_cost = sum(reported)
+    else:
+        log.api_cost = Decimal(config['cost_per_page']) * log.page_count
+    if result is not None:
+        log.confidence_score = max(0, min(1, float(result.get('confidence', 0))))
+    # started_at dans le filtre : la mise à jour ne touche qu'une partition
+    OCRProcessingLog.objects.filter(id=log.id, started_at=log.started_at).update(
+        completed_at=log.completed_at,
+        processing_time=log.processing_time,
+        success=log.success,
+        error_message=log.error_message,
+        api_credits_used=log.api_credits_used,
+        page_count=log.page_count,
+        api_cost=log.api_cost,
+        confidence_score=log.confidence_score
+    )
+    router.record(
+        provider, log.processing_time, log.success, log.confidence_score,
+        log.api_cost, log.page_count
+    )
+
+    if error is not None:
+        raise error
+    return result
+
+
+def _decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def _date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _time(value):
+    try:
+        return dt_time.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def apply_ocr_result(receipt, provider, result):
+    """Reporte les données extraites sur le reçu"""
+    receipt.ocr_provider = provider
+    receipt.ocr_confidence = max(0, min(1, float(result.get('confidence', 0))))
+    receipt.ocr_raw_response = result
+    receipt.extracted_text = result.get('text', '')
+    receipt.merchant_name_raw = (result.get('merchant_name') or '')[:255]
+    receipt.subtotal = _decimal(result.get('subtotal'))
+    receipt.tax_amount = _decimal(result.get('tax'))
+    receipt.total_amount = _decimal(result.get('total')) or receipt.total_amount
+    receipt.currency = (result.get('currency') or receipt.currency)[:3]
+    receipt.purchase_date = _date(result.get('date')) or receipt.purchase_date
+    receipt.purchase_time = _time(result.get('time'))
+    # Nouveau résultat : l'éventuelle archive est obsolète
+    receipt.ocr_archive_key = ''
+    receipt.ocr_archived_at = None
+    receipt._ocr_archive = None
+    receipt.save(update_fields=[
+        'ocr_provider', 'ocr_confidence', 'ocr_raw_response', 'extracted_text',
+        'ocr_archive_key', 'ocr_archived_at',
+        'merchant_name_raw', 'subtotal', 'tax_amount', 'total_amount',
+        'currency', 'purchase_date', 'purchase_time', 'updated_at'
+    ])
+
+
+def _run_in_thread(provider, receipt, pages):
+    try:
+        return run_provider(provider, receipt, pages)
+    finally:
+        # Chaque thread ouvre sa propre connexion à la base
+        connections.close_all()
+
+
+def run_hedged(primary, backup, receipt, pages, attempted):
+    """
+    Lance le fournisseur principal ; s'il dépasse son p95 de latence, lance
+    le fournisseur de secours en parallèle et garde la première réponse.
+    Les fournisseurs lancés sont ajoutés à `attempted`.
+    """
+    attempted.add(primary)
+    delay = router.hedge_delay(primary) if backup else None
+    if delay is None:
+        return primary, run_provider(primary, receipt, pages)
+
+    futures = {_hedge_executor.submit(_run_in_thread, primary, receipt, pages): primary}
+    done, _ = wait(futures, timeout=delay)
+    if not done:
+        attempted.add(backup)
+        futures[_hedge_executor.submit(_run_in_thread, backup, receipt, pages)] = backup
+
+    error = None
+    for future in as_completed(futures):
+        try:
+            # Le perdant termine en arrière-plan et journalise sa tentative
+            return futures[future], future.result()
+        except OCRError as e:
+            if error is None or isinstance(error, ProviderBusy):
+                error = e
+    raise error
+
+
+def process_receipt(receipt):
+    """
+    Essaie les fournisseurs dans l'ordre choisi par le routeur adaptatif
+    (le moins cher respectant le SLO de confiance d'abord) jusqu'au premier
+    succès. Retourne (fournisseur, résultat) ; lève ProviderBusy si tous
+    les fournisseurs sont saturés, OCRError si tous ont échoué.
+    """
+    pages = get_receipt_pages(receipt)
+    providers = router.choose_providers()
+    attempted = set()
+    errors = []
+
+    for provider in providers:
+        if provider in attempted:
+            continue
+        backup = next(
+            (p for p in providers if p not in attempted and p != provider),
+            None
+        )
+        try:
+            return run_hedged(provider, backup, receipt, pages, attempted)
+        except OCRError as e:
+            errors.append(e)
+
+    if errors and all(isinstance(e, ProviderBusy) for e in errors):
+        raise ProviderBusy('all')
+    raise OCRError('; '.join(str(e) for e in errors) or 'aucun fournisseur disponible')
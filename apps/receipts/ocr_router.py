@@ -0,0 +1,195 @@
+# apps/receipts/ocr_router.py
+import json
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+
+from .models import OCRProcessingLog
+from .utils import get_redis
+
+
+# Fenêtre glissante d'échantillons par fournisseur
+STATS_WINDOW = 200
+STATS_KEY = 'ocr:stats:{provider}'
+STATS_REFRESH_INTERVAL = 30
+
+# Historique lu dans OCRProcessingLog au démarrage à froid
+SEED_LOOKBACK_DAYS = 30
+
+# En dessous, le fournisseur n'est pas encore jugé (il reste éligible)
+MIN_SAMPLES = 20
+
+# Part des tentatives devant réussir avec une confiance >= OCR_MIN_CONFIDENCE
+SLO_TARGET = 0.9
+
+
+def percentile(sorted_values, fraction):
+    """Percentile par rang le plus proche sur une liste déjà triée"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ProviderStats:
+    """
+    Statistiques glissantes d'un fournisseur : latence (p50/p95), taux de
+    succès, respect du SLO de confiance et coût par page observé
+    """
+
+    def __init__(self, provider, samples):
+        self.provider = provider
+        self.samples = samples[:STATS_WINDOW]
+        self.loaded_at = time.monotonic()
+        self._summarize()
+
+    def _summarize(self):
+        min_confidence = settings.INOVOCB_SETTINGS['OCR_MIN_CONFIDENCE']
+        latencies = sorted(s['latency'] for s in self.samples)
+        count = len(self.samples)
+
+        self.count = count
+        self.p50 = percentile(latencies, 0.50)
+        self.p95 = percentile(latencies, 0.95)
+        self.success_rate = (
+            sum(1 for s in self.samples if s['success']) / count if count else None
+        )
+        self.slo_rate = (
+            sum(
+                1 for s in self.samples
+                if s['success'] and s['confidence'] >= min_confidence
+            ) / count if count else None
+        )
+
+        pages = sum(s['pages'] for s in self.samples)
+        configured = Decimal(
+            settings.INOVOCB_SETTINGS['OCR_PROVIDERS'][self.provider]['cost_per_page']
+        )
+        self.cost_per_page = (
+            sum(Decimal(s['cost']) for s in self.samples) / pages
+            if pages else configured
+        )
+
+    def add(self, sample):
+        self.samples.insert(0, sample)
+        del self.samples[STATS_WINDOW:]
+        self._summarize()
+
+    @property
+    def meets_slo(self):
+        return self.count < MIN_SAMPLES or self.slo_rate >= SLO_TARGET
+
+    @property
+    def is_stale(self):
+        return time.monotonic() - self.loaded_at > STATS_REFRESH_INTERVAL
+
+
+class ProviderRouter:
+    """
+    Choix adaptatif du fournisseur OCR. Les échantillons sont partagés entre
+    workers via Redis et gardés en mémoire entre deux rafraîchissements ;
+    au démarrage à froid, on amorce depuis OCRProcessingLog.
+    """
+
+    def __init__(self):
+        self.stats = {}
+        self.lock = threading.Lock()
+
+    def _load_samples(self, provider):
+        key = STATS_KEY.format(provider=provider)
+        try:
+            raw = get_redis().lrange(key, 0, STATS_WINDOW - 1)
+        except redis.RedisError:
+            raw = None
+
+        if raw:
+            return [json.loads(entry) for entry in raw]
+
+        # Démarrage à froid : amorcer depuis les logs
+        # Fenêtre bornée dans le temps : seules les partitions récentes sont lues
+        logs = OCRProcessingLog.objects.filter(
+            provider=provider,
+            started_at__gte=timezone.now() - timedelta(days=SEED_LOOKBACK_DAYS),
+            completed_at__isnull=False
+        ).order_by('-started_at').values(
+            'processing_time', 'success', 'confidence_score', 'api_cost', 'page_count'
+        )[:STATS_WINDOW]
+        samples = [
+            {
+                'latency': log['processing_time'] or 0,
+                'success': log['success'],
+                'confidence': log['confidence_score'] or 0,
+                'cost': str(log['api_cost']),
+                'pages': max(1, log['page_count']),
+            }
+            for log in logs
+        ]
+
+        if samples and raw is not None:
+            try:
+                pipe = get_redis().pipeline()
+                pipe.rpush(key, *[json.dumps(s) for s in samples])
+                pipe.ltrim(key, 0, STATS_WINDOW - 1)
+                pipe.execute()
+            except redis.RedisError:
+                pass
+        return samples
+
+    def get_stats(self, provider):
+        with self.lock:
+            stats = self.stats.get(provider)
+        if stats is None or stats.is_stale:
+            stats = ProviderStats(provider, self._load_samples(provider))
+            with self.lock:
+                self.stats[provider] = stats
+        return stats
+
+    def record(self, provider, latency, success, confidence, cost, pages):
+        """Enregistre le résultat d'une tentative (mémoire + Redis)"""
+        sample = {
+            'latency': latency,
+            'success': success,
+            'confidence': confidence or 0,
+            'cost': str(cost),
+            'pages': max(1, pages),
+        }
+        with self.lock:
+            stats = self.stats.get(provider)
+            if stats is not None:
+                stats.add(sample)
+
+        key = STATS_KEY.format(provider=provider)
+        try:
+            pipe = get_redis().pipeline()
+            pipe.lpush(key, json.dumps(sample))
+            pipe.ltrim(key, 0, STATS_WINDOW - 1)
+            pipe.execute()
+        except redis.RedisError:
+            pass
+
+    def choose_providers(self):
+        """
+        Ordre d'essai : d'abord les fournisseurs qui respectent le SLO de
+        confiance, du moins cher au plus cher, puis les autres en repli
+        """
+        providers = settings.INOVOCB_SETTINGS['OCR_PROVIDER_ORDER']
+        stats = {provider: self.get_stats(provider) for provider in providers}
+        return sorted(
+            providers,
+            key=lambda p: (not stats[p].meets_slo, stats[p].cost_per_page, providers.index(p))
+        )
+
+    def hedge_delay(self, provider):
+        """Délai avant de lancer un second fournisseur (p95 de latence)"""
+        stats = self.get_stats(provider)
+        if stats.count < MIN_SAMPLES:
+            return None
+        return stats.p95
+
+
+router = ProviderRouter()
@@ -0,0 +1,90 @@
+# apps/receipts/pagination.py
+import base64
+from datetime import date, datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class ReceiptKeysetPagination(BasePagination):
+    """
+    Pagination par curseur sur (purchase_date, created_at, id) décroissants.
+    Chaque page reprend après la dernière ligne de la précédente : pas
+    d'OFFSET, le coût d'une page ne dépend pas de sa profondeur.
+    """
+    ordering = ('-purchase_date', '-created_at', '-id')
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def get_page_size(self, request):
+        page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        return min(max(requested, 1), self.max_page_size)
+
+    def encode_cursor(self, receipt):
+        raw = f"{receipt.purchase_date.isoformat()}|{receipt.created_at.isoformat()}|{receipt.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            purchase_date, created_at, pk = (
+                base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            )
+            return date.fromisoformat(purchase_date), datetime.fromisoformat(created_at), int(pk)
+        except ValueError:
+            raise NotFound("Curseur invalide")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            purchase_date, created_at, pk = cursor
+            # purchase_date__lte borne le parcours de l'index (user, -purchase_date)
+            queryset = queryset.filter(purchase_date__lte=purchase_date).filter(
+                Q(purchase_date__lt=purchase_date)
+                | Q(purchase_date=purchase_date, created_at__lt=created_at)
+                | Q(purchase_date=purchase_date, created_at=created_at, id__lt=pk)
+            )
+
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        page = list(queryset[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if self.has_next else None
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
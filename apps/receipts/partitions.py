@@ -0,0 +1,155 @@
+# apps/receipts/partitions.py
+import json
+import re
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+
+PARENT_TABLE = 'receipts_ocr_log'
+PARTITION_PREFIX = f'{PARENT_TABLE}_p'
+DEFAULT_PARTITION = f'{PARENT_TABLE}_default'
+
+_PARTITION_NAME = re.compile(rf'^{PARTITION_PREFIX}(\d{{4}})(\d{{2}})$')
+
+
+def add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'{PARTITION_PREFIX}{month:%Y%m}'
+
+
+def list_partitions():
+    """{mois: nom} des partitions mensuelles attachées"""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            """,
+            [PARENT_TABLE]
+        )
+        names = [row[0] for row in cursor.fetchall()]
+
+    partitions = {}
+    for name in names:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[date(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+
+def create_partition(month):
+    """
+    Crée la partition d'un mois. Les lignes de ce mois déjà tombées dans la
+    partition DEFAULT (partition manquante au moment de l'insertion) y sont
+    déplacées avant l'attachement : sinon Postgres refuse de créer la
+    partition. La partition DEFAULT est verrouillée pendant le déplacement.
+    """
+    name = partition_name(month)
+    bounds = [month.isoformat(), add_months(month, 1).isoformat()]
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE "{DEFAULT_PARTITION}" IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(
+            f'CREATE TABLE "{name}" (LIKE "{PARENT_TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+        )
+        cursor.execute(
+            f'WITH moved AS ('
+            f'DELETE FROM "{DEFAULT_PARTITION}" '
+            f'WHERE started_at >= %s AND started_at < %s RETURNING *'
+            f') INSERT INTO "{name}" SELECT * FROM moved',
+            bounds
+        )
+        moved = cursor.rowcount
+        # Index et clés étrangères de la table mère créés à l'attachement
+        cursor.execute(
+            f'ALTER TABLE "{PARENT_TABLE}" ATTACH PARTITION "{name}" '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            bounds
+        )
+    return name, moved
+
+
+def create_partitions(months_ahead=3, today=None):
+    """Crée les partitions du mois courant et des `months_ahead` suivants"""
+    current = (today or timezone.localdate()).replace(day=1)
+    existing = list_partitions()
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if month in existing:
+            continue
+        name, _ = create_partition(month)
+        created.append(name)
+    return created
+
+
+def detach_partitions(retain_months=12, drop=False, today=None):
+    """
+    Détache (et supprime si drop) les partitions antérieures à la fenêtre
+    de rétention. Une partition détachée reste une table ordinaire,
+    archivable avec pg_dump.
+    """
+    cutoff = add_months((today or timezone.localdate()).replace(day=1), -retain_months)
+    detached = []
+    with connection.cursor() as cursor:
+        for month, name in sorted(list_partitions().items()):
+            if month >= cutoff:
+                continue
+            cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"')
+            if drop:
+                cursor.execute(f'DROP TABLE "{name}"')
+            detached.append(name)
+    return detached
+
+
+def scanned_partitions(sql, params):
+    """Partitions effectivement lues par une requête (plan EXPLAIN)"""
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    relations = set()
+
+    def walk(node):
+        name = node.get('Relation Name')
+        if name and name.startswith(PARENT_TABLE):
+            relations.add(name)
+        for child in node.get('Plans', []):
+            walk(child)
+
+    walk(plan[0]['Plan'])
+    return relations
+
+
+def check_pruning(days=30, today=None):
+    """
+    Vérifie qu'une requête bornée dans le temps (comme celle du routeur
+    OCR) ne lit que les partitions des mois concernés.
+    Retourne (partitions lues, partitions attendues).
+    """
+    today = today or timezone.localdate()
+    since = date.fromordinal(today.toordinal() - days)
+    sql = (
+        f'SELECT id FROM "{PARENT_TABLE}" '
+        'WHERE provider = %s AND started_at >= %s '
+        'ORDER BY started_at DESC LIMIT 200'
+    )
+    scanned = scanned_partitions(sql, ['gemini', since.isoformat()])
+
+    partitions = list_partitions()
+    expected = {
+        name for month, name in partitions.items()
+        if add_months(month, 1) > since
+    }
+    expected.add(DEFAULT_PARTITION)
+    return scanned, expected
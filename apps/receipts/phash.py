@@ -0,0 +1,268 @@
+# apps/receipts/phash.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+HASH_SIZE = 8
+HASH_MASK = (1 << 64) - 1
+
+# Fenêtre de recherche par utilisateur au moment de l'upload
+USER_BUCKET_DAYS = 90
+
+BUCKET_CACHE_SIZE = 2048
+BUCKET_TTL = 300
+
+
+def compute_dhash(fileobj):
+    """
+    Calcule le dHash 64 bits d'une image (entier signé, stockable dans un
+    BigIntegerField). Retourne None si l'image est illisible.
+    """
+    try:
+        image = Image.open(fileobj)
+        # Décodage JPEG à échelle réduite : inutile de décoder 12 Mpx pour 9x8
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('L').resize(
+            (HASH_SIZE + 1, HASH_SIZE),
+            Image.Resampling.LANCZOS
+        )
+    except (UnidentifiedImageError, OSError):
+        return None
+    finally:
+        if hasattr(fileobj, 'seek'):
+            fileobj.seek(0)
+    
+    pixels = image.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    
+    # Représentation signée 64 bits pour PostgreSQL
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def get_near_duplicate_distance():
+    """
+    Distance de Hamming max (sur 64 bits) pour considérer deux photos comme
+    le même reçu re-photographié
+    """
+    return settings.INOVOCB_SETTINGS['NEAR_DUPLICATE_DISTANCE']
+
+
+def hamming(a, b):
+    """Distance de Hamming entre deux hashes 64 bits (signés ou non)"""
+    return ((a ^ b) & HASH_MASK).bit_count()
+
+
+def distance_distribution(groups):
+    """
+    Distances entre photos d'échantillons groupés par reçu ({reçu: [hash]}).
+    Retourne (distances entre photos d'un même reçu, distances entre reçus
+    différents), triées : le seuil doit couvrir les premières sans atteindre
+    les secondes.
+    """
+    hashes = [
+        (receipt, value)
+        for receipt, values in groups.items()
+        for value in values if value is not None
+    ]
+    same, different = [], []
+    for i, (receipt, value) in enumerate(hashes):
+        for other_receipt, other_value in hashes[i + 1:]:
+            distance = hamming(value, other_value)
+            (same if receipt == other_receipt else different).append(distance)
+    return sorted(same), sorted(different)
+
+
+class BKTree:
+    """
+    Arbre BK sur la distance de Hamming : une recherche à distance <= d
+    n'explore que les sous-arbres compatibles avec l'inégalité triangulaire.
+    Nœud : [hash, identifiant, {distance: enfant}]
+    """
+    
+    def __init__(self):
+        self.root = None
+        self.size = 0
+    
+    def add(self, value, item):
+        node = [value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        
+        current = self.root
+        while True:
+            distance = hamming(value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+    
+    def search(self, value, max_distance):
+        """Retourne [(distance, identifiant)] triés par distance croissante"""
+        if self.root is None:
+            return []
+        
+        results = []
+        stack = [self.root]
+        while stack:
+            node_value, item, children = stack.pop()
+            distance = hamming(value, node_value)
+            if distance <= max_distance:
+                results.append((distance, item))
+            for child_distance in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        
+        results.sort()
+        return results
+
+
+class NearDuplicateIndex:
+    """
+    Cache LRU (par processus) de BK-trees, un par bucket
+    utilisateur ou marchand/date. Les reçus insérés par ce processus sont
+    ajoutés directement ; ceux des autres processus apparaissent à
+    l'expiration du bucket (BUCKET_TTL).
+    """
+    
+    def __init__(self, max_buckets=BUCKET_CACHE_SIZE, ttl=BUCKET_TTL):
+        self.max_buckets = max_buckets
+        self.ttl = ttl
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+    
+    def get_tree(self, key, loader):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.buckets.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self.buckets.move_to_end(key)
+                return entry[1]
+        
+        tree = BKTree()
+        for value, item in loader():
+            tree.add(value, item)
+        
+        with self.lock:
+            self.buckets[key] = (now, tree)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_buckets:
+                self.buckets.popitem(last=False)
+        return tree
+    
+    def add(self, key, value, item):
+        """Ajoute un hash à un bucket déjà chargé (sinon il sera lu en base)"""
+        with self.lock:
+            entry = self.buckets.get(key)
+            if entry:
+                entry[1].add(value, item)
+
+
+_index = NearDuplicateIndex()
+
+
+def _user_bucket(user_id):
+    from .models import Receipt
+    
+    key = ('user', user_id)
+    
+    def loader():
+        return Receipt.objects.filter(
+            user_id=user_id,
+            perceptual_hash__isnull=False,
+            created_at__gte=timezone.now() - timedelta(days=USER_BUCKET_DAYS)
+        ).values_list('perceptual_hash', 'id').iterator()
+    
+    return key, loader
+
+
+def _merchant_bucket(merchant_id, purchase_date):
+    from .models import Receipt
+    
+    key = ('merchant', merchant_id, purchase_date)
+    
+    def loader():
+        return Receipt.objects.filter(
+            merchant_id=merchant_id,
+            purchase_date=purchase_date,
+            perceptual_hash__isnull=False
+        ).values_list('perceptual_hash', 'id').iterator()
+    
+    return key, loader
+
+
+def _buckets_for(user_id=None, merchant_id=None, purchase_date=None):
+    buckets = []
+    if user_id is not None:
+        buckets.append(_user_bucket(user_id))
+    if merchant_id is not None and purchase_date is not None:
+        buckets.append(_merchant_bucket(merchant_id, purchase_date))
+    return buckets
+
+
+def find_near_duplicate(perceptual_hash, user_id=None, merchant_id=None,
+                        purchase_date=None, exclude_id=None):
+    """
+    Retourne l'id du reçu le plus proche (distance <= NEAR_DUPLICATE_DISTANCE)
+    dans le bucket utilisateur et/ou marchand/date, ou None
+    """
+    if perceptual_hash is None:
+        return None
+    
+    max_distance = get_near_duplicate_distance()
+    best = None
+    for key, loader in _buckets_for(user_id, merchant_id, purchase_date):
+        tree = _index.get_tree(key, loader)
+        for distance, receipt_id in tree.search(perceptual_hash, max_distance):
+            if receipt_id == exclude_id:
+                continue
+            if best is None or distance < best[0]:
+                best = (distance, receipt_id)
+            break
+    
+    return best[1] if best else None
+
+
+def index_receipt(receipt):
+    """Ajoute un reçu aux buckets chargés dans ce processus"""
+    if receipt.perceptual_hash is None:
+        return
+    for key, _ in _buckets_for(receipt.user_id, receipt.merchant_id, receipt.purchase_date):
+        _index.add(key, receipt.perceptual_hash, receipt.id)
+
+
+def link_near_duplicate(receipt):
+    """
+    Une fois le marchand et la date connus (après OCR), cherche une
+    re-photo dans le bucket marchand/date, tous utilisateurs confondus
+    """
+    if receipt.is_duplicate or receipt.merchant_id is None:
+        return None
+    
+    original_id = find_near_duplicate(
+        receipt.perceptual_hash,
+        merchant_id=receipt.merchant_id,
+        purchase_date=receipt.purchase_date,
+        exclude_id=receipt.id
+    )
+    if original_id is not None:
+        receipt.is_duplicate = True
+        receipt.duplicate_of_id = original_id
+        receipt.save(update_fields=['is_duplicate', 'duplicate_of', 'updated_at'])
+    
+    index_receipt(receipt)
+    return original_id
@@ -0,0 +1,89 @@
+# apps/receipts/query_planner.py
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+
+def _relation(model, name):
+    """Champ relationnel `name` du modèle, ou None"""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _unwrap(field):
+    """(serializer imbriqué, many) pour un champ de serializer"""
+    if isinstance(field, serializers.ListSerializer):
+        return field.child, True
+    if isinstance(field, serializers.ManyRelatedField):
+        return None, True
+    if isinstance(field, serializers.BaseSerializer):
+        return field, False
+    return None, False
+
+
+def plan(serializer, model, prefix=''):
+    """
+    Parcourt l'arbre des champs d'un serializer et retourne
+    (chemins select_related, liste de Prefetch) nécessaires pour le
+    sérialiser sans requête par objet
+    """
+    select = set()
+    prefetch = []
+
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        nested, many = _unwrap(field)
+        parts = field.source.split('.')
+
+        # Suivre les relations simples (FK/OneToOne) du chemin source
+        current_model = model
+        path = []
+        for index, part in enumerate(parts):
+            relation = _relation(current_model, part)
+            if relation is None:
+                break
+            is_last = index == len(parts) - 1
+
+            if relation.many_to_one or relation.one_to_one:
+                # Un PrimaryKeyRelatedField n'utilise que la colonne *_id
+                if is_last and nested is None and not many:
+                    break
+                path.append(part)
+                select.add(prefix + '__'.join(path))
+                current_model = relation.related_model
+                continue
+
+            # Relation multiple (FK inverse, M2M) : Prefetch avec son propre plan
+            lookup = prefix + '__'.join(path + [part])
+            related_model = relation.related_model
+            queryset = related_model._default_manager.all()
+            if nested is not None and is_last:
+                queryset = apply_plan(queryset, nested, related_model)
+            prefetch.append(Prefetch(lookup, queryset=queryset))
+            break
+        else:
+            # Serializer imbriqué sur une FK : ses propres relations suivent la jointure
+            if nested is not None and not many and path:
+                nested_select, nested_prefetch = plan(
+                    nested, current_model, prefix + '__'.join(path) + '__'
+                )
+                select.update(nested_select)
+                prefetch.extend(nested_prefetch)
+
+    return select, prefetch
+
+
+def apply_plan(queryset, serializer, model=None):
+    """Applique au queryset les select_related/prefetch déduits du serializer"""
+    if isinstance(serializer, type):
+        serializer = serializer()
+    select, prefetch = plan(serializer, model or queryset.model)
+    if select:
+        queryset = queryset.select_related(*sorted(select))
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
@@ -0,0 +1,174 @@
+# apps/receipts/rollups.py
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .catalog import bump_catalog_version
+from .models import Merchant, Receipt, StatsWatermark
+
+
+WATERMARK_NAME = 'merchant_stats'
+EPOCH = datetime(2000, 1, 1, tzinfo=dt_timezone.utc)
+BATCH_SIZE = 1000
+
+MERCHANT_UPDATE_SQL = """
+    UPDATE receipts_merchant AS m
+    SET total_receipts = m.total_receipts + v.receipts,
+        total_cashback_paid = m.total_cashback_paid + v.cashback
+    FROM (VALUES {values}) AS v(id, receipts, cashback)
+    WHERE m.id = v.id
+"""
+
+# Les deux affectations lisent l'ancien receipts_count (négatif : retrait)
+LOCATION_UPDATE_SQL = """
+    UPDATE locations_merchant_location AS l
+    SET receipts_count = l.receipts_count + v.receipts,
+        average_basket = ROUND(COALESCE(
+            (l.average_basket * l.receipts_count + v.total) / NULLIF(l.receipts_count + v.receipts, 0), 0
+        ), 2)
+    FROM (VALUES {values}) AS v(id, receipts, total)
+    WHERE l.id = v.id
+"""
+
+
+def _apply(sql, rows):
+    """UPDATE ... FROM (VALUES ...) par lots"""
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            batch = rows[start:start + BATCH_SIZE]
+            values = ', '.join(['(%s::bigint, %s::integer, %s::numeric)'] * len(batch))
+            cursor.execute(
+                sql.format(values=values),
+                [value for row in batch for value in row]
+            )
+
+
+def _window_rows(window):
+    """Lignes (id, reçus, montant) des marchands et établissements d'une fenêtre de reçus"""
+    from apps.locations.models import LocationValidation
+
+    merchant_rows = [
+        (row['merchant_id'], row['receipts'], row['cashback'] or 0)
+        for row in window.filter(merchant__isnull=False).values('merchant_id').annotate(
+            receipts=Count('id'),
+            cashback=Sum('cashback_amount')
+        ).order_by('merchant_id')
+    ]
+    location_rows = [
+        (row['matched_merchant_location_id'], row['receipts'], row['total'] or 0)
+        for row in LocationValidation.objects.filter(
+            receipt__in=window,
+            matched_merchant_location__isnull=False
+        ).values('matched_merchant_location_id').annotate(
+            receipts=Count('id'),
+            total=Sum('receipt__total_amount')
+        ).order_by('matched_merchant_location_id')
+    ]
+    return merchant_rows, location_rows
+
+
+def rollup_merchant_stats(rebuild=False):
+    """
+    Ajoute aux compteurs des marchands et de leurs établissements les reçus
+    complétés depuis le dernier passage. Les reçus sont lus jusqu'à
+    maintenant - MERCHANT_ROLLUP_LAG_SECONDS, pour ne pas sauter ceux dont
+    la transaction n'était pas encore validée.
+    Retourne le nombre de reçus agrégés.
+    """
+    from apps.locations.models import MerchantLocation
+
+    lag = settings.INOVOCB_SETTINGS['MERCHANT_ROLLUP_LAG_SECONDS']
+    upper = timezone.now() - timedelta(seconds=lag)
+
+    with transaction.atomic():
+        # Un seul rollup à la fois
+        watermark, _ = StatsWatermark.objects.select_for_update().get_or_create(
+            name=WATERMARK_NAME,
+            defaults={'position': EPOCH}
+        )
+        if rebuild:
+            Merchant.objects.update(total_receipts=0, total_cashback_paid=0)
+            MerchantLocation.objects.update(receipts_count=0, average_basket=0)
+            watermark.position = EPOCH
+        if upper <= watermark.position:
+            return 0
+
+        window = Receipt.objects.filter(
+            ocr_status='completed',
+            processed_at__gt=watermark.position,
+            processed_at__lte=upper
+        )
+        merchant_rows, location_rows = _window_rows(window)
+
+        _apply(MERCHANT_UPDATE_SQL, merchant_rows)
+        _apply(LOCATION_UPDATE_SQL, location_rows)
+
+        watermark.position = upper
+        watermark.save(update_fields=['position', 'updated_at'])
+
+        # Les compteurs font partie du catalogue des marchands
+        if merchant_rows or rebuild:
+            transaction.on_commit(bump_catalog_version)
+
+    return sum(row[1] for row in merchant_rows)
+
+
+def rebuild_merchant_rollup(merchant_ids):
+    """
+    Recalcule les compteurs de quelques marchands (et de leurs
+    établissements) sans toucher aux autres. Seuls les reçus déjà couverts
+    par le watermark sont comptés : les suivants le seront par le prochain
+    rollup, sans double comptage. Retourne le nombre de reçus comptés.
+    """
+    from apps.locations.models import MerchantLocation
+
+    merchant_ids = list(merchant_ids)
+    with transaction.atomic():
+        position = StatsWatermark.objects.select_for_update().filter(
+            name=WATERMARK_NAME
+        ).values_list('position', flat=True).first() or EPOCH
+
+        Merchant.objects.filter(id__in=merchant_ids).update(total_receipts=0, total_cashback_paid=0)
+        MerchantLocation.objects.filter(merchant_id__in=merchant_ids).update(
+            receipts_count=0, average_basket=0
+        )
+        merchant_rows, location_rows = _window_rows(Receipt.objects.filter(
+            ocr_status='completed',
+            merchant_id__in=merchant_ids,
+            processed_at__lte=position
+        ))
+        _apply(MERCHANT_UPDATE_SQL, merchant_rows)
+        _apply(LOCATION_UPDATE_SQL, location_rows)
+        transaction.on_commit(bump_catalog_version)
+
+    return sum(row[1] for row in merchant_rows)
+
+
+def unroll_receipt(receipt):
+    """
+    Retire des compteurs un reçu complété supprimé, s'il a déjà été agrégé.
+    Le verrou sur le watermark attend la fin d'un rollup en cours.
+    """
+    from apps.locations.models import LocationValidation
+
+    position = StatsWatermark.objects.select_for_update().filter(
+        name=WATERMARK_NAME
+    ).values_list('position', flat=True).first()
+    if position is None or receipt.processed_at is None or receipt.processed_at > position:
+        return False
+
+    if receipt.merchant_id:
+        _apply(MERCHANT_UPDATE_SQL, [(receipt.merchant_id, -1, -(receipt.cashback_amount or 0))])
+    location_id = LocationValidation.objects.filter(
+        receipt_id=receipt.id,
+        matched_merchant_location__isnull=False
+    ).values_list('matched_merchant_location_id', flat=True).first()
+    if location_id:
+        _apply(LOCATION_UPDATE_SQL, [(location_id, -1, -(receipt.total_amount or 0))])
+
+    if receipt.merchant_id:
+        transaction.on_commit(bump_catalog_version)
+    return True
@@ -0,0 +1,63 @@
+# apps/receipts/search.py
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection
+from django.db.models import F
+
+
+# Français et anglais : « lait » et « milk » doivent tous deux trouver le reçu
+SEARCH_CONFIGS = ('french', 'english')
+
+# Poids : marchand et articles (A), notes (B), texte OCR brut (C).
+# Reçus archivés (texte OCR vidé, déplacé dans le stockage) : A et B sont
+# recalculés depuis les colonnes, la partie C existante est conservée.
+UPDATE_SEARCH_VECTOR_SQL = """
+    UPDATE receipts_receipt AS r
+    SET search_vector =
+        setweight(to_tsvector('french', concat_ws(' ', r.merchant_name_raw, i.names)), 'A') ||
+        setweight(to_tsvector('english', concat_ws(' ', r.merchant_name_raw, i.names)), 'A') ||
+        setweight(to_tsvector('french', coalesce(r.notes, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(r.notes, '')), 'B') ||
+        CASE WHEN r.ocr_archived_at IS NULL THEN
+            setweight(to_tsvector('french', coalesce(r.extracted_text, '')), 'C') ||
+            setweight(to_tsvector('english', coalesce(r.extracted_text, '')), 'C')
+        ELSE
+            ts_filter(coalesce(r.search_vector, ''::tsvector), '{c}')
+        END
+    FROM (
+        SELECT r2.id, string_agg(item.name, ' ' ORDER BY item."order") AS names
+        FROM receipts_receipt AS r2
+        LEFT JOIN receipts_receipt_item AS item ON item.receipt_id = r2.id
+        WHERE r2.id = ANY(%s)
+        GROUP BY r2.id
+    ) AS i
+    WHERE r.id = i.id
+"""
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def update_search_vectors(receipt_ids):
+    """Recalcule le vecteur de recherche des reçus indiqués (une requête)"""
+    receipt_ids = list(receipt_ids)
+    if not receipt_ids:
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(UPDATE_SEARCH_VECTOR_SQL, [receipt_ids])
+        return cursor.rowcount
+
+
+def build_search_query(text):
+    """Requête websearch combinant les configurations française et anglaise"""
+    query = None
+    for config in SEARCH_CONFIGS:
+        part = SearchQuery(text, config=config, search_type='websearch')
+        query = part if query is None else query | part
+    return query
+
+
+def search_receipts(queryset, text):
+    """Reçus correspondant à `text`, les plus pertinents d'abord"""
+    query = build_search_query(text)
+    return queryset.filter(search_vector=query).annotate(
+        rank=SearchRank(F('search_vector'), query)
+    ).order_by('-rank', '-purchase_date', '-id')
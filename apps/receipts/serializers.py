@@ -1,10 +1,36 @@
 # apps/receipts/serializers.py
-from rest_framework import serializers
+import os
+from datetime import timedelta
+
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from django.conf import settings
 from django.contrib.gis.geos import Point
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 from .models import (
     Merchant, Category, Receipt, ReceiptItem,
-    ReceiptImage, MerchantAlias, OCRProcessingLog
+    ReceiptImage, MerchantAlias, OCRProcessingLog,
+    ReceiptUploadSession
 )
+from .category_tree import get_category_tree
+from .dedup import find_duplicate, register_hash
+from .phash import compute_dhash, find_near_duplicate, index_receipt
+
+
+def validate_image_extension(filename):
+    """Vérifie que l'extension fait partie des formats supportés"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension.lstrip('.') not in settings.INOVOCB_SETTINGS['SUPPORTED_IMAGE_FORMATS']:
+        raise serializers.ValidationError("Format d'image non supporté")
+    return extension
+
+
+class ReceiptAlreadySubmitted(APIException):
+    """Image identique déjà soumise par un autre utilisateur"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "Ce reçu a déjà été soumis"
+    default_code = 'receipt_already_submitted'
 
 
 class MerchantSerializer(serializers.ModelSerializer):
@@ -13,19 +39,28 @@ class MerchantSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'name', 'display_name', 'slug', 'merchant_type',
             'category', 'logo', 'brand_color', 'is_partner',
-            'cashback_rate', 'bonus_rate', 'website'
+            'cashback_rate', 'bonus_rate', 'website',
+            'total_receipts', 'total_cashback_paid'
         ]
+        # Compteurs tenus par le rollup périodique
+        read_only_fields = ['total_receipts', 'total_cashback_paid']
 
 
 class CategorySerializer(serializers.ModelSerializer):
-    parent_name = serializers.CharField(source='parent.name', read_only=True)
+    parent_name = serializers.SerializerMethodField()
     
     class Meta:
         model = Category
         fields = [
             'id', 'name', 'slug', 'icon', 'color',
-            'parent', 'parent_name', 'budget_percentage'
+            'parent', 'parent_name', 'depth', 'budget_percentage'
         ]
+    
+    def get_parent_name(self, obj):
+        # Arbre en mémoire : pas de requête par catégorie
+        if obj.parent_id is None:
+            return None
+        return get_category_tree().name(obj.parent_id)
 
 
 class ReceiptItemSerializer(serializers.ModelSerializer):
@@ -69,6 +104,19 @@ class ReceiptSerializer(serializers.ModelSerializer):
             'cashback_amount', 'bonus_amount', 'points_earned'
         ]
     
+    def validate(self, data):
+        # Reçu complété : montants, marchand, catégorie et date sont comptés
+        # dans les agrégats et le cashback crédité
+        if self.instance is not None and self.instance.ocr_status == 'completed':
+            locked = {
+                field: "Non modifiable sur un reçu complété"
+                for field in Receipt.COMPLETED_LOCKED_FIELDS
+                if field in data and data[field] != getattr(self.instance, field)
+            }
+            if locked:
+                raise serializers.ValidationError(locked)
+        return data
+    
     def get_total_cashback(self, obj):
         return obj.cashback_amount + obj.bonus_amount
 
@@ -85,6 +133,12 @@ class ReceiptCreateSerializer(serializers.ModelSerializer):
             'location_accuracy', 'notes', 'uploaded_via'
         ]
     
+    def validate_original_image(self, value):
+        if value.size > settings.INOVOCB_SETTINGS['MAX_UPLOAD_SIZE']:
+            raise serializers.ValidationError("Image trop volumineuse")
+        validate_image_extension(value.name)
+        return value
+    
     def create(self, validated_data):
         # Extraire les données de localisation
         lat = validated_data.pop('location_latitude', None)
@@ -99,14 +153,70 @@ class ReceiptCreateSerializer(serializers.ModelSerializer):
         # Ajouter l'utilisateur
         validated_data['user'] = self.context['request'].user
         
+        # Valeurs provisoires, remplacées par l'OCR
+        validated_data.setdefault('total_amount', 0)
+        validated_data.setdefault('purchase_date', timezone.localdate())
+        
+        # Détection des doublons avant d'écrire l'image dans le stockage
+        # (le hash SHA256 est déjà calculé pendant l'upload)
+        image_hash = getattr(validated_data['original_image'], 'sha256', None)
+        original = find_duplicate(image_hash)
+        if original:
+            return self.create_duplicate(validated_data, original)
+        
+        # Quasi-doublon : même reçu re-photographié par le même utilisateur
+        # (l'image est conservée et passe à l'OCR, mais sans crédit automatique)
+        perceptual_hash = compute_dhash(validated_data['original_image'])
+        validated_data['perceptual_hash'] = perceptual_hash
+        near_duplicate_id = find_near_duplicate(
+            perceptual_hash,
+            user_id=validated_data['user'].id
+        )
+        if near_duplicate_id:
+            validated_data['is_duplicate'] = True
+            validated_data['duplicate_of_id'] = near_duplicate_id
+        # Un quasi-doublon garde sa propre image : son hash est enregistré
+        # (save() ne le calcule pas pour un doublon)
+        validated_data['image_hash'] = image_hash
+        
         # Créer le reçu
-        receipt = Receipt.objects.create(**validated_data)
+        try:
+            with transaction.atomic():
+                receipt = Receipt.objects.create(**validated_data)
+        except IntegrityError:
+            # Deux uploads identiques simultanés : le premier inséré gagne
+            original = Receipt.objects.filter(image_hash=image_hash).first()
+            if not image_hash or original is None:
+                raise
+            return self.create_duplicate(validated_data, original)
         
-        # Déclencher le traitement OCR (via Celery)
-        from apps.receipts.tasks import process_receipt_ocr
-        process_receipt_ocr.delay(receipt.id)
+        # Déclencher le traitement OCR (via Celery) une fois le reçu visible
+        from apps.receipts.tasks import process_receipt_ocr, generate_receipt_derivatives
+        transaction.on_commit(lambda: register_hash(receipt.image_hash))
+        transaction.on_commit(lambda: index_receipt(receipt))
+        transaction.on_commit(lambda: process_receipt_ocr.delay(receipt.id))
+        transaction.on_commit(lambda: generate_receipt_derivatives.delay(receipt.id))
         
         return receipt
+    
+    def create_duplicate(self, validated_data, original):
+        """
+        Enregistre la tentative comme doublon sans écrire l'image ni lancer l'OCR.
+        Le reçu d'un autre utilisateur n'est jamais lié (ni exposé) : refus.
+        """
+        if original.user_id != validated_data['user'].id:
+            raise ReceiptAlreadySubmitted()
+        validated_data.pop('original_image')
+        return Receipt.objects.create(
+            original_image=original.original_image.name,
+            thumbnail=original.thumbnail.name,
+            processed_image=original.processed_image.name,
+            image_derivatives=original.image_derivatives,
+            is_duplicate=True,
+            duplicate_of=original,
+            ocr_status='failed',
+            **validated_data
+        )
 
 
 class ReceiptListSerializer(serializers.ModelSerializer):
@@ -129,7 +239,47 @@ class ReceiptListSerializer(serializers.ModelSerializer):
 class OCRStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = Receipt
-        fields = ['id', 'receipt_uuid', 'ocr_status', 'ocr_confidence']
+        fields = ['id', 'receipt_uuid', 'ocr_status', 'ocr_confidence', 'is_duplicate', 'duplicate_of']
+
+
+class ReceiptUploadSessionSerializer(serializers.ModelSerializer):
+    receipt_uuid = serializers.UUIDField(write_only=True)
+    filename = serializers.CharField(write_only=True)
+    
+    class Meta:
+        model = ReceiptUploadSession
+        fields = [
+            'upload_id', 'receipt_uuid', 'filename', 'page_number',
+            'total_size', 'received_bytes', 'status', 'expires_at'
+        ]
+        read_only_fields = ['upload_id', 'received_bytes', 'status', 'expires_at']
+    
+    def validate_total_size(self, value):
+        if value <= 0 or value > settings.INOVOCB_SETTINGS['MAX_UPLOAD_SIZE']:
+            raise serializers.ValidationError("Taille de fichier invalide")
+        return value
+    
+    def validate(self, data):
+        user = self.context['request'].user
+        try:
+            receipt = Receipt.objects.get(receipt_uuid=data.pop('receipt_uuid'), user=user)
+        except Receipt.DoesNotExist:
+            raise serializers.ValidationError("Reçu introuvable")
+        
+        if data['page_number'] < 2:
+            raise serializers.ValidationError("La page 1 est l'image originale du reçu")
+        if ReceiptImage.objects.filter(receipt=receipt, page_number=data['page_number']).exists():
+            raise serializers.ValidationError("Cette page existe déjà")
+        
+        data['receipt'] = receipt
+        data['extension'] = validate_image_extension(data.pop('filename'))
+        return data
+    
+    def create(self, validated_data):
+        ttl = settings.INOVOCB_SETTINGS['UPLOAD_SESSION_TTL_HOURS']
+        validated_data['user'] = self.context['request'].user
+        validated_data['expires_at'] = timezone.now() + timedelta(hours=ttl)
+        return super().create(validated_data)
 
 
 class MerchantAliasSerializer(serializers.ModelSerializer):
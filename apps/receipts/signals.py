@@ -0,0 +1,67 @@
+# apps/receipts/signals.py
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .archive import delete_archive
+from .catalog import bump_catalog_version
+from .category_tree import invalidate_category_tree
+from .merchant_resolver import publish_alias_change
+from .models import Category, Merchant, MerchantAlias, Receipt
+from .tags import receipt_tags_deleted, receipt_tags_saved
+
+
+@receiver(post_save, sender=MerchantAlias)
+@receiver(post_delete, sender=MerchantAlias)
+def merchant_alias_changed_handler(sender, instance, **kwargs):
+    # Publier après commit : les autres processus rechargent depuis la base
+    alias_id = instance.id
+    transaction.on_commit(lambda: publish_alias_change(alias_id))
+
+
+@receiver(post_save, sender=Merchant)
+def merchant_changed_handler(sender, instance, created, **kwargs):
+    # Un marchand désactivé ne doit plus être proposé par ses alias
+    if created:
+        return
+    alias_ids = list(instance.aliases.values_list('id', flat=True))
+    
+    def publish():
+        for alias_id in alias_ids:
+            publish_alias_change(alias_id)
+    
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=Merchant)
+@receiver(post_delete, sender=Merchant)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed_handler(sender, instance, **kwargs):
+    # Nouvelle version du catalogue : les ETags changent pour tous les clients
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed_handler(sender, instance, **kwargs):
+    # Les autres processus suivent la version du catalogue
+    transaction.on_commit(invalidate_category_tree)
+
+
+@receiver(post_save, sender=Receipt)
+def receipt_tags_saved_handler(sender, instance, created, update_fields=None, **kwargs):
+    # Compteurs de tags : seule la différence avec les tags chargés est appliquée
+    receipt_tags_saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Receipt)
+def receipt_tags_deleted_handler(sender, instance, **kwargs):
+    receipt_tags_deleted(instance)
+
+
+@receiver(post_delete, sender=Receipt)
+def receipt_archive_deleted_handler(sender, instance, **kwargs):
+    # L'archive OCR suit le reçu
+    key = instance.ocr_archive_key
+    if key:
+        transaction.on_commit(lambda: delete_archive(key))
@@ -0,0 +1,212 @@
+# apps/receipts/stats.py
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .category_tree import get_category_tree
+from .models import Category, Merchant, UserReceiptStats
+
+
+STATS_TABLE = UserReceiptStats._meta.db_table
+
+UPSERT_SQL = f"""
+    INSERT INTO {STATS_TABLE} (
+        user_id, period, dimension, dimension_key,
+        receipt_count, total_amount, cashback_amount, bonus_amount, updated_at
+    )
+    VALUES {{values}}
+    ON CONFLICT (user_id, period, dimension, dimension_key) DO UPDATE SET
+        receipt_count = {STATS_TABLE}.receipt_count + EXCLUDED.receipt_count,
+        total_amount = {STATS_TABLE}.total_amount + EXCLUDED.total_amount,
+        cashback_amount = {STATS_TABLE}.cashback_amount + EXCLUDED.cashback_amount,
+        bonus_amount = {STATS_TABLE}.bonus_amount + EXCLUDED.bonus_amount,
+        updated_at = EXCLUDED.updated_at
+"""
+
+# Recalcul complet d'une dimension depuis les reçus complétés
+REBUILD_SQL = f"""
+    INSERT INTO {STATS_TABLE} (
+        user_id, period, dimension, dimension_key,
+        receipt_count, total_amount, cashback_amount, bonus_amount, updated_at
+    )
+    SELECT
+        user_id,
+        date_trunc('month', purchase_date)::date,
+        %s,
+        {{key}},
+        COUNT(*),
+        COALESCE(SUM(total_amount), 0),
+        COALESCE(SUM(cashback_amount), 0),
+        COALESCE(SUM(bonus_amount), 0),
+        NOW()
+    FROM receipts_receipt
+    WHERE ocr_status = 'completed' {{user_filter}}
+    GROUP BY 1, 2, 4
+"""
+
+REBUILD_KEYS = {
+    'total': "''",
+    'category': "COALESCE(category_id::text, '')",
+    'merchant': "COALESCE(merchant_id::text, '')",
+}
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def record_completed_receipt(receipt, sign=1):
+    """
+    Ajoute (ou retire avec sign=-1) un reçu complété aux agrégats de son
+    utilisateur, en une seule requête INSERT ... ON CONFLICT
+    """
+    period = month_start(receipt.purchase_date)
+    now = timezone.now()
+    keys = [
+        ('total', ''),
+        ('category', str(receipt.category_id or '')),
+        ('merchant', str(receipt.merchant_id or '')),
+    ]
+
+    params = []
+    for dimension, key in keys:
+        params.extend([
+            receipt.user_id, period, dimension, key, sign,
+            sign * (receipt.total_amount or 0),
+            sign * (receipt.cashback_amount or 0),
+            sign * (receipt.bonus_amount or 0),
+            now,
+        ])
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(keys))
+
+    with connection.cursor() as cursor:
+        cursor.execute(UPSERT_SQL.format(values=values), params)
+
+
+def rebuild_stats(user_id=None, user_ids=None):
+    """
+    Recalcule les agrégats depuis les reçus : d'un utilisateur, d'une liste
+    d'utilisateurs ou de tous
+    """
+    queryset = UserReceiptStats.objects.all()
+    user_filter = ''
+    params = []
+    if user_id is not None:
+        user_ids = [user_id]
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        queryset = queryset.filter(user_id__in=user_ids)
+        user_filter = 'AND user_id = ANY(%s)'
+        params = [user_ids]
+
+    with transaction.atomic():
+        queryset.delete()
+        with connection.cursor() as cursor:
+            for dimension, key in REBUILD_KEYS.items():
+                cursor.execute(
+                    REBUILD_SQL.format(key=key, user_filter=user_filter),
+                    [dimension] + params
+                )
+    return queryset.count()
+
+
+def _metrics(row=None):
+    return {
+        'receipt_count': row.receipt_count if row else 0,
+        'total_amount': row.total_amount if row else Decimal('0'),
+        'cashback_amount': row.cashback_amount if row else Decimal('0'),
+        'bonus_amount': row.bonus_amount if row else Decimal('0'),
+    }
+
+
+def _add(target, row):
+    target['receipt_count'] += row.receipt_count
+    target['total_amount'] += row.total_amount
+    target['cashback_amount'] += row.cashback_amount
+    target['bonus_amount'] += row.bonus_amount
+
+
+def _serialize(metrics):
+    return {
+        key: str(value) if isinstance(value, Decimal) else value
+        for key, value in metrics.items()
+    }
+
+
+def get_user_stats(user, months=12):
+    """
+    Statistiques du tableau de bord : totaux, par mois, par catégorie et
+    par marchand sur les `months` derniers mois, lues dans les agrégats
+    """
+    today = timezone.localdate()
+    # Mois courant inclus
+    first_month = today.year * 12 + today.month - months
+    since = date(first_month // 12, first_month % 12 + 1, 1)
+
+    rows = UserReceiptStats.objects.filter(user=user, period__gte=since)
+
+    totals = _metrics()
+    by_month = []
+    by_dimension = {
+        'category': defaultdict(_metrics),
+        'merchant': defaultdict(_metrics),
+    }
+    for row in rows:
+        if row.dimension == 'total':
+            _add(totals, row)
+            by_month.append({'period': row.period.isoformat(), **_serialize(_metrics(row))})
+        else:
+            _add(by_dimension[row.dimension][row.dimension_key], row)
+
+    names = {
+        'category': dict(
+            Category.objects.filter(id__in=[k for k in by_dimension['category'] if k])
+            .values_list('id', 'name')
+        ),
+        'merchant': dict(
+            Merchant.objects.filter(id__in=[k for k in by_dimension['merchant'] if k])
+            .values_list('id', 'name')
+        ),
+    }
+
+    def breakdown(dimension):
+        entries = []
+        for key, metrics in by_dimension[dimension].items():
+            entries.append({
+                'id': int(key) if key else None,
+                'name': names[dimension].get(int(key)) if key else None,
+                **_serialize(metrics),
+            })
+        return sorted(entries, key=lambda e: Decimal(e['total_amount']), reverse=True)
+
+    # Totaux par sous-arbre de catégories (budget d'une catégorie parente)
+    tree = get_category_tree()
+    subtree_totals = tree.rollup({
+        int(key): metrics['total_amount']
+        for key, metrics in by_dimension['category'].items() if key
+    })
+    by_category_tree = sorted(
+        (
+            {
+                'id': category_id,
+                'name': tree.name(category_id),
+                'depth': tree.get(category_id)['depth'],
+                'total_amount': str(total),
+            }
+            for category_id, total in subtree_totals.items()
+        ),
+        key=lambda e: Decimal(e['total_amount']),
+        reverse=True
+    )
+
+    return {
+        'since': since.isoformat(),
+        'totals': _serialize(totals),
+        'by_month': by_month,
+        'by_category': breakdown('category'),
+        'by_category_tree': by_category_tree,
+        'by_merchant': breakdown('merchant'),
+    }
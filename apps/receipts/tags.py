@@ -0,0 +1,102 @@
+# apps/receipts/tags.py
+from django.db import connection, transaction
+
+from .models import ReceiptTagCount
+
+
+UPSERT_SQL = """
+    INSERT INTO receipts_tag_count (user_id, tag, count)
+    VALUES {values}
+    ON CONFLICT (user_id, tag) DO UPDATE SET
+        count = receipts_tag_count.count + EXCLUDED.count
+"""
+
+DECREMENT_SQL = """
+    UPDATE receipts_tag_count
+    SET count = count - 1
+    WHERE user_id = %s AND tag = ANY(%s)
+"""
+
+REBUILD_SQL = """
+    INSERT INTO receipts_tag_count (user_id, tag, count)
+    SELECT user_id, tag, COUNT(DISTINCT id)
+    FROM receipts_receipt, unnest(tags) AS tag
+    {where}
+    GROUP BY user_id, tag
+"""
+
+
+def apply_tag_delta(user_id, added=(), removed=()):
+    """
+    Incrémente les compteurs des tags ajoutés (INSERT ... ON CONFLICT) et
+    décrémente ceux des tags retirés. Les décréments ne créent jamais de
+    ligne : une suppression en cascade de l'utilisateur reste possible.
+    """
+    added = sorted(added)
+    removed = sorted(removed)
+    with connection.cursor() as cursor:
+        if added:
+            params = []
+            for tag in added:
+                params.extend([user_id, tag, 1])
+            values = ', '.join(['(%s, %s, %s)'] * len(added))
+            cursor.execute(UPSERT_SQL.format(values=values), params)
+        if removed:
+            cursor.execute(DECREMENT_SQL, [user_id, removed])
+
+
+def receipt_tags_saved(receipt, created, update_fields=None):
+    """
+    Répercute sur les compteurs la différence entre les tags chargés
+    (instantané pris dans from_db) et les tags enregistrés
+    """
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    if created:
+        previous = set()
+    elif hasattr(receipt, '_loaded_tags'):
+        previous = set(receipt._loaded_tags)
+    else:
+        # Tags non chargés (only/defer) : rien à comparer
+        return
+
+    current = set(receipt.tags or [])
+    apply_tag_delta(receipt.user_id, current - previous, previous - current)
+    receipt._loaded_tags = list(current)
+
+
+def receipt_tags_deleted(receipt):
+    tags = getattr(receipt, '_loaded_tags', receipt.tags)
+    apply_tag_delta(receipt.user_id, removed=set(tags or []))
+
+
+def rebuild_tag_counts(user_id=None, user_ids=None):
+    """
+    Recalcule les compteurs depuis les reçus : d'un utilisateur, d'une liste
+    d'utilisateurs ou de tous
+    """
+    queryset = ReceiptTagCount.objects.all()
+    where = ''
+    params = []
+    if user_id is not None:
+        user_ids = [user_id]
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        queryset = queryset.filter(user_id__in=user_ids)
+        where = 'WHERE user_id = ANY(%s)'
+        params = [user_ids]
+
+    with transaction.atomic():
+        queryset.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(REBUILD_SQL.format(where=where), params)
+    return queryset.count()
+
+
+def get_tag_facets(user, limit=50):
+    """Tags d'un utilisateur avec leur nombre de reçus, les plus utilisés d'abord"""
+    return list(
+        ReceiptTagCount.objects.filter(user=user, count__gt=0)
+        .order_by('-count', 'tag')
+        .values('tag', 'count')[:limit]
+    )
@@ -0,0 +1,230 @@
+# apps/receipts/tasks.py
+from datetime import timedelta
+
+from celery import chain, shared_task
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from .archive import archive_old_receipts
+from .dedup import is_bloom_ready, rebuild_bloom
+from .derivatives import generate_derivatives
+from .exports import get_export_queryset, write_export_file
+from .items import ingest_receipt_items
+from .merchant_resolver import resolve_receipt_merchant
+from .models import Receipt, ReceiptUploadSession
+from .ocr import OCRError, ProviderBusy, apply_ocr_result, process_receipt
+from .partitions import create_partitions
+from .phash import link_near_duplicate
+from .rollups import rollup_merchant_stats as run_merchant_rollup
+from .search import update_search_vectors
+from .uploads import discard_staging
+from apps.locations.tasks import validate_receipt_locations
+from apps.notifications.utils import send_notification
+
+
+@shared_task(bind=True, acks_late=True, max_retries=5)
+def process_receipt_ocr(self, receipt_id):
+    """
+    Traitement OCR d'un reçu : essaie les fournisseurs configurés, reporte
+    les données extraites et crédite le cashback si la confiance suffit
+    """
+    # Réserver le reçu : un seul worker le traite à la fois. Un reçu en
+    # cours n'est repris qu'après expiration du bail (worker tué)
+    now = timezone.now()
+    lease = timedelta(seconds=settings.INOVOCB_SETTINGS['OCR_LEASE_SECONDS'])
+    claimed = Receipt.objects.filter(
+        Q(ocr_status='pending') | Q(ocr_status='processing', updated_at__lt=now - lease),
+        id=receipt_id
+    ).update(ocr_status='processing', updated_at=now)
+    if not claimed:
+        return f"Reçu {receipt_id} déjà traité, en cours ou introuvable"
+    
+    receipt = Receipt.objects.select_related('user').get(id=receipt_id)
+    
+    try:
+        provider, result = process_receipt(receipt)
+    except ProviderBusy as e:
+        # Tous les fournisseurs sont saturés : libérer le reçu et réessayer
+        # plus tard (au-delà des essais, requeue_stale_receipts le reprend)
+        release_receipt(receipt_id)
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries * 5)
+        return f"Fournisseurs OCR saturés, reçu {receipt_id} remis en attente"
+    except OCRError as e:
+        if self.request.retries < self.max_retries:
+            release_receipt(receipt_id)
+            raise self.retry(exc=e, countdown=2 ** self.request.retries * 30)
+        Receipt.objects.filter(id=receipt_id).update(ocr_status='failed')
+        return f"Échec OCR du reçu {receipt_id}: {e}"
+    
+    with transaction.atomic():
+        apply_ocr_result(receipt, provider, result)
+        item_problems = ingest_receipt_items(receipt, result.get('items'))
+        update_search_vectors([receipt.id])
+    resolve_receipt_merchant(receipt)
+    link_near_duplicate(receipt)
+    
+    # Faible confiance, montants incohérents ou quasi-doublon : pas de crédit automatique
+    min_confidence = settings.INOVOCB_SETTINGS['OCR_MIN_CONFIDENCE']
+    if receipt.ocr_confidence < min_confidence or item_problems or receipt.is_duplicate:
+        receipt.ocr_status = 'manual_review'
+        receipt.save(update_fields=['ocr_status', 'updated_at'])
+        # Validation disponible pour la révision (le bonus suit l'approbation)
+        validate_receipt_locations.delay([receipt_id])
+        return f"Reçu {receipt_id} envoyé en révision manuelle"
+    
+    # Marchand connu : valider la localisation dans une tâche séparée (son
+    # échec ne fait pas échouer l'OCR), puis compléter : le bonus de zone
+    # exige une validation
+    chain(
+        validate_receipt_locations.si([receipt_id]),
+        complete_receipt.si(receipt_id)
+    ).delay()
+    return f"Reçu {receipt_id} traité par {provider}, complétion en file"
+
+
+@shared_task(acks_late=True)
+def complete_receipt(receipt_id):
+    """
+    Compléter un reçu après la validation de sa localisation (chaîne lancée
+    par process_receipt_ocr) : crédit du cashback et du bonus de zone
+    """
+    receipt = Receipt.objects.select_related('user').filter(
+        id=receipt_id, ocr_status='processing'
+    ).first()
+    if receipt is None:
+        return f"Reçu {receipt_id} déjà complété ou retiré du traitement"
+    receipt.mark_as_processed()
+    return f"Reçu {receipt_id} complété"
+
+
+def release_receipt(receipt_id):
+    """Remet un reçu réservé en attente (le prochain essai pourra le réserver)"""
+    Receipt.objects.filter(id=receipt_id, ocr_status='processing').update(
+        ocr_status='pending', updated_at=timezone.now()
+    )
+
+
+@shared_task
+def requeue_stale_receipts(limit=500):
+    """
+    Remettre en file les reçus en attente sans tâche (essais épuisés,
+    message perdu) et ceux dont le bail de traitement a expiré
+    Tâche périodique exécutée toutes les 10 minutes
+    """
+    stale_before = timezone.now() - timedelta(
+        seconds=settings.INOVOCB_SETTINGS['OCR_LEASE_SECONDS']
+    )
+    receipt_ids = list(
+        Receipt.objects.filter(
+            ocr_status__in=['pending', 'processing'],
+            updated_at__lt=stale_before
+        ).order_by('updated_at').values_list('id', flat=True)[:limit]
+    )
+    for receipt_id in receipt_ids:
+        process_receipt_ocr.delay(receipt_id)
+    return f"{len(receipt_ids)} reçus remis en file OCR"
+
+
+@shared_task(acks_late=True)
+def generate_receipt_derivatives(receipt_id):
+    """
+    Générer la miniature, l'image traitée et les déclinaisons WebP/AVIF
+    d'un reçu (encodage dans le pool de processus du worker)
+    """
+    try:
+        receipt = Receipt.objects.get(id=receipt_id)
+    except Receipt.DoesNotExist:
+        return f"Reçu {receipt_id} introuvable"
+    
+    if not generate_derivatives(receipt):
+        return f"Déclinaisons du reçu {receipt_id} déjà présentes"
+    return f"Déclinaisons du reçu {receipt_id} générées"
+
+
+@shared_task
+def cleanup_expired_upload_sessions():
+    """
+    Nettoyer les sessions d'upload reprenables expirées
+    Tâche périodique exécutée toutes les heures
+    """
+    # Ids figés avant le nettoyage : une session créée ou terminée entre-temps
+    # n'est pas marquée expirée sans que ses morceaux aient été supprimés
+    expired_sessions = list(ReceiptUploadSession.objects.filter(
+        status__in=['active', 'assembling'],
+        expires_at__lt=timezone.now()
+    ))
+    
+    for session in expired_sessions:
+        discard_staging(session)
+    count = ReceiptUploadSession.objects.filter(
+        id__in=[session.id for session in expired_sessions],
+        status__in=['active', 'assembling']
+    ).update(status='expired')
+    
+    return f"{count} sessions d'upload expirées nettoyées"
+
+
+@shared_task
+def rebuild_image_hash_bloom():
+    """
+    Reconstruire le filtre de Bloom s'il a été déclaré non prêt
+    (échec d'enregistrement d'un hash, Redis vidé)
+    Tâche périodique exécutée toutes les 15 minutes
+    """
+    if is_bloom_ready():
+        return "Filtre de Bloom à jour"
+    count = rebuild_bloom()
+    return f"Filtre de Bloom reconstruit avec {count} hashes"
+
+
+@shared_task
+def rollup_merchant_stats():
+    """
+    Agréger les reçus complétés dans les compteurs des marchands
+    Tâche périodique exécutée toutes les 5 minutes
+    """
+    count = run_merchant_rollup()
+    return f"{count} reçus agrégés dans les stats marchands"
+
+
+@shared_task(acks_late=True)
+def export_receipts(user_id, start=None, end=None, all_users=False):
+    """
+    Export CSV (gzip) des reçus et de leurs articles pour les grandes
+    périodes, enregistré dans le stockage puis notifié à l'utilisateur
+    """
+    user = get_user_model().objects.get(id=user_id)
+    queryset = get_export_queryset(None if all_users else user, start, end)
+    path = write_export_file(queryset, user_id)
+    
+    send_notification(
+        user=user,
+        title="Export de reçus prêt",
+        message=f"Votre export est disponible : {default_storage.url(path)}",
+        notification_type="success"
+    )
+    return f"Export {path} généré"
+
+
+@shared_task
+def create_ocr_log_partitions():
+    """
+    Créer à l'avance les partitions mensuelles des logs OCR
+    Tâche périodique exécutée chaque jour
+    """
+    created = create_partitions(months_ahead=3)
+    return f"{len(created)} partitions de logs OCR créées"
+
+
+@shared_task(acks_late=True)
+def archive_ocr_data():
+    """
+    Archiver dans le stockage les données OCR brutes des anciens reçus
+    Tâche périodique exécutée chaque jour
+    """
+    count = archive_old_receipts()
+    return f"{count} reçus archivés"
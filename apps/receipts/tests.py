@@ -1,3 +1,1458 @@
-from django.test import TestCase
+# apps/receipts/tests.py
+import io
+import random
+import shutil
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from http.server import ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from . import (
+    archive, benchmark_data, benchmarks, catalog, category_tree, dedup, derivatives, exports,
+    merchant_resolver, ocr, ocr_router, phash
+)
+from .management.commands.run_ocr_stub import StubOCRHandler
+from .exports import aiter_csv, escape_cell, get_export_queryset, iter_csv
+from .items import build_items, ingest_receipt_items
+from .models import (
+    Category, Merchant, OCRProcessingLog, Receipt, ReceiptImage, ReceiptItem,
+    ReceiptTagCount, ReceiptUploadSession, StatsWatermark, UserReceiptStats
+)
+from .pagination import ReceiptKeysetPagination
+from .partitions import (
+    DEFAULT_PARTITION, add_months, check_pruning, create_partitions, detach_partitions,
+    list_partitions, partition_name
+)
+from .rollups import WATERMARK_NAME, rollup_merchant_stats
+from .search import search_receipts, update_search_vectors
+from .tags import get_tag_facets, rebuild_tag_counts
+from .serializers import ReceiptAlreadySubmitted, ReceiptCreateSerializer
+from .views import CategoryViewSet
+from .tasks import (
+    cleanup_expired_upload_sessions, complete_receipt, process_receipt_ocr, requeue_stale_receipts
+)
+from .uploads import (
+    HashingFileUploadHandler, StagingError, append_chunk, finalize_session, get_staging_prefix
+)
+
+
+class StorageTestMixin:
+    """Stockage par défaut dans un répertoire temporaire (pas de S3 en test)"""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        storages = override_settings(
+            MEDIA_ROOT=self.media_root,
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            }
+        )
+        storages.enable()
+        self.addCleanup(storages.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+
+
+def create_user(email='test@example.com'):
+    return get_user_model().objects.create_user(email=email, password='secret')
+
+
+def jpeg_bytes(size=(64, 64), color=255):
+    buffer = io.BytesIO()
+    Image.new('L', size, color=color).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+def create_receipt(user, **fields):
+    fields.setdefault('original_image', 'receipts/originals/test.jpg')
+    # Hash fourni : pas de lecture du fichier dans save()
+    fields.setdefault('image_hash', f'{Receipt.objects.count():064x}')
+    return Receipt.objects.create(user=user, **fields)
+
+
+class UploadSessionTests(StorageTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.receipt = create_receipt(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_session(self, total_size, **fields):
+        return ReceiptUploadSession.objects.create(
+            user=self.user,
+            receipt=self.receipt,
+            page_number=2,
+            total_size=total_size,
+            expires_at=timezone.now() + timedelta(hours=1),
+            **fields
+        )
+
+    def patch(self, session, offset, data):
+        return self.client.generic(
+            'PATCH',
+            reverse('receipts:upload-chunk', args=[session.upload_id]),
+            data,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset)
+        )
+
+    def test_chunks_are_staged_in_shared_storage(self):
+        session = self.create_session(6)
+        self.assertEqual(append_chunk(session, io.BytesIO(b'abc'), 3), 3)
+
+        _, parts = default_storage.listdir(get_staging_prefix(session))
+        self.assertEqual(parts, ['000000000000.part'])
+
+    def test_chunked_upload_creates_page(self):
+        session = self.create_session(6)
+
+        self.assertEqual(self.patch(session, 0, b'abc').status_code, 200)
+        response = self.patch(session, 3, b'def')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'completed')
+        page = ReceiptImage.objects.get(receipt=self.receipt, page_number=2)
+        with page.image.open('rb') as f:
+            self.assertEqual(f.read(), b'abcdef')
+        # Les morceaux stagés sont supprimés après l'assemblage
+        self.assertFalse(default_storage.exists(f'{get_staging_prefix(session)}/000000000000.part'))
+
+    def test_wrong_offset_is_rejected(self):
+        session = self.create_session(6)
+        self.patch(session, 0, b'abc')
+
+        response = self.patch(session, 1, b'bcd')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received_bytes'], 3)
+
+    def test_concurrent_offset_change_is_rejected_after_write(self):
+        session = self.create_session(6)
+
+        def concurrent_append(session, stream, length):
+            # Une autre requête fait avancer l'offset pendant le transfert
+            ReceiptUploadSession.objects.filter(id=session.id).update(received_bytes=3)
+            return append_chunk(session, stream, length)
+
+        with mock.patch('apps.receipts.views.append_chunk', side_effect=concurrent_append), \
+                CaptureQueriesContext(connection) as context:
+            response = self.patch(session, 0, b'abc')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received_bytes'], 3)
+        self.assertFalse(any('FOR UPDATE' in query['sql'] for query in context.captured_queries))
+
+    def test_missing_part_rewinds_session(self):
+        # Offset enregistré sans morceau correspondant (réplique perdue)
+        session = self.create_session(6, received_bytes=3)
+
+        response = self.patch(session, 3, b'def')
+
+        self.assertEqual(response.status_code, 409)
+        session.refresh_from_db()
+        self.assertEqual(session.received_bytes, 0)
+        self.assertEqual(session.status, 'active')
+        self.assertFalse(ReceiptImage.objects.filter(receipt=self.receipt).exists())
+
+    def test_finalize_rejects_gap(self):
+        session = self.create_session(6)
+        append_chunk(session, io.BytesIO(b'abc'), 3)
+        session.received_bytes = 3
+
+        with self.assertRaises(StagingError) as context:
+            finalize_session(session)
+        self.assertEqual(context.exception.received_bytes, 3)
+
+    def test_assembling_session_rejects_chunks(self):
+        session = self.create_session(6, received_bytes=6, status='assembling')
+
+        self.assertEqual(self.patch(session, 6, b'').status_code, 409)
+
+    def test_cleanup_expires_only_collected_sessions(self):
+        expired = self.create_session(6)
+        append_chunk(expired, io.BytesIO(b'abc'), 3)
+        ReceiptUploadSession.objects.filter(id=expired.id).update(
+            expires_at=timezone.now() - timedelta(minutes=1)
+        )
+        active = self.create_session(6)
+
+        cleanup_expired_upload_sessions()
+
+        expired.refresh_from_db()
+        active.refresh_from_db()
+        self.assertEqual(expired.status, 'expired')
+        self.assertEqual(active.status, 'active')
+        self.assertFalse(default_storage.exists(f'{get_staging_prefix(expired)}/000000000000.part'))
+
+
+class BloomFilterTests(SimpleTestCase):
+    image_hash = 'ab' * 32
+
+    def test_offsets_are_deterministic_and_in_range(self):
+        offsets = dedup.bloom_offsets(self.image_hash, 1000)
+
+        self.assertEqual(len(offsets), dedup.BLOOM_HASHES)
+        self.assertEqual(offsets, dedup.bloom_offsets(self.image_hash, 1000))
+        self.assertTrue(all(0 <= offset < 1000 for offset in offsets))
+
+    def test_offsets_use_distinct_digest_windows(self):
+        # Chaque fenêtre de 32 bits du digest donne sa propre position
+        image_hash = ''.join(f'{i:08x}' for i in range(8, 0, -1))
+
+        offsets = dedup.bloom_offsets(image_hash, 1 << 32)
+
+        self.assertEqual(offsets, [1, 2, 3, 4, 5, 6, 7])
+
+    def test_local_filter_has_no_false_negative(self):
+        bloom = dedup.LocalBloomFilter(1 << 16)
+        bloom.add(self.image_hash)
+
+        self.assertIn(self.image_hash, bloom)
+        self.assertNotIn('cd' * 32, bloom)
+
+    def test_register_failure_marks_filter_stale(self):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.side_effect = redis.RedisError
+        with mock.patch.object(dedup, 'get_redis', return_value=client):
+            dedup.register_hash(self.image_hash)
+
+        client.delete.assert_called_once_with(dedup.BLOOM_READY_KEY)
+
+    def test_unready_filter_falls_back_to_index(self):
+        client = mock.Mock()
+        client.pipeline.return_value.execute.return_value = [0] + [0] * dedup.BLOOM_HASHES
+        with mock.patch.object(dedup, 'get_redis', return_value=client):
+            self.assertTrue(dedup.might_exist('ef' * 32))
+
+
+class DuplicateUploadTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.other = create_user('other@example.com')
+
+    def serializer(self, user):
+        request = APIRequestFactory().post('/receipts/receipts/')
+        request.user = user
+        image = SimpleUploadedFile('receipt.jpg', jpeg_bytes(), content_type='image/jpeg')
+        image.sha256 = 'ab' * 32
+        serializer = ReceiptCreateSerializer(
+            data={'original_image': image},
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer
+
+    def test_own_duplicate_is_linked(self):
+        original = create_receipt(self.user)
+        with mock.patch('apps.receipts.serializers.find_duplicate', return_value=original):
+            receipt = self.serializer(self.user).save()
+
+        self.assertTrue(receipt.is_duplicate)
+        self.assertEqual(receipt.duplicate_of, original)
+
+    def test_other_users_duplicate_is_rejected(self):
+        original = create_receipt(self.other)
+        with mock.patch('apps.receipts.serializers.find_duplicate', return_value=original):
+            with self.assertRaises(ReceiptAlreadySubmitted):
+                self.serializer(self.user).save()
+
+        self.assertFalse(Receipt.objects.filter(user=self.user).exists())
+
+
+class BKTreeTests(SimpleTestCase):
+
+    def test_search_matches_brute_force(self):
+        rng = random.Random(3)
+        values = [rng.getrandbits(64) - (1 << 63) for _ in range(500)]
+        tree = phash.BKTree()
+        for i, value in enumerate(values):
+            tree.add(value, i)
+        query = values[42] ^ 0b101
+
+        expected = sorted(
+            (phash.hamming(query, value), i)
+            for i, value in enumerate(values)
+            if phash.hamming(query, value) <= 10
+        )
+        self.assertEqual(tree.search(query, 10), expected)
+        self.assertEqual(tree.search(query, 10)[0], (2, 42))
+
+    def test_hamming_ignores_sign_representation(self):
+        self.assertEqual(phash.hamming(-1, (1 << 64) - 1), 0)
+        self.assertEqual(phash.hamming(0, -1), 64)
+
+    def test_distance_distribution_separates_groups(self):
+        same, different = phash.distance_distribution({
+            'a': [0b0000, 0b0001],
+            'b': [0b1111, None],
+        })
+
+        self.assertEqual(same, [1])
+        self.assertEqual(different, [3, 4])
+
+
+class NearDuplicateTests(StorageTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(phash, '_index', phash.NearDuplicateIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = create_user()
+
+    @override_settings(INOVOCB_SETTINGS={**settings.INOVOCB_SETTINGS, 'NEAR_DUPLICATE_DISTANCE': 2})
+    def test_threshold_comes_from_settings(self):
+        original = create_receipt(self.user, perceptual_hash=0b111000)
+
+        self.assertEqual(phash.find_near_duplicate(0b111011, user_id=self.user.id), original.id)
+        self.assertIsNone(phash.find_near_duplicate(0b111111, user_id=self.user.id))
+
+    def test_link_near_duplicate_uses_merchant_bucket(self):
+        merchant = Merchant.objects.create(name='Marché', display_name='Marché', slug='marche')
+        other = create_user('other@example.com')
+        day = timezone.localdate()
+        original = create_receipt(other, merchant=merchant, purchase_date=day, perceptual_hash=1 << 40)
+        receipt = create_receipt(self.user, merchant=merchant, purchase_date=day, perceptual_hash=(1 << 40) | 1)
+
+        self.assertEqual(phash.link_near_duplicate(receipt), original.id)
+        receipt.refresh_from_db()
+        self.assertTrue(receipt.is_duplicate)
+        self.assertEqual(receipt.duplicate_of_id, original.id)
+
+    def test_near_duplicate_upload_keeps_image_hash(self):
+        original = create_receipt(self.user)
+        request = APIRequestFactory().post('/receipts/receipts/')
+        request.user = self.user
+        image = SimpleUploadedFile('receipt.jpg', jpeg_bytes(), content_type='image/jpeg')
+        image.sha256 = 'cd' * 32
+        serializer = ReceiptCreateSerializer(data={'original_image': image}, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+
+        with mock.patch('apps.receipts.serializers.find_duplicate', return_value=None), \
+                mock.patch('apps.receipts.serializers.find_near_duplicate', return_value=original.id):
+            receipt = serializer.save()
+
+        self.assertTrue(receipt.is_duplicate)
+        self.assertEqual(receipt.image_hash, 'cd' * 32)
+
+    def test_upload_status_distinguishes_exact_and_near_duplicates(self):
+        original = create_receipt(self.user)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def upload():
+            image = SimpleUploadedFile('receipt.jpg', jpeg_bytes(), content_type='image/jpeg')
+            return client.post(reverse('receipts:receipt-upload'), {'original_image': image})
+
+        with mock.patch('apps.receipts.serializers.find_duplicate', return_value=None), \
+                mock.patch('apps.receipts.serializers.find_near_duplicate', return_value=original.id):
+            near = upload()
+        with mock.patch('apps.receipts.serializers.find_duplicate', return_value=original):
+            exact = upload()
+
+        # Quasi-doublon : nouveau reçu créé et signalé
+        self.assertEqual(near.status_code, 201)
+        self.assertNotEqual(near.data['id'], original.id)
+        self.assertTrue(near.data['is_duplicate'])
+        self.assertEqual(near.data['duplicate_of'], original.id)
+        # Doublon exact : le reçu existant est renvoyé
+        self.assertEqual(exact.status_code, 200)
+        self.assertEqual(exact.data['id'], original.id)
+
+
+class OCRStubTests(StorageTestMixin, TestCase):
+    """Appels OCR réels contre le service factice (run_ocr_stub)"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubOCRHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        calls = []
+
+        class Handler(StubOCRHandler):
+            def do_POST(self):
+                calls.append(self.path.rsplit('/', 1)[-1])
+                super().do_POST()
+
+        self.handler = Handler
+        self.calls = calls
+        self.server.RequestHandlerClass = Handler
+
+        url = f'http://127.0.0.1:{self.server.server_port}'
+        ocr_settings = override_settings(
+            INOVOCB_SETTINGS={**settings.INOVOCB_SETTINGS, 'OCR_SERVICE_URL': url}
+        )
+        ocr_settings.enable()
+        self.addCleanup(ocr_settings.disable)
+        # Sans Redis : ni sémaphore ni seau à jetons, routeur en mémoire
+        for target in ('apps.receipts.ocr.get_redis', 'apps.receipts.ocr_router.get_redis'):
+            patcher = mock.patch(target, side_effect=redis.RedisError)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        for name, value in (('choose_providers', ['gemini', 'gpt']), ('hedge_delay', None)):
+            patcher = mock.patch.object(ocr.router, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.receipt = create_receipt(create_user(), ocr_status='pending')
+
+    def test_failover_to_next_provider(self):
+        self.handler.unavailable = ('gemini',)
+
+        provider, result = ocr.process_receipt(self.receipt)
+
+        self.assertEqual(provider, 'gpt')
+        self.assertEqual(result['total'], '22.99')
+        self.assertEqual(self.calls, ['gemini', 'gpt'])
+        logs = OCRProcessingLog.objects.filter(receipt=self.receipt)
+        self.assertEqual(
+            sorted(logs.values_list('provider', 'success')),
+            [('gemini', False), ('gpt', True)]
+        )
+
+    def test_api_cost_is_estimated_when_not_reported(self):
+        ocr.run_provider('gemini', self.receipt, ['page-1'])
+
+        log = OCRProcessingLog.objects.get(receipt=self.receipt)
+        cost_per_page = settings.INOVOCB_SETTINGS['OCR_PROVIDERS']['gemini']['cost_per_page']
+        self.assertEqual(log.api_cost, Decimal(cost_per_page))
+
+    def test_page_count_is_logged_and_seeds_the_router(self):
+        ocr.run_provider('gemini', self.receipt, ['page-1', 'page-2', 'page-3'])
+
+        self.assertEqual(OCRProcessingLog.objects.get(receipt=self.receipt).page_count, 3)
+        samples = ocr_router.ProviderRouter()._load_samples('gemini')
+        self.assertEqual([sample['pages'] for sample in samples], [3])
+
+    def test_reported_zero_cost_is_kept(self):
+        self.handler.cost = '0'
+
+        ocr.run_provider('gemini', self.receipt, ['page-1'])
+
+        self.assertEqual(OCRProcessingLog.objects.get(receipt=self.receipt).api_cost, 0)
+
+    def test_busy_providers_are_retried_then_released(self):
+        self.handler.busy = ('gemini', 'gpt')
+
+        process_receipt_ocr.apply(args=[self.receipt.id])
+
+        # Un essai initial et max_retries reprises, chacun sur les deux fournisseurs
+        self.assertEqual(len(self.calls), 2 * (process_receipt_ocr.max_retries + 1))
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.ocr_status, 'pending')
+
+    def test_completion_is_chained_after_location_validation(self):
+        with mock.patch('apps.receipts.tasks.resolve_receipt_merchant'), \
+                mock.patch('apps.receipts.tasks.link_near_duplicate'), \
+                mock.patch('apps.receipts.tasks.chain') as chained:
+            process_receipt_ocr.apply(args=[self.receipt.id])
+
+        validate, complete = chained.call_args.args
+        self.assertEqual(validate.args, ([self.receipt.id],))
+        self.assertEqual(complete.args, (self.receipt.id,))
+        chained.return_value.delay.assert_called_once_with()
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.ocr_status, 'processing')
+
+        complete_receipt(self.receipt.id)
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.ocr_status, 'completed')
+
+    def test_claim_skips_receipt_under_lease(self):
+        Receipt.objects.filter(id=self.receipt.id).update(ocr_status='processing')
+
+        result = process_receipt_ocr.apply(args=[self.receipt.id]).get()
+
+        self.assertIn('en cours', result)
+        self.assertEqual(self.calls, [])
+
+    def test_stale_receipts_are_requeued(self):
+        Receipt.objects.filter(id=self.receipt.id).update(
+            updated_at=timezone.now() - timedelta(
+                seconds=settings.INOVOCB_SETTINGS['OCR_LEASE_SECONDS'] + 1
+            )
+        )
+        fresh = create_receipt(self.receipt.user, ocr_status='pending')
+
+        with mock.patch.object(process_receipt_ocr, 'delay') as delay:
+            requeue_stale_receipts()
+
+        delay.assert_called_once_with(self.receipt.id)
+        self.assertNotIn(mock.call(fresh.id), delay.call_args_list)
+
+
+@override_settings(INOVOCB_SETTINGS={**settings.INOVOCB_SETTINGS, 'DERIVATIVE_WORKERS': 0})
+def ocr_sample(latency=1.0, success=True, confidence=0.9, cost='0.0025', pages=1):
+    return {
+        'latency': latency, 'success': success, 'confidence': confidence,
+        'cost': cost, 'pages': pages,
+    }
+
+
+class ProviderRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.samples = {provider: [] for provider in settings.INOVOCB_SETTINGS['OCR_PROVIDER_ORDER']}
+        self.router = ocr_router.ProviderRouter()
+        patcher = mock.patch.object(self.router, '_load_samples', side_effect=self.samples.get)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_providers_missing_slo_are_tried_last(self):
+        self.samples['gemini'] = [ocr_sample(confidence=0.5)] * ocr_router.MIN_SAMPLES
+
+        # Sans historique : tarifs configurés (xai 0.0030 < gpt 0.0040)
+        self.assertEqual(self.router.choose_providers(), ['xai', 'gpt', 'gemini'])
+
+    def test_cheapest_observed_cost_per_page_first(self):
+        # 0.0080 pour 4 pages : 0.0020 par page, moins que gemini (0.0025)
+        self.samples['gpt'] = [ocr_sample(cost='0.0080', pages=4)] * ocr_router.MIN_SAMPLES
+        self.samples['xai'] = [ocr_sample(cost='0.0100')] * ocr_router.MIN_SAMPLES
+
+        self.assertEqual(self.router.choose_providers(), ['gpt', 'gemini', 'xai'])
+
+    def test_hedge_delay_is_latency_p95(self):
+        self.samples['gemini'] = [ocr_sample(latency=i) for i in range(1, ocr_router.MIN_SAMPLES)]
+        self.assertIsNone(self.router.hedge_delay('gemini'))
+
+        self.samples['gemini'].append(ocr_sample(latency=ocr_router.MIN_SAMPLES))
+        self.router.stats.clear()
+        self.assertEqual(self.router.hedge_delay('gemini'), 19)
+
+
+class HedgedOCRTests(SimpleTestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def run_provider(self, provider, receipt, pages):
+        if provider == 'gemini':
+            # Fournisseur principal bloqué au-delà de son p95
+            self.release.wait(5)
+            raise ocr.OCRError('gemini: délai dépassé')
+        return {'total': '22.99'}
+
+    def test_first_successful_provider_wins(self):
+        attempted = set()
+        with mock.patch.object(ocr.router, 'hedge_delay', return_value=0.01), \
+                mock.patch('apps.receipts.ocr.run_provider', side_effect=self.run_provider):
+            provider, result = ocr.run_hedged('gemini', 'gpt', None, ['page-1'], attempted)
+
+        self.assertEqual((provider, result), ('gpt', {'total': '22.99'}))
+        self.assertEqual(attempted, {'gemini', 'gpt'})
+
+    def test_no_hedge_without_latency_history(self):
+        attempted = set()
+        with mock.patch.object(ocr.router, 'hedge_delay', return_value=None), \
+                mock.patch('apps.receipts.ocr.run_provider', return_value={'total': '1.00'}) as run:
+            self.assertEqual(
+                ocr.run_hedged('gpt', 'xai', None, ['page-1'], attempted),
+                ('gpt', {'total': '1.00'})
+            )
+
+        run.assert_called_once_with('gpt', None, ['page-1'])
+        self.assertEqual(attempted, {'gpt'})
+
+
+class DerivativeTests(StorageTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(derivatives, '_pool', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_render_produces_every_rendition(self):
+        outputs = derivatives.render_derivatives(jpeg_bytes((2000, 1000)))
+
+        self.assertEqual(
+            set(outputs),
+            {f'{name}.{fmt}' for name, _ in derivatives.RENDITIONS for fmt in derivatives.FORMATS}
+        )
+        with Image.open(io.BytesIO(outputs['thumb.webp'])) as thumb:
+            self.assertEqual(max(thumb.size), 256)
+
+    def test_daemon_process_renders_in_process(self):
+        with mock.patch('multiprocessing.current_process') as current:
+            current.return_value.daemon = True
+            self.assertEqual(derivatives.get_worker_count(), 0)
+            self.assertIsNone(derivatives.get_pool())
+
+    def test_failed_submit_disables_pool(self):
+        pool = mock.Mock()
+        pool.submit.side_effect = AssertionError
+        derivatives._pool = pool
+
+        derivatives.render_in_pool(jpeg_bytes())
+        derivatives.render_in_pool(jpeg_bytes())
+
+        # Un seul essai : les appels suivants encodent sur place
+        pool.submit.assert_called_once()
+        self.assertIs(derivatives._pool, False)
+
+    def test_derivatives_reach_duplicates_created_before_encoding(self):
+        user = create_user()
+        name = default_storage.save('receipts/originals/test.jpg', ContentFile(jpeg_bytes()))
+        original = create_receipt(user, original_image=name)
+        duplicate = create_receipt(
+            user, original_image=name, image_hash=None,
+            is_duplicate=True, duplicate_of=original
+        )
+
+        self.assertTrue(derivatives.generate_derivatives(original))
+
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.image_derivatives, original.image_derivatives)
+        self.assertEqual(duplicate.thumbnail.name, original.thumbnail.name)
+
+
+class MerchantResolverTests(SimpleTestCase):
+
+    def resolver(self, *aliases):
+        resolver = merchant_resolver.MerchantResolver()
+        for alias_id, (alias, merchant_id, confidence) in enumerate(aliases, start=1):
+            resolver._add(alias_id, alias, merchant_id, confidence)
+        # Pas de synchronisation Redis pendant le test
+        resolver.loaded = True
+        resolver.checked_at = float('inf')
+        return resolver
+
+    def test_normalize_strips_accents_store_numbers_and_punctuation(self):
+        self.assertEqual(merchant_resolver.normalize('Métro Plus #1234, Laval'), 'metro plus laval')
+
+    def test_trigrams_are_padded(self):
+        self.assertEqual(merchant_resolver.trigrams('ab'), {'  a', ' ab', 'ab '})
+
+    def test_trie_prefix_stops_on_word_boundary(self):
+        trie = merchant_resolver.AliasTrie()
+        trie.add('iga', 1)
+        trie.add('iga extra', 2)
+
+        self.assertEqual(trie.exact('iga'), {1})
+        self.assertEqual(trie.longest_prefix('iga extra laval'), {2})
+        self.assertEqual(trie.longest_prefix('igame'), set())
+        trie.remove('iga extra', 2)
+        self.assertEqual(trie.longest_prefix('iga extra laval'), {1})
+
+    def test_resolve_prefers_exact_then_prefix_then_trigrams(self):
+        resolver = self.resolver(('IGA Extra', 10, 1.0), ('Costco', 20, 0.8))
+
+        self.assertEqual(resolver.resolve('IGA EXTRA #42'), (10, 1.0))
+        self.assertEqual(resolver.resolve('iga extra laval'), (10, merchant_resolver.PREFIX_PENALTY))
+        merchant_id, score = resolver.resolve('C0STCO WHOLESALE')
+        self.assertEqual(merchant_id, 20)
+        self.assertLess(score, 0.8)
+
+    def test_sync_stops_at_missing_version(self):
+        resolver = self.resolver()
+        resolver.version = 2
+        resolver.checked_at = 0
+        client = mock.Mock()
+        client.get.return_value = b'5'
+        client.lrange.return_value = [b'{"v": 3, "id": 7}', b'{"v": 5, "id": 9}']
+
+        with mock.patch.object(merchant_resolver, 'get_redis', return_value=client), \
+                mock.patch.object(resolver, 'apply_changes') as apply_changes:
+            resolver.sync()
+
+        apply_changes.assert_called_once_with([7])
+        self.assertEqual(resolver.version, 3)
+
+    def test_sync_reloads_when_log_is_truncated(self):
+        resolver = self.resolver()
+        resolver.version = 2
+        resolver.checked_at = 0
+        client = mock.Mock()
+        client.get.return_value = b'6'
+        client.lrange.return_value = [b'{"v": 5, "id": 9}', b'{"v": 6, "id": 4}']
+
+        with mock.patch.object(merchant_resolver, 'get_redis', return_value=client), \
+                mock.patch.object(resolver, 'reload') as reload:
+            resolver.sync()
+
+        reload.assert_called_once_with()
+
+    def test_publish_is_one_atomic_script(self):
+        client = mock.Mock()
+        client.eval.return_value = 4
+        resolver = self.resolver()
+        resolver.version = 3
+
+        with mock.patch.object(merchant_resolver, 'resolver', resolver), \
+                mock.patch.object(merchant_resolver, 'get_redis', return_value=client), \
+                mock.patch.object(resolver, 'apply_changes'):
+            merchant_resolver.publish_alias_change(12)
+
+        client.eval.assert_called_once_with(
+            merchant_resolver.PUBLISH_SCRIPT, 2, merchant_resolver.VERSION_KEY,
+            merchant_resolver.CHANGES_KEY, 12, merchant_resolver.CHANGES_KEPT
+        )
+        self.assertEqual(resolver.version, 4)
+
+
+class ReceiptItemsTests(SimpleTestCase):
+
+    def test_missing_price_is_derived(self):
+        receipt = Receipt(subtotal=Decimal('13.00'))
+
+        items, problems = build_items(receipt, [
+            {'name': 'Pain', 'quantity': '2', 'unit_price': '3.50'},
+            {'name': 'Lait', 'total_price': '6.00'},
+        ])
+
+        self.assertEqual(problems, [])
+        self.assertEqual(items[0].total_price, Decimal('7.00'))
+        self.assertEqual(items[1].quantity, Decimal('1'))
+        self.assertEqual(items[1].unit_price, Decimal('6.00'))
+        self.assertEqual([item.order for item in items], [0, 1])
+
+    def test_inconsistent_amounts_are_reported(self):
+        receipt = Receipt(subtotal=Decimal('50.00'))
+
+        items, problems = build_items(receipt, [
+            {'name': 'Bananes', 'quantity': '2', 'unit_price': '1.00', 'total_price': '5.00'},
+            {'name': '', 'total_price': '1.00'},
+            {'name': 'Sans prix'},
+        ])
+
+        self.assertEqual(len(items), 1)
+        self.assertEqual(problems, [
+            'ligne 1: 2.000 x 1.00 != 5.00',
+            'ligne 2 illisible',
+            'ligne 3 illisible',
+            'somme des lignes 5.00 != sous-total 50.00',
+        ])
+
+    def test_rounding_within_tolerance_is_accepted(self):
+        receipt = Receipt(subtotal=None)
+
+        _, problems = build_items(receipt, [
+            {'name': 'Vrac', 'quantity': '0.333', 'unit_price': '3.00', 'total_price': '1.00'},
+        ])
+
+        self.assertEqual(problems, [])
+
+
+class IngestItemsTests(TestCase):
+
+    def test_ingest_replaces_previous_items(self):
+        receipt = create_receipt(create_user())
+        ingest_receipt_items(receipt, [{'name': 'Ancien', 'total_price': '1.00'}])
+
+        ingest_receipt_items(receipt, [
+            {'name': 'Pain', 'total_price': '3.00'},
+            {'name': 'Lait', 'total_price': '4.00'},
+        ])
+
+        self.assertEqual(
+            list(receipt.items.order_by('order').values_list('name', flat=True)),
+            ['Pain', 'Lait']
+        )
+
+
+class CompletedReceiptTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.merchant = Merchant.objects.create(
+            name='Marché', display_name='Marché', slug='marche', cashback_rate=Decimal('2.00')
+        )
+        self.receipt = create_receipt(
+            self.user, merchant=self.merchant, total_amount=Decimal('50.00'),
+            purchase_date=timezone.localdate()
+        )
+        self.receipt.mark_as_processed()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('receipts:receipt-detail', args=[self.receipt.id])
+
+    def totals(self):
+        return UserReceiptStats.objects.get(user=self.user, dimension='total')
+
+    def test_completion_is_counted_once(self):
+        self.receipt.mark_as_processed()
+
+        self.assertEqual(self.totals().receipt_count, 1)
+        self.assertEqual(self.totals().total_amount, Decimal('50.00'))
+
+    def test_counted_fields_are_locked(self):
+        response = self.client.patch(self.url, {'total_amount': '500.00'}, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('total_amount', response.data)
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.total_amount, Decimal('50.00'))
+
+    def test_other_fields_stay_editable(self):
+        response = self.client.patch(
+            self.url, {'notes': 'Dîner', 'total_amount': '50.00'}, format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+
+    def test_delete_removes_receipt_from_stats(self):
+        response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.totals().receipt_count, 0)
+        self.assertFalse(
+            UserReceiptStats.objects.filter(user=self.user).exclude(receipt_count=0).exists()
+        )
+
+
+class CashbackLedgerTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        merchant = Merchant.objects.create(
+            name='Marché', display_name='Marché', slug='marche', cashback_rate=Decimal('2.00')
+        )
+        self.receipt = create_receipt(
+            self.user, merchant=merchant, total_amount=Decimal('50.00'),
+            bonus_amount=Decimal('0.50')
+        )
+
+    def test_completion_credits_once(self):
+        self.receipt.mark_as_processed()
+        self.receipt.mark_as_processed()
+
+        self.assertEqual(self.user.cashback_balance, self.receipt.cashback_amount + Decimal('0.50'))
+        self.assertEqual(self.user.cashback_transactions.count(), 2)
+
+    def test_deleting_completed_receipt_reverses_credit(self):
+        self.receipt.mark_as_processed()
+
+        self.receipt.delete()
+
+        self.assertEqual(self.user.cashback_balance, 0)
+        reversal = self.user.cashback_transactions.get(source='receipt_deleted')
+        self.assertEqual(reversal.transaction_type, 'adjust')
+
+
+class MerchantRollupTests(TestCase):
+
+    def setUp(self):
+        self.merchant = Merchant.objects.create(
+            name='Marché', display_name='Marché', slug='marche', cashback_rate=Decimal('2.00')
+        )
+        self.receipt = create_receipt(
+            create_user(), merchant=self.merchant, total_amount=Decimal('50.00')
+        )
+        self.receipt.mark_as_processed()
+        # Hors de la marge de MERCHANT_ROLLUP_LAG_SECONDS
+        Receipt.objects.filter(id=self.receipt.id).update(
+            processed_at=timezone.now() - timedelta(hours=1)
+        )
+        self.receipt.refresh_from_db()
+
+    def test_rollup_counts_each_receipt_once(self):
+        self.assertEqual(rollup_merchant_stats(), 1)
+        self.assertEqual(rollup_merchant_stats(), 0)
+
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.total_receipts, 1)
+        self.assertEqual(self.merchant.total_cashback_paid, self.receipt.cashback_amount)
+
+    def test_deleting_rolled_up_receipt_updates_counters(self):
+        rollup_merchant_stats()
+
+        self.receipt.delete()
+
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.total_receipts, 0)
+        self.assertEqual(self.merchant.total_cashback_paid, 0)
+
+    def test_deleting_pending_rollup_receipt_leaves_counters(self):
+        self.receipt.delete()
+        rollup_merchant_stats()
+
+        self.merchant.refresh_from_db()
+        self.assertEqual(self.merchant.total_receipts, 0)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        today = timezone.localdate()
+        # Dates en double : l'ordre est départagé par created_at puis id
+        self.receipts = [
+            create_receipt(self.user, purchase_date=today - timedelta(days=days))
+            for days in (0, 0, 1, 1, 1, 3, 7)
+        ]
+
+    def test_cursor_round_trip(self):
+        pagination = ReceiptKeysetPagination()
+        receipt = self.receipts[3]
+        request = Request(APIRequestFactory().get('/', {'cursor': pagination.encode_cursor(receipt)}))
+
+        self.assertEqual(
+            pagination.decode_cursor(request),
+            (receipt.purchase_date, receipt.created_at, receipt.id)
+        )
+
+    def test_invalid_cursor_is_not_found(self):
+        request = Request(APIRequestFactory().get('/', {'cursor': 'pas-un-curseur'}))
+
+        with self.assertRaises(NotFound):
+            ReceiptKeysetPagination().decode_cursor(request)
+
+    def test_pages_cover_every_receipt_once_in_order(self):
+        expected = list(
+            Receipt.objects.filter(user=self.user)
+            .order_by(*ReceiptKeysetPagination.ordering).values_list('id', flat=True)
+        )
+        seen = []
+        url = reverse('receipts:receipt-list') + '?page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            seen.extend(row['id'] for row in response.data['results'])
+            url = response.data['next']
+
+        self.assertEqual(seen, expected)
+
+
+class ReceiptQueryCountTests(StorageTestMixin, TestCase):
+    """Liste et détail en un nombre constant de requêtes (pas de N+1)"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.category = Category.objects.create(name='Épicerie', slug='epicerie')
+        self.merchant = Merchant.objects.create(
+            name='Marché', display_name='Marché', slug='marche', category=self.category
+        )
+
+    def create_receipts(self, count, items=0, pages=0):
+        receipts = []
+        for _ in range(count):
+            receipt = create_receipt(self.user, merchant=self.merchant, category=self.category)
+            ReceiptItem.objects.bulk_create([
+                ReceiptItem(
+                    receipt=receipt, name=f'Article {i}', unit_price=1, total_price=1,
+                    category=self.category, order=i
+                )
+                for i in range(items)
+            ])
+            for page in range(pages):
+                ReceiptImage.objects.create(
+                    receipt=receipt, image=f'receipts/additional/p{page}.jpg', page_number=page + 2
+                )
+            receipts.append(receipt)
+        return receipts
+
+    def test_list_is_one_query(self):
+        self.create_receipts(15, items=2)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('receipts:receipt-list') + '?page_size=10')
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_detail_query_count_does_not_depend_on_items(self):
+        small, = self.create_receipts(1)
+        large, = self.create_receipts(1, items=12, pages=3)
+
+        # Reçu (marchand, catégorie), articles (catégorie), pages
+        with self.assertNumQueries(3):
+            self.client.get(reverse('receipts:receipt-detail', args=[small.id]))
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('receipts:receipt-detail', args=[large.id]))
+        self.assertEqual(len(response.data['items']), 12)
+        self.assertEqual(response.data['items'][0]['category_name'], 'Épicerie')
+        self.assertEqual(len(response.data['additional_images']), 3)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.view = CategoryViewSet()
+
+    def variant(self, query):
+        return self.view.get_catalog_variant(Request(APIRequestFactory().get('/categories/', query)))
+
+    def test_variant_ignores_formatting_of_allowed_params(self):
+        self.assertEqual(self.variant({'page': '02'}), self.variant({'page': '2'}))
+        self.assertNotEqual(self.variant({'page': '2'}), self.variant({}))
+
+    def test_unknown_params_bypass_cache(self):
+        self.assertIsNone(self.variant({'utm': 'x'}))
+        self.assertIsNone(self.variant({'page': 'abc'}))
+
+    def test_recreated_version_does_not_restart_at_one(self):
+        before = catalog.get_catalog_version()
+        cache.delete(catalog.VERSION_KEY)
+
+        catalog.bump_catalog_version()
+
+        self.assertGreater(catalog.get_catalog_version(), 1)
+        self.assertGreaterEqual(catalog.get_catalog_version(), before)
+
+    def test_etag_revalidation(self):
+        client = APIClient()
+        client.force_authenticate(create_user())
+        url = reverse('receipts:category-list')
+
+        response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_catalog_is_served_from_database_when_cache_fails(self):
+        Category.objects.create(name='Épicerie', slug='epicerie')
+        client = APIClient()
+        client.force_authenticate(create_user())
+
+        with mock.patch.object(catalog.cache, 'get', side_effect=redis.RedisError), \
+                mock.patch.object(catalog.cache, 'add', side_effect=redis.RedisError):
+            response = client.get(reverse('receipts:category-list'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(response.data['results'][0]['name'], 'Épicerie')
+
+    def test_bump_survives_cache_outage(self):
+        with mock.patch.object(catalog.cache, 'incr', side_effect=redis.RedisError):
+            catalog.bump_catalog_version()
+
+    def test_evicted_version_falls_back_to_seed(self):
+        with mock.patch.object(catalog.cache, 'get', side_effect=lambda key, default=None: default), \
+                mock.patch.object(catalog, '_seed_version', return_value=123):
+            self.assertEqual(catalog.get_catalog_version(), 123)
+
+
+class CategoryTreeTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(category_tree, '_cache', category_tree.CategoryTreeCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.food = Category.objects.create(name='Alimentation', slug='alimentation')
+        self.grocery = Category.objects.create(name='Épicerie', slug='epicerie', parent=self.food)
+        self.fruit = Category.objects.create(name='Fruits', slug='fruits', parent=self.grocery)
+        self.fuel = Category.objects.create(name='Essence', slug='essence')
+
+    def test_materialized_path(self):
+        self.fruit.refresh_from_db()
+
+        self.assertEqual(self.fruit.path, f'/{self.food.id}/{self.grocery.id}/{self.fruit.id}/')
+        self.assertEqual(self.fruit.depth, 2)
+
+    def test_moving_a_category_rewrites_its_subtree(self):
+        self.grocery.parent = self.fuel
+        self.grocery.save()
+
+        self.fruit.refresh_from_db()
+        self.assertEqual(self.fruit.path, f'/{self.fuel.id}/{self.grocery.id}/{self.fruit.id}/')
+        self.assertEqual(self.fruit.depth, 2)
+
+    def test_category_cannot_become_its_own_ancestor(self):
+        self.food.parent = self.fruit
+
+        with self.assertRaises(ValueError):
+            self.food.save()
+
+    def test_tree_queries(self):
+        tree = category_tree.get_category_tree()
+
+        self.assertEqual([n['id'] for n in tree.ancestors(self.fruit.id)], [self.food.id, self.grocery.id])
+        self.assertEqual(
+            [n['id'] for n in tree.descendants(self.food.id)], [self.grocery.id, self.fruit.id]
+        )
+        self.assertEqual(
+            tree.rollup({self.fruit.id: 5, self.grocery.id: 2, self.fuel.id: 1}),
+            {self.food.id: 7, self.grocery.id: 7, self.fruit.id: 5, self.fuel.id: 1}
+        )
+        self.assertEqual(tree.subtree_sum(self.grocery.id, {self.fruit.id: 5, self.grocery.id: 2}), 7)
+
+    def test_tree_falls_back_to_database_without_cache(self):
+        with mock.patch.object(category_tree, 'get_catalog_version', side_effect=redis.RedisError):
+            self.assertEqual(str(self.grocery), 'Alimentation > Épicerie')
+
+
+class ExportTests(TestCase):
+
+    def test_formula_cells_are_escaped(self):
+        for value in ('=HYPERLINK("x")', '+1', '-2+3', '@SUM(A1)', '\tcmd', '\rcmd'):
+            self.assertEqual(escape_cell(value), "'" + value)
+        self.assertEqual(escape_cell('IGA'), 'IGA')
+        self.assertEqual(escape_cell(Decimal('-5.00')), Decimal('-5.00'))
+        self.assertEqual(escape_cell(None), '')
+
+    def test_csv_escapes_user_text(self):
+        user = create_user()
+        receipt = create_receipt(user, merchant_name_raw='=cmd|calc', total_amount=Decimal('12.50'))
+        ReceiptItem.objects.create(receipt=receipt, name='@SUM(A1)', unit_price=1, total_price=1)
+
+        lines = list(iter_csv(get_export_queryset(user)))
+
+        self.assertEqual(len(lines), 2)
+        self.assertIn("'=cmd|calc", lines[1])
+        self.assertIn("'@SUM(A1)", lines[1])
+        self.assertIn('12.50', lines[1])
+
+    async def test_async_export_yields_one_chunk_per_batch(self):
+        queryset = await sync_to_async(self.create_export)(5)
+        lines = aiter_csv(queryset)
+
+        with mock.patch.object(exports, 'CHUNK_SIZE', 2):
+            first = await anext(lines)
+            # En-tête et premier reçu seulement : le reste n'est pas encore lu
+            self.assertEqual(first.count('\r\n'), 2)
+            rest = [chunk async for chunk in lines]
+        self.assertEqual(sum(chunk.count('\r\n') for chunk in rest), 4)
+
+    def test_export_response_streams_asynchronously(self):
+        self.create_export(3)
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        response = client.get(reverse('receipts:receipt-export'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response.is_async)
+
+    def create_export(self, count):
+        self.user = create_user()
+        for _ in range(count):
+            create_receipt(self.user)
+        return get_export_queryset(self.user)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_indexed_receipt(self, user=None, items=(), **fields):
+        receipt = create_receipt(user or self.user, **fields)
+        for order, name in enumerate(items):
+            ReceiptItem.objects.create(
+                receipt=receipt, name=name, unit_price=1, total_price=1, order=order
+            )
+        update_search_vectors([receipt.id])
+        return receipt
+
+    def test_french_and_english_stems_match(self):
+        receipt = self.create_indexed_receipt(items=['Lait 2%'], notes='Groceries for the week')
+
+        queryset = Receipt.objects.filter(user=self.user)
+        self.assertEqual(list(search_receipts(queryset, 'lait')), [receipt])
+        self.assertEqual(list(search_receipts(queryset, 'grocery')), [receipt])
+        self.assertEqual(list(search_receipts(queryset, 'essence')), [])
+
+    def test_merchant_and_items_rank_above_ocr_text(self):
+        in_text = self.create_indexed_receipt(extracted_text='CAFE MOULU 7.99')
+        in_items = self.create_indexed_receipt(items=['Café moulu'])
+
+        results = list(search_receipts(Receipt.objects.filter(user=self.user), 'café'))
+
+        self.assertEqual(results, [in_items, in_text])
+
+    def test_search_is_scoped_to_user(self):
+        self.create_indexed_receipt(user=create_user('other@example.com'), items=['Lait'])
+        mine = self.create_indexed_receipt(items=['Lait'])
+
+        response = self.client.get(reverse('receipts:receipt-search'), {'q': 'lait'})
+
+        self.assertEqual([r['id'] for r in response.data['results']], [mine.id])
+
+    def test_archived_receipt_is_reindexed_without_losing_ocr_text(self):
+        receipt = self.create_indexed_receipt(
+            merchant_name_raw='IGA', extracted_text='CAFE MOULU 7.99', ocr_status='completed'
+        )
+        Receipt.objects.filter(id=receipt.id).update(
+            ocr_raw_response={}, extracted_text='', ocr_archived_at=timezone.now()
+        )
+
+        response = self.client.patch(
+            reverse('receipts:receipt-detail', args=[receipt.id]),
+            {'notes': 'Remboursement bureau'},
+            format='json'
+        )
+
+        self.assertEqual(response.status_code, 200)
+        queryset = Receipt.objects.filter(user=self.user)
+        self.assertEqual(list(search_receipts(queryset, 'remboursement')), [receipt])
+        self.assertEqual(list(search_receipts(queryset, 'moulu')), [receipt])
+        self.assertEqual(list(search_receipts(queryset, 'iga')), [receipt])
+
+    def test_query_is_required(self):
+        response = self.client.get(reverse('receipts:receipt-search'), {'q': ' '})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class TagCountTests(TestCase):
+
+    def setUp(self):
+        self.user = create_user()
+
+    def counts(self):
+        return dict(ReceiptTagCount.objects.filter(user=self.user).values_list('tag', 'count'))
+
+    def test_counters_follow_tag_changes(self):
+        first = create_receipt(self.user, tags=['travail', 'auto'])
+        create_receipt(self.user, tags=['travail'])
+
+        receipt = Receipt.objects.get(id=first.id)
+        receipt.tags = ['travail', 'famille']
+        receipt.save()
+
+        self.assertEqual(self.counts(), {'travail': 2, 'auto': 0, 'famille': 1})
+
+    def test_save_without_tags_leaves_counters(self):
+        receipt = create_receipt(self.user, tags=['travail'])
+        receipt.tags = ['famille']
+        receipt.save(update_fields=['notes', 'updated_at'])
+
+        self.assertEqual(self.counts(), {'travail': 1})
+
+    def test_delete_decrements(self):
+        receipt = create_receipt(self.user, tags=['travail'])
+        Receipt.objects.get(id=receipt.id).delete()
+
+        self.assertEqual(self.counts(), {'travail': 0})
+
+    def test_rebuild_matches_receipts(self):
+        create_receipt(self.user, tags=['travail', 'auto'])
+        create_receipt(self.user, tags=['travail'])
+        # update() contourne les signaux
+        Receipt.objects.filter(user=self.user).update(tags=['famille'])
+
+        rebuild_tag_counts(self.user.id)
+
+        self.assertEqual(self.counts(), {'famille': 2})
+
+    def test_facets_skip_empty_tags_and_sort_by_count(self):
+        create_receipt(self.user, tags=['auto', 'travail'])
+        create_receipt(self.user, tags=['travail'])
+        ReceiptTagCount.objects.create(user=self.user, tag='vide', count=0)
+
+        self.assertEqual(
+            get_tag_facets(self.user),
+            [{'tag': 'travail', 'count': 2}, {'tag': 'auto', 'count': 1}]
+        )
+
+    def test_list_filters_by_tags(self):
+        both = create_receipt(self.user, tags=['travail', 'auto'])
+        work = create_receipt(self.user, tags=['travail'])
+        create_receipt(self.user, tags=['famille'])
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('receipts:receipt-list')
+
+        response = client.get(url, {'tags': 'travail,auto'})
+        self.assertEqual([r['id'] for r in response.data['results']], [both.id])
+        response = client.get(url, {'tags_any': 'auto,travail'})
+        self.assertEqual({r['id'] for r in response.data['results']}, {both.id, work.id})
+
+
+class OCRLogPartitionTests(TestCase):
+
+    def setUp(self):
+        self.receipt = create_receipt(create_user())
+        # Au-delà des partitions créées par la migration : ligne dans DEFAULT
+        self.month = add_months(timezone.localdate().replace(day=1), 12)
+
+    def default_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{DEFAULT_PARTITION}"')
+            return cursor.fetchone()[0]
+
+    def create_log(self, started_at):
+        log = OCRProcessingLog.objects.create(receipt=self.receipt, provider='gemini')
+        # started_at est auto_now_add : la date est fixée après coup
+        OCRProcessingLog.objects.filter(id=log.id).update(started_at=started_at)
+        return log
+
+    def test_rows_in_default_are_moved_to_new_partition(self):
+        log = self.create_log(timezone.make_aware(datetime(self.month.year, self.month.month, 15)))
+        self.assertEqual(self.default_count(), 1)
+
+        created = create_partitions(months_ahead=0, today=self.month)
+
+        self.assertEqual(created, [partition_name(self.month)])
+        self.assertEqual(list_partitions()[self.month], partition_name(self.month))
+        self.assertEqual(self.default_count(), 0)
+        self.assertTrue(OCRProcessingLog.objects.filter(id=log.id).exists())
+
+    def test_existing_partitions_are_kept(self):
+        create_partitions(months_ahead=1, today=self.month)
+
+        self.assertEqual(create_partitions(months_ahead=1, today=self.month), [])
+
+    def test_old_partitions_are_detached(self):
+        create_partitions(months_ahead=0, today=self.month)
+
+        detached = detach_partitions(retain_months=0, today=add_months(self.month, 1))
+
+        self.assertIn(partition_name(self.month), detached)
+        self.assertNotIn(self.month, list_partitions())
+
+    def test_bounded_query_prunes_old_partitions(self):
+        scanned, expected = check_pruning()
+
+        self.assertLessEqual(scanned, expected)
+
+
+class OCRArchiveTests(StorageTestMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.receipt = create_receipt(
+            create_user(),
+            ocr_status='completed',
+            ocr_raw_response={'lines': ['CAFÉ 3.50']},
+            extracted_text='CAFÉ 3.50'
+        )
+        Receipt.objects.filter(id=self.receipt.id).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        self.receipt.refresh_from_db()
+
+    def test_pack_round_trip(self):
+        data = archive.pack({'lines': ['Crème brûlée']}, 'Crème brûlée')
+
+        self.assertEqual(
+            archive.unpack(data),
+            {'raw_response': {'lines': ['Crème brûlée']}, 'extracted_text': 'Crème brûlée'}
+        )
+
+    def test_archive_receipt_moves_ocr_data_to_storage(self):
+        self.assertTrue(archive.archive_receipt(self.receipt))
+
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.ocr_raw_response, {})
+        self.assertEqual(self.receipt.extracted_text, '')
+        self.assertIsNotNone(self.receipt.ocr_archived_at)
+        self.assertEqual(
+            archive.load_archive(self.receipt.ocr_archive_key),
+            {'raw_response': {'lines': ['CAFÉ 3.50']}, 'extracted_text': 'CAFÉ 3.50'}
+        )
+
+    def test_receipt_modified_meanwhile_is_not_cleared(self):
+        stale = Receipt.objects.get(id=self.receipt.id)
+        Receipt.objects.filter(id=self.receipt.id).update(
+            updated_at=timezone.now(), extracted_text='CAFÉ 4.00'
+        )
+
+        self.assertFalse(archive.archive_receipt(stale))
+        self.receipt.refresh_from_db()
+        self.assertEqual(self.receipt.extracted_text, 'CAFÉ 4.00')
+
+    def test_only_old_final_receipts_are_archived(self):
+        create_receipt(self.receipt.user, ocr_status='completed', extracted_text='récent')
+        pending = create_receipt(self.receipt.user, ocr_status='processing')
+        Receipt.objects.filter(id=pending.id).update(created_at=timezone.now() - timedelta(days=400))
+
+        self.assertEqual(archive.archive_old_receipts(days=30), 1)
+        self.assertEqual(archive.archive_old_receipts(days=30), 0)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class BenchmarkTests(TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(category_tree, '_cache', category_tree.CategoryTreeCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_generate_rebuilds_only_generated_aggregates(self):
+        user = create_user()
+        ReceiptTagCount.objects.create(user=user, tag='travail', count=5)
+        merchant = Merchant.objects.create(
+            name='Marché', display_name='Marché', slug='marche', total_receipts=7
+        )
+        StatsWatermark.objects.create(name=WATERMARK_NAME, position=timezone.now())
+
+        benchmark_data.generate(
+            users=5, merchants=2, locations_per_merchant=1, receipts=40,
+            bonus_zones=3, batch_size=10
+        )
+
+        self.assertEqual(ReceiptTagCount.objects.get(user=user).count, 5)
+        merchant.refresh_from_db()
+        self.assertEqual(merchant.total_receipts, 7)
+
+        generated = Receipt.objects.filter(user__in=benchmark_data.bench_users())
+        bench_merchants = Merchant.objects.filter(slug__startswith=f'{benchmark_data.BENCH_PREFIX}-')
+        self.assertEqual(
+            sum(bench_merchants.values_list('total_receipts', flat=True)),
+            generated.filter(ocr_status='completed').count()
+        )
+        self.assertEqual(
+            sum(ReceiptTagCount.objects.exclude(user=user).values_list('count', flat=True)),
+            sum(len(tags) for tags in generated.values_list('tags', flat=True))
+        )
+
+    def test_upload_scenario_goes_through_hashing_handler(self):
+        user = create_user()
+        file_complete = mock.patch.object(
+            HashingFileUploadHandler, 'file_complete',
+            autospec=True, side_effect=HashingFileUploadHandler.file_complete
+        )
+        with benchmarks.temporary_storage(), file_complete as complete, \
+                mock.patch('apps.receipts.serializers.find_duplicate', return_value=None):
+            result = benchmarks.run_scenario(
+                benchmarks.upload_scenario(user, random.Random(1), []), iterations=3, warmup=0
+            )
+
+        self.assertEqual(complete.call_count, 3)
+        self.assertEqual(result['iterations'], 3)
+        self.assertGreater(result['queries_max'], 0)
+        # Chaque itération est annulée
+        self.assertFalse(Receipt.objects.exists())
+
+    def test_latency_percentiles_are_ordered(self):
+        scenario = benchmarks.Scenario('noop', lambda arg: None)
+
+        result = benchmarks.run_scenario(scenario, iterations=10, warmup=0)
+
+        self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+        self.assertLessEqual(result['p95_ms'], result['p99_ms'])
@@ -0,0 +1,137 @@
+# apps/receipts/uploads.py
+import hashlib
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, StopUpload
+
+
+UPLOAD_CHUNK_SIZE = 256 * 1024
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Écrit le corps multipart sur disque par morceaux et calcule le SHA256
+    au passage, pour éviter de relire l'image avant l'enregistrement.
+    """
+    chunk_size = UPLOAD_CHUNK_SIZE
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.sha256 = hashlib.sha256()
+        self.max_size = settings.INOVOCB_SETTINGS['MAX_UPLOAD_SIZE']
+
+    def receive_data_chunk(self, raw_data, start):
+        # Couper court dès que la taille maximale est dépassée
+        if start + len(raw_data) > self.max_size:
+            self.file.close()
+            raise StopUpload(connection_reset=True)
+        self.sha256.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.sha256.hexdigest()
+        return uploaded_file
+
+
+class StagingError(Exception):
+    """Morceaux stagés incomplets : `received_bytes` est la taille contiguë réelle"""
+
+    def __init__(self, received_bytes):
+        super().__init__(f"Staging incomplet ({received_bytes} octets contigus)")
+        self.received_bytes = received_bytes
+
+
+def get_staging_prefix(session):
+    """
+    Préfixe des morceaux d'une session dans le stockage partagé : toutes les
+    répliques web et les workers Celery voient les mêmes morceaux
+    """
+    prefix = settings.INOVOCB_SETTINGS['UPLOAD_STAGING_PREFIX']
+    return f"{prefix}/{session.upload_id}"
+
+
+def _part_name(session, offset):
+    # Offset sur 12 chiffres : l'ordre alphabétique est l'ordre du fichier
+    return f"{get_staging_prefix(session)}/{offset:012d}.part"
+
+
+def _staged_parts(session):
+    """[(offset, nom)] des morceaux stagés, triés par offset"""
+    try:
+        _, files = default_storage.listdir(get_staging_prefix(session))
+    except FileNotFoundError:
+        return []
+    parts = []
+    for name in files:
+        if name.endswith('.part') and name[:-5].isdigit():
+            parts.append((int(name[:-5]), f"{get_staging_prefix(session)}/{name}"))
+    return sorted(parts)
+
+
+def append_chunk(session, stream, length):
+    """
+    Écrit un morceau comme objet distinct du stockage, nommé par son offset.
+    Le flux est copié par blocs dans un fichier temporaire (pas de morceau
+    entier en mémoire), puis publié d'un coup. Retourne le nombre d'octets
+    écrits (moins que `length` si la connexion a été coupée).
+    """
+    written = 0
+    with tempfile.TemporaryFile() as tmp:
+        while written < length:
+            data = stream.read(min(UPLOAD_CHUNK_SIZE, length - written))
+            if not data:
+                break
+            tmp.write(data)
+            written += len(data)
+        if not written:
+            return 0
+
+        # L'offset fait foi : un morceau précédent au même offset est remplacé
+        name = _part_name(session, session.received_bytes)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        tmp.seek(0)
+        default_storage.save(name, File(tmp))
+    return written
+
+
+def finalize_session(session):
+    """
+    Assemble les morceaux dans un fichier temporaire, l'envoie au stockage
+    et crée la page ReceiptImage. À appeler hors transaction : aucun verrou
+    n'est tenu pendant les transferts.
+    """
+    from .models import ReceiptImage
+
+    with tempfile.TemporaryFile() as assembled:
+        size = 0
+        for offset, name in _staged_parts(session):
+            if offset != size:
+                raise StagingError(size)
+            with default_storage.open(name, 'rb') as part:
+                for data in iter(lambda: part.read(UPLOAD_CHUNK_SIZE), b''):
+                    assembled.write(data)
+                    size += len(data)
+        if size != session.total_size:
+            raise StagingError(min(size, session.total_size))
+
+        assembled.seek(0)
+        page = ReceiptImage(
+            receipt=session.receipt,
+            page_number=session.page_number
+        )
+        name = f"{session.receipt.receipt_uuid}-p{session.page_number}{session.extension}"
+        page.image.save(name, File(assembled), save=False)
+        page.save()
+    discard_staging(session)
+    return page
+
+
+def discard_staging(session):
+    """Supprime les morceaux stagés d'une session"""
+    for _, name in _staged_parts(session):
+        default_storage.delete(name)
@@ -3,7 +3,8 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     ReceiptViewSet, MerchantViewSet, CategoryViewSet,
-    ReceiptUploadView, OCRStatusView, ReceiptStatsView
+    ReceiptUploadView, OCRStatusView, ReceiptStatsView,
+    ReceiptUploadSessionView, ReceiptUploadChunkView
 )
 
 app_name = 'receipts'
@@ -19,6 +20,8 @@ urlpatterns = [
     
     # Custom endpoints
     path('upload/', ReceiptUploadView.as_view(), name='receipt-upload'),
+    path('upload/sessions/', ReceiptUploadSessionView.as_view(), name='upload-session'),
+    path('upload/sessions/<uuid:upload_id>/', ReceiptUploadChunkView.as_view(), name='upload-chunk'),
     path('ocr-status/<uuid:receipt_uuid>/', OCRStatusView.as_view(), name='ocr-status'),
     path('stats/', ReceiptStatsView.as_view(), name='receipt-stats'),
 ]
\ No newline at end of file
@@ -0,0 +1,21 @@
+# apps/receipts/utils.py
+import redis
+from django.conf import settings
+
+
+_redis_client = None
+
+
+def get_redis():
+    """
+    Client Redis partagé par le processus (pool de connexions interne)
+    Timeout court : les appelants retombent sur la base si Redis ne répond pas
+    """
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=0.5,
+            socket_connect_timeout=0.5
+        )
+    return _redis_client
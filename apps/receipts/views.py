@@ -1,40 +1,300 @@
 # apps/receipts/views.py
-from rest_framework import viewsets, generics
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.dateparse import parse_date
+from django.utils import timezone
+from rest_framework import viewsets, generics, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from .models import Receipt, Merchant, Category
+from .catalog import CachedCatalogMixin
+from .models import Receipt, Merchant, Category, ReceiptUploadSession
 from .serializers import (
-    ReceiptSerializer, MerchantSerializer, CategorySerializer
+    ReceiptSerializer, ReceiptListSerializer, MerchantSerializer, CategorySerializer,
+    ReceiptCreateSerializer, OCRStatusSerializer,
+    ReceiptUploadSessionSerializer
 )
+from .exports import STREAM_MAX_RECEIPTS, aiter_csv, get_export_queryset
+from .pagination import ReceiptKeysetPagination
+from .query_planner import apply_plan
+from .search import search_receipts, update_search_vectors
+from .stats import get_user_stats
+from .tags import get_tag_facets
+from .tasks import export_receipts
+from .uploads import HashingFileUploadHandler, StagingError, append_chunk, finalize_session
 
 
 class ReceiptViewSet(viewsets.ModelViewSet):
     serializer_class = ReceiptSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReceiptKeysetPagination
+    
+    # Colonnes lues par ReceiptListSerializer (+ clés de pagination)
+    LIST_FIELDS = [
+        'id', 'receipt_uuid', 'thumbnail', 'merchant_name_raw',
+        'total_amount', 'currency', 'purchase_date', 'cashback_amount',
+        'bonus_amount', 'ocr_status', 'created_at',
+        'merchant', 'merchant__display_name'
+    ]
+    
+    SEARCH_MAX_RESULTS = 100
+    
+    def get_serializer_class(self):
+        if self.action in ('list', 'search'):
+            return ReceiptListSerializer
+        return super().get_serializer_class()
     
     def get_queryset(self):
-        return Receipt.objects.filter(user=self.request.user)
+        queryset = Receipt.objects.filter(user=self.request.user)
+        
+        # ?tags=a,b : tous les tags ; ?tags_any=a,b : au moins un (index GIN)
+        tags = self.request.query_params.get('tags')
+        if tags:
+            queryset = queryset.filter(tags__contains=[t for t in tags.split(',') if t])
+        tags_any = self.request.query_params.get('tags_any')
+        if tags_any:
+            queryset = queryset.filter(tags__overlap=[t for t in tags_any.split(',') if t])
+        
+        # Jointures et prefetch déduits du serializer : nombre de requêtes constant
+        queryset = apply_plan(queryset, self.get_serializer_class())
+        if self.action in ('list', 'search'):
+            queryset = queryset.only(*self.LIST_FIELDS)
+        return queryset
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # Les notes font partie du texte indexé
+        update_search_vectors([serializer.instance.id])
+    
+    @action(detail=False, methods=['get'])
+    def tags(self, request):
+        """Tags de l'utilisateur avec leur nombre de reçus (table de compteurs)"""
+        return Response({'results': get_tag_facets(request.user)})
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """Recherche plein texte (?q=), résultats classés par pertinence"""
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return Response(
+                {'error': 'Paramètre q requis'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), self.SEARCH_MAX_RESULTS)
+        except ValueError:
+            limit = 20
+        
+        receipts = search_receipts(self.get_queryset(), text)[:max(limit, 1)]
+        serializer = self.get_serializer(receipts, many=True)
+        return Response({'results': serializer.data})
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Export CSV des reçus et articles (?start=&end=). Streamé directement
+        pour les petites périodes, généré par une tâche Celery au-delà de
+        STREAM_MAX_RECEIPTS reçus ou avec ?mode=async.
+        """
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.query_params.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response(
+                    {'error': 'Dates invalides (AAAA-MM-JJ)'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        start, end = dates['start'], dates['end']
+        
+        # L'équipe finance (staff) peut exporter tous les utilisateurs
+        all_users = request.user.is_staff and request.query_params.get('scope') == 'all'
+        queryset = get_export_queryset(None if all_users else request.user, start, end)
+        
+        if request.query_params.get('mode') == 'async' or queryset.count() > STREAM_MAX_RECEIPTS:
+            export_receipts.delay(
+                str(request.user.id),
+                start.isoformat() if start else None,
+                end.isoformat() if end else None,
+                all_users
+            )
+            return Response(
+                {'message': "Export en cours de génération, vous serez notifié"},
+                status=status.HTTP_202_ACCEPTED
+            )
+        
+        filename = f"receipts-{timezone.localdate().isoformat()}.csv"
+        # Servi sous ASGI (daphne) : itérateur asynchrone, lot par lot
+        response = StreamingHttpResponse(aiter_csv(queryset), content_type='text/csv')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
 
 
-class MerchantViewSet(viewsets.ReadOnlyModelViewSet):
+class MerchantViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
+    catalog_name = 'merchants'
     queryset = Merchant.objects.filter(is_active=True)
     serializer_class = MerchantSerializer
     permission_classes = [IsAuthenticated]
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
+    catalog_name = 'categories'
     queryset = Category.objects.filter(is_active=True)
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
 
 
 class ReceiptUploadView(APIView):
+    """
+    Upload d'un reçu : le corps multipart est écrit sur disque par morceaux
+    et hashé au passage (pas de buffer complet en mémoire ni de relecture)
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def initialize_request(self, request, *args, **kwargs):
+        # Doit être défini avant toute lecture du corps de la requête
+        request.upload_handlers = [HashingFileUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+    
+    def post(self, request):
+        serializer = ReceiptCreateSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        receipt = serializer.save()
+        
+        # Doublon exact de l'un de ses reçus (même image) : renvoyer le reçu
+        # existant. Un quasi-doublon est un nouveau reçu, signalé via is_duplicate
+        if (receipt.is_duplicate
+                and receipt.duplicate_of.user_id == request.user.id
+                and receipt.original_image.name == receipt.duplicate_of.original_image.name):
+            return Response(
+                OCRStatusSerializer(receipt.duplicate_of).data,
+                status=status.HTTP_200_OK
+            )
+        
+        return Response(
+            OCRStatusSerializer(receipt).data,
+            status=status.HTTP_201_CREATED
+        )
+
+
+class ReceiptUploadSessionView(APIView):
+    """
+    Ouvre une session d'upload reprenable pour une page additionnelle
+    """
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
-        # TODO: Implémenter l'upload de reçu
-        return Response({"message": "Receipt upload endpoint"})
+        serializer = ReceiptUploadSessionSerializer(
+            data=request.data,
+            context={'request': request}
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class ReceiptUploadChunkView(APIView):
+    """
+    Reprise d'upload : GET renvoie l'offset courant, PATCH ajoute un morceau
+    brut à l'offset indiqué par l'en-tête Upload-Offset
+    """
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request, upload_id):
+        session = get_object_or_404(
+            ReceiptUploadSession,
+            upload_id=upload_id,
+            user=request.user
+        )
+        return Response(ReceiptUploadSessionSerializer(session).data)
+    
+    def patch(self, request, upload_id):
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            return Response(
+                {"detail": "En-têtes Upload-Offset et Content-Length requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        session = get_object_or_404(
+            ReceiptUploadSession.objects.select_related('receipt'),
+            upload_id=upload_id,
+            user=request.user
+        )
+        
+        if session.status == 'assembling':
+            # Assemblage en cours par une autre requête
+            return Response(
+                ReceiptUploadSessionSerializer(session).data,
+                status=status.HTTP_409_CONFLICT
+            )
+        if session.status != 'active' or session.is_expired:
+            return Response(
+                {"detail": "Session d'upload terminée ou expirée"},
+                status=status.HTTP_410_GONE
+            )
+        if offset != session.received_bytes:
+            return Response(
+                ReceiptUploadSessionSerializer(session).data,
+                status=status.HTTP_409_CONFLICT
+            )
+        if offset + length > session.total_size:
+            return Response(
+                {"detail": "Le morceau dépasse la taille annoncée"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Écriture hors transaction : aucun verrou de ligne pendant le transfert
+        # du corps. Le morceau est nommé par son offset : une requête concurrente
+        # au même offset le remplace, et finalize_session vérifie la contiguïté.
+        received = offset + append_chunk(session, request.stream, length)
+        new_status = 'assembling' if received >= session.total_size else 'active'
+        
+        # L'offset n'avance que s'il n'a pas bougé depuis la lecture
+        advanced = ReceiptUploadSession.objects.filter(
+            id=session.id, status='active', received_bytes=offset
+        ).update(received_bytes=received, status=new_status, updated_at=timezone.now())
+        if not advanced:
+            session.refresh_from_db()
+            return Response(
+                ReceiptUploadSessionSerializer(session).data,
+                status=status.HTTP_409_CONFLICT
+            )
+        session.received_bytes = received
+        session.status = new_status
+        
+        if session.status == 'assembling':
+            # Assemblage hors transaction : aucun verrou pendant les transferts
+            try:
+                finalize_session(session)
+            except StagingError as e:
+                # Morceaux manquants : le client reprend à l'offset réel
+                session.received_bytes = e.received_bytes
+                session.status = 'active'
+                session.save(update_fields=['received_bytes', 'status', 'updated_at'])
+                return Response(
+                    ReceiptUploadSessionSerializer(session).data,
+                    status=status.HTTP_409_CONFLICT
+                )
+            except Exception:
+                # Un PATCH vide à l'offset final relance l'assemblage
+                ReceiptUploadSession.objects.filter(
+                    id=session.id, status='assembling'
+                ).update(status='active', updated_at=timezone.now())
+                raise
+            session.status = 'completed'
+            session.save(update_fields=['status', 'updated_at'])
+        
+        return Response(ReceiptUploadSessionSerializer(session).data)
 
 
 class OCRStatusView(APIView):
@@ -49,5 +309,12 @@ class ReceiptStatsView(APIView):
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        # TODO: Implémenter les stats
-        return Response({"message": "Receipt stats endpoint"})
\ No newline at end of file
+        # Lu dans les agrégats : pas de GROUP BY sur les reçus à chaque ouverture
+        try:
+            months = min(max(int(request.query_params.get('months', 12)), 1), 60)
+        except ValueError:
+            return Response(
+                {'months': 'Nombre de mois invalide'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(get_user_stats(request.user, months=months))
\ No newline at end of file
@@ -3,7 +3,7 @@ from django.contrib import admin
 from django.utils.html import format_html
 from django.db.models import Count, Sum, Avg
 from .models import (
-    RewardProgram, UserLevel, UserReward, PointTransaction,
+    RewardProgram, UserLevel, UserReward, PointTransaction, CashbackTransaction,
     Reward, RewardRedemption, SpinWheel, SpinWheelPrize,
     SpinHistory, Challenge, UserChallenge, LevelUpNotification
 )
@@ -62,6 +62,19 @@ class PointTransactionAdmin(admin.ModelAdmin):
     date_hierarchy = 'created_at'
 
 
+@admin.register(CashbackTransaction)
+class CashbackTransactionAdmin(admin.ModelAdmin):
+    list_display = [
+        'user', 'amount', 'transaction_type', 'source',
+        'receipt', 'created_at'
+    ]
+    list_filter = ['transaction_type', 'source', 'created_at']
+    search_fields = ['user__email', 'description']
+    readonly_fields = ['transaction_id', 'created_at']
+    raw_id_fields = ['user', 'receipt']
+    date_hierarchy = 'created_at'
+
+
 @admin.register(Reward)
 class RewardAdmin(admin.ModelAdmin):
     list_display = [
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-17 15:20
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('receipts', '0006_userreceiptstats'),
+        ('rewards', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CashbackTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('transaction_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Montant')),
+                ('transaction_type', models.CharField(choices=[('earn', 'Gain'), ('bonus', 'Bonus'), ('withdraw', 'Retrait'), ('adjust', 'Ajustement')], default='earn', max_length=20)),
+                ('source', models.CharField(max_length=50, verbose_name='Source')),
+                ('description', models.TextField(blank=True, verbose_name='Description')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('receipt', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cashback_transactions', to='receipts.receipt')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cashback_transactions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Transaction de cashback',
+                'verbose_name_plural': 'Transactions de cashback',
+                'db_table': 'rewards_cashback_transaction',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['user', '-created_at'], name='rewards_cas_user_id_e6a9dd_idx')],
+                'unique_together': {('receipt', 'source')},
+            },
+        ),
+    ]
@@ -364,6 +364,78 @@ class PointTransaction(models.Model):
         ]
 
 
+class CashbackTransaction(models.Model):
+    """
+    Journal du cashback : chaque crédit ou débit est une ligne ajoutée,
+    le solde est la somme du journal (pas d'écriture sur la ligne users)
+    """
+    TRANSACTION_TYPES = [
+        ('earn', 'Gain'),
+        ('bonus', 'Bonus'),
+        ('withdraw', 'Retrait'),
+        ('adjust', 'Ajustement'),
+    ]
+    
+    transaction_id = models.UUIDField(
+        default=uuid.uuid4,
+        editable=False,
+        unique=True
+    )
+    
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='cashback_transactions'
+    )
+    
+    amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        verbose_name="Montant"
+    )
+    
+    transaction_type = models.CharField(
+        max_length=20,
+        choices=TRANSACTION_TYPES,
+        default='earn'
+    )
+    
+    source = models.CharField(
+        max_length=50,
+        verbose_name="Source"
+    )
+    
+    description = models.TextField(
+        blank=True,
+        verbose_name="Description"
+    )
+    
+    # Référence
+    receipt = models.ForeignKey(
+        'receipts.Receipt',
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name='cashback_transactions'
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        # Un reçu n'est crédité qu'une fois par source
+        unique_together = ['receipt', 'source']
+        verbose_name = "Transaction de cashback"
+        verbose_name_plural = "Transactions de cashback"
+        db_table = 'rewards_cashback_transaction'
+        indexes = [
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user} {self.amount:+} ({self.source})"
+
+
 class Reward(models.Model):
     """
     Récompenses échangeables contre points
@@ -19,4 +19,28 @@ app.conf.beat_schedule = {
         'task': 'apps.accounts.tasks.cleanup_expired_password_reset_tokens',
         'schedule': crontab(hour=2, minute=0),  # Tous les jours à 2h du matin
     },
+    'requeue-stale-receipts': {
+        'task': 'apps.receipts.tasks.requeue_stale_receipts',
+        'schedule': crontab(minute='*/10'),  # Toutes les 10 minutes
+    },
+    'cleanup-expired-upload-sessions': {
+        'task': 'apps.receipts.tasks.cleanup_expired_upload_sessions',
+        'schedule': crontab(minute=0),  # Toutes les heures
+    },
+    'rebuild-image-hash-bloom': {
+        'task': 'apps.receipts.tasks.rebuild_image_hash_bloom',
+        'schedule': crontab(minute='*/15'),  # Toutes les 15 minutes
+    },
+    'rollup-merchant-stats': {
+        'task': 'apps.receipts.tasks.rollup_merchant_stats',
+        'schedule': crontab(minute='*/5'),  # Toutes les 5 minutes
+    },
+    'create-ocr-log-partitions': {
+        'task': 'apps.receipts.tasks.create_ocr_log_partitions',
+        'schedule': crontab(hour=3, minute=30),  # Tous les jours à 3h30
+    },
+    'archive-ocr-data': {
+        'task': 'apps.receipts.tasks.archive_ocr_data',
+        'schedule': crontab(hour=4, minute=0),  # Tous les jours à 4h
+    },
 }
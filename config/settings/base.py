@@ -188,9 +188,22 @@ DEFAULT_FROM_EMAIL = env('DEFAULT_FROM_EMAIL', default='noreply@example.com')
 CORS_ALLOWED_ORIGINS = env.list('CORS_ALLOWED_ORIGINS', default=[])
 CORS_ALLOW_CREDENTIALS = True
 
+# Redis
+REDIS_URL = env('REDIS_URL', default='redis://localhost:6379/0')
+
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+        'KEY_PREFIX': 'inovocb',
+        'TIMEOUT': 24 * 3600,
+    }
+}
+
 # Celery
-CELERY_BROKER_URL = env('REDIS_URL', default='redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = env('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
@@ -202,7 +215,7 @@ CHANNEL_LAYERS = {
     'default': {
         'BACKEND': 'channels_redis.core.RedisChannelLayer',
         'CONFIG': {
-            "hosts": [env('REDIS_URL', default='redis://localhost:6379/0')],
+            "hosts": [REDIS_URL],
         },
     },
 }
@@ -229,4 +242,47 @@ INOVOCB_SETTINGS = {
     'MAX_UPLOAD_SIZE': 10 * 1024 * 1024,  # 10MB
     'SUPPORTED_IMAGE_FORMATS': ['jpg', 'jpeg', 'png', 'webp'],
     'OCR_SERVICE_URL': env('OCR_SERVICE_URL', default='http://localhost:8080'),
+    'OCR_TIMEOUT_SECONDS': 30,
+    'OCR_MIN_CONFIDENCE': 0.7,
+    # Bail d'un worker sur un reçu en cours d'OCR ; au-delà, le reçu est
+    # repris (worker tué) et un reçu en attente est remis en file
+    'OCR_LEASE_SECONDS': 900,
+    # Ordre de repli, limites de concurrence et de débit par fournisseur
+    'OCR_PROVIDER_ORDER': ['gemini', 'gpt', 'xai'],
+    'OCR_PROVIDERS': {
+        'gemini': {
+            'max_concurrency': 16,
+            'rate_per_second': 10,
+            'burst': 20,
+            'max_pages_per_call': 10,
+            'cost_per_page': '0.0025',
+        },
+        'gpt': {
+            'max_concurrency': 8,
+            'rate_per_second': 5,
+            'burst': 10,
+            'max_pages_per_call': 10,
+            'cost_per_page': '0.0040',
+        },
+        'xai': {
+            'max_concurrency': 4,
+            'rate_per_second': 2,
+            'burst': 4,
+            'max_pages_per_call': 1,
+            'cost_per_page': '0.0030',
+        },
+    },
+    # Processus d'encodage des miniatures WebP/AVIF (vide : cœurs - 1) ;
+    # dans un enfant du pool prefork Celery, l'encodage reste sur place
+    'DERIVATIVE_WORKERS': env.int('DERIVATIVE_WORKERS', default=None),
+    # Distance de Hamming max (dHash 64 bits) entre deux photos du même reçu,
+    # à calibrer avec la commande calibrate_near_duplicates
+    'NEAR_DUPLICATE_DISTANCE': env.int('NEAR_DUPLICATE_DISTANCE', default=6),
+    # Uploads reprenables (pages additionnelles), morceaux dans le stockage partagé
+    'UPLOAD_STAGING_PREFIX': env('UPLOAD_STAGING_PREFIX', default='uploads/staging'),
+    'UPLOAD_SESSION_TTL_HOURS': 24,
+    # Agrégation périodique des stats marchands (marge pour les transactions en cours)
+    'MERCHANT_ROLLUP_LAG_SECONDS': 120,
+    # Archivage (zstd, stockage) des données OCR brutes des anciens reçus
+    'OCR_ARCHIVE_AFTER_DAYS': env.int('OCR_ARCHIVE_AFTER_DAYS', default=180),
 }